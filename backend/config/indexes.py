@@ -0,0 +1,207 @@
+# Index Registry: the single source of truth for MongoDB indexes
+#
+# database.sync_indexes() makes every collection listed here match its
+# declaration: missing indexes are created, indexes whose options changed are
+# rebuilt, and (with drop=True) indexes that are no longer declared are
+# dropped. Collections not listed here are left alone. At startup
+# database.create_indexes() runs the dropping sync on one worker, and only
+# when this registry changed since the last successful sync.
+#
+# Each index should exist for a query shape the code actually issues;
+# tests/test_index_coverage.py replays those shapes against explain().
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: Tuple[Tuple[str, Any], ...]
+    unique: bool = False
+    sparse: bool = False
+    partial_filter: Optional[Dict[str, Any]] = field(default=None, hash=False)
+    name: Optional[str] = None
+
+    @property
+    def index_name(self) -> str:
+        """Explicit name, or the name MongoDB generates for these keys"""
+        if self.name:
+            return self.name
+        return "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"name": self.index_name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.partial_filter:
+            options["partialFilterExpression"] = self.partial_filter
+        return options
+
+
+def idx(*keys, **options) -> IndexSpec:
+    """idx("field") / idx(("a", 1), ("b", -1), unique=True)"""
+    normalized = tuple(key if isinstance(key, tuple) else (key, 1) for key in keys)
+    return IndexSpec(keys=normalized, **options)
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "products": [
+        idx("id"),
+        idx(("name", "text"), ("description", "text")),  # Full-text search
+        idx("category_id"),
+        idx("subcategory_id"),
+        idx("seller_id"),
+        idx("category", "brand"),  # PC builder compatibility lookups
+        idx(("status", 1), ("category_id", 1), ("price", 1)),
+        # get_products keyset pagination: filter prefix + sort tuple + id
+        *[
+            idx("is_active", "status", (sort_field, -1), ("id", -1))
+            for sort_field in ("created_at", "price", "average_rating", "views")
+        ],
+        idx("is_active", "status", "category_id", ("created_at", -1), ("id", -1)),
+        idx("is_active", "status", "personas", ("created_at", -1), ("id", -1)),
+        # Dynamic subcategory filters (specific_filters.<spec>)
+        idx(("specific_filters.$**", 1)),
+        idx(("is_active", 1), ("discount", -1)),  # /products/deals
+        idx(("is_active", 1), ("views", -1)),  # /analytics/popular
+    ],
+    "users": [
+        idx("id"),
+        idx("email", unique=True),
+        idx("username", unique=True),
+        idx(("level", -1)),
+        idx("is_seller"),
+        idx("is_verified_creator"),
+        idx("wishlist"),  # price drop notifications
+        idx("is_active", ("xp_total", -1)),  # hall of fame
+        idx("is_active", ("trust_score", -1)),
+    ],
+    "user_stats": [
+        idx("user_id", unique=True),
+        idx(("monthly_rp", -1)),
+        idx(("total_xp", -1)),
+    ],
+    "posts": [
+        idx("id"),
+        idx(("created_at", -1)),
+        idx("user_id"),
+        idx(("likes", -1)),
+        idx("is_hidden"),
+    ],
+    # NetworkService.FEED_SORTS keyset indexes
+    "network_posts": [
+        idx("id"),
+        idx("status", ("hot_score", -1), ("created_at", -1), ("id", -1)),
+        idx("status", ("created_at", -1), ("id", -1)),
+        idx("status", ("likes", -1), ("created_at", -1), ("id", -1)),
+    ],
+    "swap_listings": [
+        idx("id"),
+        idx("seller_id"),
+        # Boosted first, then sort field + id
+        *[
+            idx("status", ("is_boosted", -1), (sort_field, direction), ("id", direction))
+            for sort_field, direction in (
+                ("created_at", -1), ("created_at", 1),
+                ("price", 1), ("price", -1),
+                ("views", -1),
+            )
+        ],
+    ],
+    "orders": [
+        idx("id"),
+        idx(("created_at", -1), ("id", -1)),
+        idx("user_id", ("created_at", -1), ("id", -1)),
+    ],
+    "articles": [
+        idx(("published_at", -1)),
+        idx("status"),
+        idx("category"),
+        idx(("views", -1)),
+        idx("is_featured"),
+    ],
+    "reviews": [
+        idx("product_id"),
+        idx(("rating", -1)),
+        idx(("helpful_count", -1)),
+        idx("status"),
+    ],
+    "questions": [
+        idx("product_id"),
+        idx(("created_at", -1)),
+    ],
+    "proposals": [
+        idx("id"),
+        idx("status"),
+        idx(("weighted_score", -1)),
+        idx(("created_at", -1)),
+    ],
+    "groupbuys": [
+        idx("id"),
+        idx("status"),
+        idx(("deadline", 1)),
+        idx(("current_participants", -1)),
+        *[
+            idx((sort_field, -1), ("id", -1))
+            for sort_field in ("created_at", "deadline", "current_participants")
+        ],
+    ],
+    "creator_profiles": [
+        idx("user_id"),
+        idx("is_verified"),
+        idx(("total_views", -1)),
+    ],
+    "price_alerts": [
+        idx("id"),
+        idx("product_id", "enabled", "triggered", "trigger_price"),  # alert matcher range scan
+        idx("user_id", "product_id"),
+    ],
+    "price_history": [
+        # Price tracker's conditional upsert; startup merges duplicates first
+        idx("product_id", unique=True),
+    ],
+    "push_subscriptions": [
+        idx("user_id"),
+    ],
+    "notifications": [
+        idx("id"),
+        idx("user_id", ("created_at", -1)),
+        idx("user_id", "is_read", ("created_at", -1)),
+    ],
+    "product_views": [
+        idx("user_id", ("viewed_at", -1)),
+    ],
+    "carts": [
+        idx("user_id"),
+    ],
+    # Glassy Mind observer
+    "behavior_events": [
+        idx("user_id", ("timestamp", -1)),
+        idx("event_type", ("timestamp", -1)),
+        idx(("timestamp", -1)),
+    ],
+    "user_sessions": [
+        idx("user_id"),
+        idx("updated_at"),
+    ],
+    # services/feature_store.py
+    "user_features": [
+        idx("user_id", unique=True),
+    ],
+    "abandoned_carts": [
+        idx("user_id"),
+        idx("reminder_sent"),
+        idx("abandoned_at"),
+    ],
+    "email_logs": [
+        idx("user_id"),
+        idx("email_type"),
+    ],
+}
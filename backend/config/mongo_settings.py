@@ -0,0 +1,46 @@
+from pathlib import Path
+from pydantic_settings import BaseSettings
+from typing import List, Optional
+
+# backend/.env, wherever the process was started from
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+
+
+class MongoSettings(BaseSettings):
+    """
+    MongoDB client tuning (read by database.py)
+    
+    Separate from config.settings.Settings, which requires secrets the
+    connection layer doesn't need.
+    """
+    
+    # Connection pool
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = 300000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = 5000
+    MONGO_MAX_CONNECTING: int = 2
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    
+    # Wire compression, in order of preference; codecs whose Python package
+    # is missing (zstandard, python-snappy) are skipped
+    MONGO_COMPRESSORS: str = "zstd,snappy,zlib"
+    MONGO_ZLIB_COMPRESSION_LEVEL: int = 6
+    
+    # Read preference per workload: primary, primaryPreferred, secondary,
+    # secondaryPreferred, nearest
+    MONGO_READ_PREFERENCE: str = "primary"
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "secondaryPreferred"
+    MONGO_ANALYTICS_MAX_STALENESS_SECONDS: Optional[int] = None  # >= 90 when set
+    
+    class Config:
+        env_file = ENV_FILE
+        case_sensitive = True
+        extra = "ignore"
+    
+    def get_compressors(self) -> List[str]:
+        return [c.strip() for c in self.MONGO_COMPRESSORS.split(",") if c.strip()]
+
+
+# Global instance
+mongo_settings = MongoSettings()
@@ -2,101 +2,283 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from datetime import datetime, timezone
+import hashlib
+import json
 import logging
 
+from pymongo import IndexModel
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+)
+
+from config.indexes import INDEXES
+from config.mongo_settings import mongo_settings
+from utils.db_profiler import db_pool_monitor, db_profiler
+from utils.leases import Lease
+
 logger = logging.getLogger(__name__)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def _available_compressors() -> List[str]:
+    """Configured compressors whose codec package is importable"""
+    available = []
+    for name in mongo_settings.get_compressors():
+        package = COMPRESSOR_PACKAGES.get(name)
+        if package is None:
+            logger.warning(f"⚠️ Unknown Mongo compressor '{name}' ignored")
+            continue
+        try:
+            __import__(package)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def read_preference(mode: str, max_staleness: Optional[int] = None):
+    cls = READ_PREFERENCES.get(mode)
+    if cls is None:
+        raise ValueError(f"Unknown read preference '{mode}', expected one of {list(READ_PREFERENCES)}")
+    if cls is Primary:
+        return Primary()
+    return cls(max_staleness=max_staleness if max_staleness is not None else -1)
+
+
+def client_options() -> Dict[str, Any]:
+    """AsyncIOMotorClient kwargs from config/mongo_settings.py"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": mongo_settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": mongo_settings.MONGO_MIN_POOL_SIZE,
+        "maxConnecting": mongo_settings.MONGO_MAX_CONNECTING,
+        "serverSelectionTimeoutMS": mongo_settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "read_preference": read_preference(mongo_settings.MONGO_READ_PREFERENCE),
+        "event_listeners": [db_profiler, db_pool_monitor],
+    }
+    if mongo_settings.MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = mongo_settings.MONGO_MAX_IDLE_TIME_MS
+    if mongo_settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = mongo_settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    compressors = _available_compressors()
+    if compressors:
+        options["compressors"] = compressors
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = mongo_settings.MONGO_ZLIB_COMPRESSION_LEVEL
+    return options
+
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, **client_options())
 db = client[os.environ['DB_NAME']]
 
+# Heavy read-only aggregations (analytics, leaderboards, hall of fame):
+# same pool, routed to secondaries when the deployment has them
+analytics_db = client.get_database(
+    os.environ['DB_NAME'],
+    read_preference=read_preference(
+        mongo_settings.MONGO_ANALYTICS_READ_PREFERENCE,
+        mongo_settings.MONGO_ANALYTICS_MAX_STALENESS_SECONDS
+    )
+)
+
 
 async def get_database():
     """Get database instance"""
     return db
 
 
-async def create_indexes():
-    """Create database indexes for performance optimization"""
-    logger.info("🔧 Creating database indexes...")
+async def get_analytics_database():
+    """Database handle for read-only analytics (secondary-preferred by default)"""
+    return analytics_db
+
+
+class IndexSyncError(RuntimeError):
+    """Declared unique indexes that can't be built over the current data"""
+
+
+async def _duplicate_keys(collection, spec, limit: int = 5) -> List[Any]:
+    """Key values held by more than one document (a unique index would reject them)"""
+    match = dict(spec.partial_filter or {})
+    if spec.sparse:
+        match.update({key: {"$exists": True} for key, _ in spec.keys})
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$group": {
+            "_id": {f"k{i}": f"${key}" for i, (key, _) in enumerate(spec.keys)},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [
+        tuple(group["_id"].values()) if len(spec.keys) > 1 else group["_id"]["k0"]
+        async for group in collection.aggregate(pipeline)
+    ]
+
+
+def _index_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Comparable options of an index as reported by index_information()"""
+    options = {"name": None}
+    for key in ("unique", "sparse", "partialFilterExpression"):
+        if info.get(key):
+            options[key] = info[key]
+    return options
+
+
+async def sync_indexes(
+    collections: Optional[Iterable[str]] = None,
+    drop: bool = False,
+    database=None,
+    strict: bool = False
+) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Make indexes match the registry in config/indexes.py (idempotent)
     
-    try:
-        # Products indexes
-        await db.products.create_index([("name", "text"), ("description", "text")])  # Full-text search
-        await db.products.create_index("category_id")
-        await db.products.create_index("sub_category_id")
-        await db.products.create_index("persona_id")
-        await db.products.create_index([("price", 1)])  # Ascending
-        await db.products.create_index([("created_at", -1)])  # Descending
-        await db.products.create_index([("rating", -1)])
-        await db.products.create_index([("status", 1)])
-        await db.products.create_index([("view_count", -1)])
-        
-        # Compound index for complex queries
-        await db.products.create_index([
-            ("status", 1),
-            ("category_id", 1),
-            ("price", 1)
-        ])
-        
-        # Users indexes
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("username", unique=True)
-        await db.users.create_index([("level", -1)])
-        await db.users.create_index("is_seller")
-        await db.users.create_index("is_verified_creator")
-        
-        # Posts indexes (Feed)
-        await db.posts.create_index([("created_at", -1)])
-        await db.posts.create_index("user_id")
-        await db.posts.create_index([("likes", -1)])
-        await db.posts.create_index("is_hidden")
-        
-        # Articles indexes
-        await db.articles.create_index([("published_at", -1)])
-        await db.articles.create_index("status")
-        await db.articles.create_index("category")
-        await db.articles.create_index([("views", -1)])
-        await db.articles.create_index("is_featured")
-        
-        # Reviews indexes
-        await db.reviews.create_index("product_id")
-        await db.reviews.create_index([("rating", -1)])
-        await db.reviews.create_index([("helpful_count", -1)])
-        await db.reviews.create_index("status")
-        
-        # Questions indexes
-        await db.questions.create_index("product_id")
-        await db.questions.create_index([("created_at", -1)])
-        
-        # Proposals indexes (Voting)
-        await db.proposals.create_index("status")
-        await db.proposals.create_index([("weighted_score", -1)])
-        await db.proposals.create_index([("created_at", -1)])
-        
-        # User Stats indexes
-        await db.user_stats.create_index("user_id", unique=True)
-        await db.user_stats.create_index([("monthly_rp", -1)])
-        await db.user_stats.create_index([("total_xp", -1)])
-        
-        # Group Buys indexes
-        await db.groupbuys.create_index("status")
-        await db.groupbuys.create_index([("deadline", 1)])
-        await db.groupbuys.create_index([("current_participants", -1)])
-        
-        # Creator Profiles indexes
-        await db.creator_profiles.create_index("user_id")
-        await db.creator_profiles.create_index("is_verified")
-        await db.creator_profiles.create_index([("total_views", -1)])
+    Creates missing indexes, rebuilds ones whose options changed and, when
+    `drop` is set, removes indexes no longer declared. Returns what changed
+    per collection. Unless `strict`, errors are logged and reported per
+    collection under "errors" instead of raised.
+    
+    A unique index is neither created nor swapped for the existing one while
+    documents share its key: the old index stays in place and, once every
+    collection is synced, IndexSyncError is raised even when not `strict`.
+    """
+    database = database if database is not None else db
+    names = list(collections) if collections is not None else list(INDEXES)
+    report: Dict[str, Dict[str, List[str]]] = {}
+    conflicts: List[str] = []
+    
+    for name in names:
+        specs = INDEXES.get(name, [])
+        collection = database[name]
+        changes = {"created": [], "rebuilt": [], "dropped": []}
         
-        logger.info("✅ Database indexes created successfully!")
+        try:
+            existing = await collection.index_information()
+            declared = {spec.index_name: spec for spec in specs}
+            
+            # Unique indexes the data doesn't allow yet: leave whatever exists
+            blocked = set()
+            for index_name, spec in declared.items():
+                if not spec.unique:
+                    continue
+                if index_name in existing and _index_options(existing[index_name]) == {**spec.options, "name": None}:
+                    continue
+                duplicates = await _duplicate_keys(collection, spec)
+                if duplicates:
+                    blocked.add(index_name)
+                    conflicts.append(f"{name}.{index_name} (duplicate keys: {duplicates})")
+                    logger.error(f"❌ Can't build unique index {name}.{index_name}: duplicate keys {duplicates}")
+            
+            for index_name, info in existing.items():
+                if index_name == "_id_" or index_name in blocked:
+                    continue
+                spec = declared.get(index_name)
+                if spec is None:
+                    if drop:
+                        await collection.drop_index(index_name)
+                        changes["dropped"].append(index_name)
+                elif _index_options(info) != {**spec.options, "name": None}:
+                    await collection.drop_index(index_name)
+                    changes["rebuilt"].append(index_name)
+            
+            missing = [
+                IndexModel(list(spec.keys), **spec.options)
+                for index_name, spec in declared.items()
+                if index_name not in blocked
+                and (index_name not in existing or index_name in changes["rebuilt"])
+            ]
+            if missing:
+                await collection.create_indexes(missing)
+                changes["created"] = [
+                    model.document["name"] for model in missing
+                    if model.document["name"] not in changes["rebuilt"]
+                ]
+        except Exception as e:
+            if strict:
+                raise
+            logger.error(f"❌ Error syncing indexes for {name}: {e}")
+            report[name] = {**changes, "errors": [str(e)]}
+            continue
         
-    except Exception as e:
-        logger.error(f"❌ Error creating indexes: {e}")
+        if any(changes.values()):
+            logger.info(
+                f"🔧 {name}: +{len(changes['created'])} ~{len(changes['rebuilt'])} "
+                f"-{len(changes['dropped'])} indexes"
+            )
+            report[name] = changes
+    
+    if conflicts:
+        raise IndexSyncError(f"Unique indexes not built: {'; '.join(conflicts)}")
+    return report
+
+
+INDEX_SYNC_LEASE = "index_sync"
+INDEX_SYNC_LEASE_SECONDS = 1800
+
+
+def registry_fingerprint() -> str:
+    """Hash of the index registry, to tell whether it changed since the last sync"""
+    registry = {
+        name: sorted([list(spec.keys), spec.options] for spec in specs)
+        for name, specs in INDEXES.items()
+    }
+    raw = json.dumps(registry, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+async def create_indexes(prepare: Optional[Callable[[Any], Awaitable[Any]]] = None):
+    """
+    Sync database indexes with the registry, once per registry change
+    
+    Every worker calls this at startup. Only the worker holding the
+    ``index_sync`` lease runs the (destructive, drop=True) sync, and only
+    when the registry changed since the last successful one; the others
+    start without waiting. `prepare` runs first under the same lease (data
+    fixes a new index needs, e.g. merging duplicates).
+    """
+    fingerprint = registry_fingerprint()
+    lease = Lease(db, INDEX_SYNC_LEASE, ttl_seconds=INDEX_SYNC_LEASE_SECONDS)
+    if not await lease.acquire():
+        logger.info("🔧 Database indexes are being synced by another worker")
+        return
+    if lease.state.get("fingerprint") == fingerprint:
+        await lease.release()
+        logger.info("✅ Database indexes in sync (registry unchanged)")
+        return
+    
+    try:
+        logger.info("🔧 Syncing database indexes...")
+        if prepare is not None:
+            await prepare(db)
+        report = await sync_indexes(drop=True)
+    except Exception:
+        # Keep the previous fingerprint so the next startup tries again
+        await lease.release()
+        raise
+    
+    failed = [name for name, changes in report.items() if changes.get("errors")]
+    if failed:
+        await lease.release()
+        logger.error(f"❌ Database indexes not synced for: {', '.join(failed)}")
+        return
+    await lease.release({"fingerprint": fingerprint, "synced_at": datetime.now(timezone.utc).isoformat()})
+    logger.info(f"✅ Database indexes in sync ({len(report)} collections changed)")
 
 
 async def close_mongo_connection():
@@ -47,12 +47,10 @@ class AbandonedCartWebhook:
         """Lazy initialization of database"""
         if self._db is None:
             try:
-                from database import db
+                from database import db, sync_indexes
                 self._db = db
-                # Create index for efficient queries
-                await self._db.abandoned_carts.create_index("user_id")
-                await self._db.abandoned_carts.create_index("reminder_sent")
-                await self._db.abandoned_carts.create_index("abandoned_at")
+                # Indexes are declared in config/indexes.py
+                await sync_indexes(["abandoned_carts"], strict=True)
             except Exception as e:
                 logger.warning(f"MongoDB not available for abandoned carts: {e}")
     
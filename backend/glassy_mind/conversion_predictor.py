@@ -3,14 +3,30 @@ Glassy Mind - Conversion Prediction Model
 ML-модель для предсказания вероятности конверсии пользователя.
 """
 
+import heapq
 import logging
 import math
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Сессий на один векторный проход
+SCORING_BATCH = 5000
+
+# Только то, из чего считаются признаки: массивы приходят без payload
+SESSION_FEATURE_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "views.data.category": 1,
+    "cart_actions.quantity": 1,
+    "dwell_times": 1,
+    "started_at": 1,
+}
+
 
 @dataclass
 class ConversionPrediction:
@@ -257,76 +273,192 @@ class ConversionPredictor:
             segment=segment
         )
     
+    # ==================== Batch scoring ====================
+    
+    def _session_features(self, session: Dict) -> Tuple:
+        """Одна строка матрицы признаков из проекции SESSION_FEATURE_PROJECTION"""
+        views = session.get("views") or []
+        dwell_times = session.get("dwell_times") or {}
+        categories = [
+            view["data"]["category"] for view in views
+            if isinstance(view.get("data"), dict) and "category" in view["data"]
+        ]
+        
+        started_at = session.get("started_at")
+        started_ts, recency_fallback = math.nan, 0.0
+        if started_at:
+            try:
+                started_ts = datetime.fromisoformat(started_at.replace('Z', '+00:00')).timestamp()
+            except Exception:
+                recency_fallback = 0.3
+        
+        return (
+            len(views),
+            len(session.get("cart_actions") or []),
+            sum(dwell_times.values()) / len(dwell_times) if dwell_times else 0.0,
+            len(dwell_times),
+            len(set(categories)),
+            len(categories),
+            started_ts,
+            recency_fallback,
+        )
+    
+    def score_features(self, rows: List[Tuple]) -> Dict[str, np.ndarray]:
+        """
+        Векторная версия predict() для строк _session_features.
+        
+        Те же веса, пороги, буст за корзину и сегменты; возвращает массивы
+        probability (округлённая как в predict), segment, confidence и
+        оценки факторов.
+        """
+        (views, cart_adds, avg_dwell, dwell_pages, unique_categories,
+         total_categories, started_ts, recency_fallback) = np.array(rows, dtype=float).reshape(-1, 8).T
+        t = self.thresholds
+        
+        hours_ago = (datetime.now(timezone.utc).timestamp() - started_ts) / 3600
+        with np.errstate(invalid="ignore", divide="ignore"):
+            focus = np.where(
+                total_categories > 0,
+                0.3 + (1 - unique_categories / np.maximum(total_categories, 1)) * 0.7,
+                0.3
+            )
+            scores = {
+                "views_count": np.select(
+                    [views >= t["views_high"], views >= t["views_medium"], views >= 2, views >= 1],
+                    [1.0, 0.7, 0.4, 0.2], 0.0
+                ),
+                "cart_adds": np.select([cart_adds >= t["cart_optimal"], cart_adds == 1], [1.0, 0.6], 0.0),
+                "dwell_time": np.select(
+                    [avg_dwell >= t["dwell_engaged"], avg_dwell >= t["dwell_interested"], avg_dwell >= 30],
+                    [1.0, 0.7, 0.4], 0.1
+                ),
+                "category_focus": focus,
+                "recency": np.select(
+                    [np.isnan(started_ts), hours_ago <= 1, hours_ago <= 6, hours_ago <= 24, hours_ago <= 72],
+                    [recency_fallback, 1.0, 0.8, 0.5, 0.3], 0.1
+                ),
+            }
+        
+        probability = sum(scores[key] * self.weights.get(key, 0.1) for key in scores)
+        probability = np.clip(probability, 0.0, 1.0)
+        probability = np.where(cart_adds > 0, np.minimum(1.0, probability * 1.3), probability)
+        
+        segment = np.select(
+            [
+                (probability >= 0.7) & (scores["cart_adds"] >= 0.6),
+                (probability >= 0.5) & (scores["dwell_time"] >= 0.7),
+                (scores["views_count"] >= 0.7) & (scores["cart_adds"] == 0),
+                probability >= 0.4,
+                scores["views_count"] >= 0.4,
+            ],
+            ["hot_lead", "engaged_browser", "window_shopper", "potential_buyer", "casual_visitor"],
+            "new_visitor"
+        )
+        data_points = views + cart_adds + dwell_pages
+        confidence = np.select([data_points >= 10, data_points >= 5], ["high", "medium"], "low")
+        
+        return {
+            # round() как в predict: np.round на границах .0005 даёт другой результат
+            "probability": np.array([round(p, 3) for p in probability.tolist()]),
+            "segment": segment,
+            "confidence": confidence,
+            "scores": scores,
+        }
+    
+    async def _scored_batches(self, cursor):
+        """(sessions, scores) по SCORING_BATCH сессий из курсора"""
+        batch: List[Dict] = []
+        async for session in cursor:
+            batch.append(session)
+            if len(batch) >= SCORING_BATCH:
+                yield batch, self.score_features([self._session_features(s) for s in batch])
+                batch = []
+        if batch:
+            yield batch, self.score_features([self._session_features(s) for s in batch])
+    
+    def _prediction_at(self, scored: Dict[str, np.ndarray], i: int) -> ConversionPrediction:
+        scores = {key: float(values[i]) for key, values in scored["scores"].items()}
+        factors = []
+        for key, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
+            impact = "positive" if score >= 0.5 else "negative" if score < 0.3 else "neutral"
+            factors.append({
+                "factor": key,
+                "score": round(score, 2),
+                "impact": impact,
+                "weight": self.weights.get(key, 0.1)
+            })
+        segment = str(scored["segment"][i])
+        probability = float(scored["probability"][i])
+        return ConversionPrediction(
+            probability=probability,
+            confidence=str(scored["confidence"][i]),
+            factors=factors,
+            recommendation=self._get_recommendation(segment, probability),
+            segment=segment
+        )
+    
     async def batch_predict(self, user_ids: List[str]) -> Dict[str, ConversionPrediction]:
-        """Predict conversion for multiple users."""
+        """Predict conversion for multiple users (one projected $in cursor, vectorised scoring)."""
         await self._ensure_db()
         
-        if self._db is None:
+        if self._db is None or not user_ids:
             return {}
         
         results = {}
-        
-        for user_id in user_ids:
-            session = await self._db.user_sessions.find_one(
-                {"user_id": user_id},
-                {"_id": 0}
-            )
-            
-            if session:
-                context = {
-                    "user_id": user_id,
-                    "total_views": len(session.get("views", [])),
-                    "total_cart_adds": len(session.get("cart_actions", [])),
-                    "viewed_products": [v["product_id"] for v in session.get("views", [])],
-                    "viewed_categories": [],
-                    "top_dwell_pages": session.get("dwell_times", {}),
-                    "session_start": session.get("started_at")
-                }
-                
-                results[user_id] = await self.predict(context)
+        cursor = self._db.user_sessions.find(
+            {"user_id": {"$in": list(user_ids)}},
+            SESSION_FEATURE_PROJECTION
+        )
+        async for sessions, scored in self._scored_batches(cursor):
+            for i, session in enumerate(sessions):
+                # Первая сессия пользователя, как раньше find_one
+                results.setdefault(session["user_id"], self._prediction_at(scored, i))
         
         return results
     
     async def get_high_intent_users(self, min_probability: float = 0.5, limit: int = 20) -> List[Dict]:
-        """Get users with high conversion probability."""
+        """
+        Get users with high conversion probability.
+        
+        Scores every session (newest first) in vectorised batches and keeps
+        the top `limit` in a heap; ties go to the more recently updated session.
+        """
         await self._ensure_db()
         
-        if self._db is None:
+        if self._db is None or limit <= 0:
             return []
         
-        # Get all recent sessions
-        sessions = await self._db.user_sessions.find(
+        # Read-only scan: secondary-preferred
+        from database import analytics_db
+        cursor = analytics_db.user_sessions.find(
             {},
-            {"_id": 0}
-        ).sort("updated_at", -1).limit(100).to_list(100)
+            SESSION_FEATURE_PROJECTION
+        ).sort("updated_at", -1)
+        
+        # Min-heap of (probability, -seq, seq, scored, index)
+        heap: List[Tuple] = []
+        seq = 0
+        async for sessions, scored in self._scored_batches(cursor):
+            probabilities = scored["probability"]
+            for i in np.flatnonzero(probabilities >= min_probability):
+                entry = (float(probabilities[i]), -(seq + i), sessions[i].get("user_id"), scored, int(i))
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+            seq += len(sessions)
         
         high_intent = []
-        
-        for session in sessions:
-            context = {
-                "user_id": session.get("user_id"),
-                "total_views": len(session.get("views", [])),
-                "total_cart_adds": len(session.get("cart_actions", [])),
-                "viewed_products": [v["product_id"] for v in session.get("views", [])],
-                "viewed_categories": [],
-                "top_dwell_pages": session.get("dwell_times", {}),
-                "session_start": session.get("started_at")
-            }
-            
-            prediction = await self.predict(context)
-            
-            if prediction.probability >= min_probability:
-                high_intent.append({
-                    "user_id": session.get("user_id"),
-                    "probability": prediction.probability,
-                    "segment": prediction.segment,
-                    "recommendation": prediction.recommendation,
-                    "confidence": prediction.confidence
-                })
-        
-        # Sort by probability and limit
-        high_intent.sort(key=lambda x: x["probability"], reverse=True)
-        return high_intent[:limit]
+        for probability, _, user_id, scored, i in sorted(heap, key=lambda e: e[:2], reverse=True):
+            segment = str(scored["segment"][i])
+            high_intent.append({
+                "user_id": user_id,
+                "probability": probability,
+                "segment": segment,
+                "recommendation": self._get_recommendation(segment, probability),
+                "confidence": str(scored["confidence"][i])
+            })
+        return high_intent
 
 
 # Singleton instance
@@ -42,10 +42,9 @@ class EmailNotificationService:
         """Lazy init database"""
         if self._db is None:
             try:
-                from database import db
+                from database import db, sync_indexes
                 self._db = db
-                await self._db.email_logs.create_index("user_id")
-                await self._db.email_logs.create_index("email_type")
+                await sync_indexes(["email_logs"], strict=True)
             except:
                 pass
     
@@ -0,0 +1,244 @@
+"""
+Glassy Mind - Event Ingestion
+Буферизованная запись поведенческих событий Observer.
+
+Трекинг-эндпоинты не ждут MongoDB: события и обновления сессий кладутся в
+ограниченную очередь, а фоновая задача сбрасывает её пачками:
+
+- behavior_events: один insert_many на пачку
+- user_sessions: один упорядоченный bulk_write ($push/$slice, $set, upsert)
+- прочие коллекции (user_features): по bulk_write на коллекцию, после сессий
+
+Пачка сбрасывается, когда набралось EVENT_BATCH_SIZE операций или прошло
+EVENT_FLUSH_INTERVAL секунд с первой. Если очередь заполнена, запрос ждёт
+до EVENT_ENQUEUE_TIMEOUT секунд (backpressure), затем событие отбрасывается.
+Глубина очереди, задержка сброса и отброшенные события экспортируются в
+Prometheus.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pymongo import UpdateOne
+
+from utils.metrics import LatencyHistogram
+from utils.prometheus import counter, gauge, histogram, register_collector
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_MAX = int(os.getenv('EVENT_QUEUE_MAX', '10000'))
+EVENT_BATCH_SIZE = int(os.getenv('EVENT_BATCH_SIZE', '500'))
+EVENT_FLUSH_INTERVAL = float(os.getenv('EVENT_FLUSH_INTERVAL', '1.0'))
+EVENT_ENQUEUE_TIMEOUT = float(os.getenv('EVENT_ENQUEUE_TIMEOUT', '0.05'))
+
+FLUSH_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Pending(NamedTuple):
+    """Операция в очереди"""
+    collection: str
+    op: Any            # dict для behavior_events, UpdateOne для остальных
+    queued_at: float
+
+
+class EventIngestor:
+    """
+    Асинхронный буфер записи для behavior_events, user_sessions и user_features.
+
+    Запускается лениво при первом start(db); stop() сбрасывает остаток.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = EVENT_QUEUE_MAX,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_interval: float = EVENT_FLUSH_INTERVAL,
+        enqueue_timeout: float = EVENT_ENQUEUE_TIMEOUT
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._db = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[_Pending] = []
+        self._flushing: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.enqueued = 0
+        self.dropped: Dict[str, int] = {"queue_full": 0, "flush_error": 0}
+        self.flushed: Dict[str, int] = {"behavior_events": 0, "user_sessions": 0}
+        self.flushes = 0
+        self.flush_durations = LatencyHistogram()
+        self.flush_delays = LatencyHistogram()   # возраст старейшей операции пачки
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self, db) -> None:
+        """Запустить фоновый сброс (нужен работающий event loop)"""
+        if self._task is not None:
+            return
+        self._db = db
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="glassy_event_ingestor")
+        logger.info(
+            f"📥 Event ingestor started (queue={self.max_queue}, batch={self.batch_size}, "
+            f"interval={self.flush_interval}s)"
+        )
+
+    async def stop(self) -> None:
+        """Остановить фоновую задачу и записать всё, что осталось в очереди"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Пачка, которую задача уже писала, дописывается до конца (и раньше остатка)
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+            self._flushing = None
+
+        pending = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+
+    # ==================== Запись ====================
+
+    async def add_event(self, event: Dict) -> bool:
+        """Поставить документ behavior_events в очередь"""
+        return await self._put(_Pending("behavior_events", event, time.monotonic()))
+
+    async def update_session(self, user_id: str, update: Dict, upsert: bool = True) -> bool:
+        """Поставить обновление user_sessions в очередь"""
+        return await self.add_update("user_sessions", UpdateOne({"user_id": user_id}, update, upsert=upsert))
+
+    async def add_update(self, collection: str, op: UpdateOne) -> bool:
+        """Поставить произвольный UpdateOne в очередь"""
+        return await self._put(_Pending(collection, op, time.monotonic()))
+
+    async def _put(self, item: _Pending) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Backpressure: недолго ждём места, затем отбрасываем
+            try:
+                await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped["queue_full"] += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    # ==================== Сброс ====================
+
+    async def _run(self) -> None:
+        while True:
+            self._batch = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size - 1:
+                # Даём пачке набраться
+                await asyncio.sleep(self.flush_interval)
+            while len(self._batch) < self.batch_size and not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+            batch, self._batch = self._batch, []
+            # shield: отмена в stop() не должна прерывать запись вынутой из очереди пачки
+            self._flushing = asyncio.create_task(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        if not batch:
+            return
+        events = [item.op for item in batch if item.collection == "behavior_events"]
+        # user_sessions первыми, затем остальные коллекции в порядке появления
+        updates: Dict[str, List[UpdateOne]] = {"user_sessions": []}
+        for item in batch:
+            if item.collection != "behavior_events":
+                updates.setdefault(item.collection, []).append(item.op)
+
+        started = time.monotonic()
+        self.flush_delays.record(started - min(item.queued_at for item in batch))
+        try:
+            if events:
+                await self._db.behavior_events.insert_many(events, ordered=False)
+                self.flushed["behavior_events"] += len(events)
+            for collection, ops in updates.items():
+                if ops:
+                    # По порядку: несколько обновлений одного документа в пачке
+                    await self._db[collection].bulk_write(ops, ordered=True)
+                    self.flushed[collection] = self.flushed.get(collection, 0) + len(ops)
+        except Exception as e:
+            self.dropped["flush_error"] += len(batch)
+            logger.error(f"❌ Event ingestor flush failed ({len(batch)} ops): {e}")
+        self.flushes += 1
+        self.flush_durations.record(time.monotonic() - started)
+
+    # ==================== Статистика ====================
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "queue_max": self.max_queue,
+            "enqueued": self.enqueued,
+            "dropped": dict(self.dropped),
+            "flushed": dict(self.flushed),
+            "flushes": self.flushes,
+            "flush_duration": self.flush_durations.summary(),
+            "flush_delay": self.flush_delays.summary(),
+        }
+
+
+# Singleton
+event_ingestor = EventIngestor()
+
+
+def _collect_prometheus():
+    lines = gauge(
+        "glassy_event_queue_depth",
+        "Behavior events and session updates waiting to be written",
+        [({}, event_ingestor.queue_depth)]
+    )
+    lines += counter(
+        "glassy_event_enqueued",
+        "Operations accepted by the event ingestor",
+        [({}, event_ingestor.enqueued)]
+    )
+    lines += counter(
+        "glassy_event_dropped",
+        "Operations dropped by the event ingestor",
+        (({"reason": reason}, n) for reason, n in event_ingestor.dropped.items())
+    )
+    lines += counter(
+        "glassy_event_flushed",
+        "Operations written by the event ingestor",
+        (({"collection": name}, n) for name, n in event_ingestor.flushed.items())
+    )
+    lines += histogram(
+        "glassy_event_flush_duration_seconds",
+        "Time to write one batch",
+        [({}, event_ingestor.flush_durations)],
+        bounds=FLUSH_BOUNDS
+    )
+    lines += histogram(
+        "glassy_event_flush_delay_seconds",
+        "Age of the oldest operation in a batch when it was written",
+        [({}, event_ingestor.flush_delays)],
+        bounds=FLUSH_BOUNDS
+    )
+    return lines
+
+
+register_collector(_collect_prometheus)
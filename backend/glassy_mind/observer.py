@@ -14,14 +14,53 @@ Glassy Mind - Observer Module with MongoDB Persistence
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional, Any
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import asyncio
+import os
+import zlib
 
 from .state_manager import MindStateManager, AgentStatus, state_manager
 from .rules_engine import rules_engine, TriggerType, RuleReaction
+from .event_ingestor import event_ingestor
+from services.feature_store import FeatureGroup, feature_store
 
 logger = logging.getLogger(__name__)
 
+SESSION_MAX_VIEWS = 50
+SESSION_MAX_CART_ACTIONS = 30
+SESSION_META_CACHE_SIZE = 10000
+SESSION_CONTEXT_VIEWS = 20
+
+# Версия группы "session" в feature store: увеличить при изменении состава признаков
+SESSION_FEATURES_VERSION = 2
+# Группа "session" пересчитывается из user_sessions не реже, чем раз в TTL:
+# чтение, попавшее между записью user_sessions и update_op того же сброса,
+# может сохранить копию без события (или с событием дважды) - TTL её лечит
+SESSION_FEATURES_TTL = float(os.getenv('SESSION_FEATURES_TTL', '300'))
+
+# dwell_times хранит page_id ключами; "." и "$" в путях $set экранируются
+_DWELL_ESCAPES = ((".", "\\u002e"), ("$", "\\u0024"))
+
+
+def _dwell_key(page_id: str) -> str:
+    for raw, escaped in _DWELL_ESCAPES:
+        page_id = page_id.replace(raw, escaped)
+    return page_id
+
+
+def _dwell_page(key: str) -> str:
+    for raw, escaped in _DWELL_ESCAPES:
+        key = key.replace(escaped, raw)
+    return key
+
+
+def _cart_action_total(cart_action: Dict) -> float:
+    """price * quantity из product_data действия корзины (0, если цены нет)"""
+    try:
+        return float((cart_action.get("data") or {}).get("price") or 0) * int(cart_action.get("quantity", 1))
+    except (TypeError, ValueError):
+        return 0.0
+
 
 class MarketObserver:
     """
@@ -55,36 +94,20 @@ class MarketObserver:
             Dict с status, suggestion, rule_triggered
         """
         # 1. Обновляем счётчик действий
-        current_state = self.state_manager.update_state(user_id, increment_action=True)
+        current_state = await self.state_manager.update_state(user_id, increment_action=True)
         count = current_state["action_count"]
         
         logger.info(f"📡 Event: {event_type} from {user_id} (action #{count})")
         
-        # 2. Прогоняем через RulesEngine если есть контекст
-        rule_reaction = None
+        # 2-3. Прогоняем через RulesEngine если есть контекст; сработавшее правило задаёт статус
         if user_context:
-            rule_reaction = self.rules_engine.evaluate(user_context)
-        
-        # 3. Если правило сработало — используем его реакцию
-        if rule_reaction:
-            status = self._trigger_type_to_status(rule_reaction.trigger_type)
-            self.state_manager.update_state(
-                user_id,
-                status=status,
-                suggestion=rule_reaction.message
-            )
-            
-            return {
-                "status": status,
-                "suggestion": rule_reaction.message,
-                "rule_triggered": True,
-                "rule_metadata": rule_reaction.metadata,
-                "action_count": count
-            }
+            triggered = await self.apply_rules(user_id, event_type, user_context)
+            if triggered:
+                return {**triggered, "action_count": count}
         
         # 4. Fallback на простую логику по порогу
         if count == 1:
-            self.state_manager.update_state(user_id, status=AgentStatus.ANALYZING)
+            await self.state_manager.update_state(user_id, status=AgentStatus.ANALYZING)
             return {
                 "status": AgentStatus.ANALYZING,
                 "suggestion": None,
@@ -94,7 +117,7 @@ class MarketObserver:
         
         elif count >= self.state_manager.ACTION_THRESHOLD:
             suggestion = self._generate_suggestion(event_type, metadata)
-            self.state_manager.update_state(
+            await self.state_manager.update_state(
                 user_id, 
                 status=AgentStatus.READY_TO_SUGGEST,
                 suggestion=suggestion
@@ -113,6 +136,30 @@ class MarketObserver:
             "action_count": count
         }
     
+    async def apply_rules(self, user_id: str, event_type: str, user_context: Dict) -> Optional[Dict]:
+        """
+        Оценить правила для события и применить реакцию к статусу агента.
+        
+        Returns:
+            Dict со status, suggestion, rule_metadata или None, если ничего не сработало
+        """
+        rule_reaction = await self.rules_engine.evaluate(user_context, event_type)
+        if not rule_reaction:
+            return None
+        
+        status = self._trigger_type_to_status(rule_reaction.trigger_type)
+        await self.state_manager.update_state(
+            user_id,
+            status=status,
+            suggestion=rule_reaction.message
+        )
+        return {
+            "status": status,
+            "suggestion": rule_reaction.message,
+            "rule_triggered": True,
+            "rule_metadata": rule_reaction.metadata
+        }
+    
     def _trigger_type_to_status(self, trigger_type: TriggerType) -> str:
         """Конвертация TriggerType в AgentStatus"""
         mapping = {
@@ -160,7 +207,7 @@ class MarketObserver:
                     message += f"\n\n💡 {issue.suggestion}"
                 
                 # Устанавливаем статус агента
-                self.state_manager.update_state(
+                await self.state_manager.update_state(
                     user_id,
                     status=AgentStatus.READY_TO_SUGGEST,
                     suggestion=message
@@ -194,6 +241,8 @@ class Observer:
     
     def __init__(self):
         self._in_memory_sessions: Dict[str, Dict] = {}
+        # user_id -> {"ab_group", "views", "cart_actions"}: для ответов трекинга без чтения сессии
+        self._session_meta: "OrderedDict[str, Dict]" = OrderedDict()
         self._global_stats: Dict[str, Any] = defaultdict(int)
         self._db = None
         self._initialized = False
@@ -206,19 +255,30 @@ class Observer:
         """Lazy initialization of database connection"""
         if not self._initialized:
             try:
-                from database import db
+                from database import db, sync_indexes
                 self._db = db
-                # Create indexes for efficient queries
-                await self._db.user_sessions.create_index("user_id")
-                await self._db.user_sessions.create_index("updated_at")
-                await self._db.behavior_events.create_index([("user_id", 1), ("timestamp", -1)])
-                await self._db.behavior_events.create_index("event_type")
+                # Indexes are declared in config/indexes.py
+                await sync_indexes(["user_sessions", "behavior_events"], strict=True)
                 self._initialized = True
                 logger.info("✅ Observer MongoDB indexes created")
             except Exception as e:
                 logger.warning(f"MongoDB not available, using in-memory storage: {e}")
                 self._db = None
                 self._initialized = True
+        if self._db is not None and not event_ingestor.running:
+            event_ingestor.start(self._db)
+    
+    def _new_session(self, user_id: str) -> Dict:
+        return {
+            "user_id": user_id,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "views": [],
+            "cart_actions": [],
+            "dwell_times": {},
+            "current_page": None,
+            "page_entered_at": None,
+            "ab_group": self._assign_ab_group(user_id)
+        }
     
     async def _get_or_create_session(self, user_id: str) -> Dict:
         """Получить или создать сессию пользователя"""
@@ -234,43 +294,58 @@ class Observer:
                 return session
             
             # Create new session
-            new_session = {
-                "user_id": user_id,
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "views": [],
-                "cart_actions": [],
-                "dwell_times": {},
-                "current_page": None,
-                "page_entered_at": None,
-                "updated_at": datetime.now(timezone.utc).isoformat(),
-                "ab_group": self._assign_ab_group(user_id)
-            }
-            await self._db.user_sessions.insert_one(new_session)
+            new_session = self._new_session(user_id)
+            new_session["updated_at"] = datetime.now(timezone.utc).isoformat()
+            await self._db.user_sessions.insert_one(dict(new_session))
             logger.debug(f"Created new persistent session for user: {user_id}")
             return new_session
         
         # Fallback to in-memory
         if user_id not in self._in_memory_sessions:
-            self._in_memory_sessions[user_id] = {
-                "user_id": user_id,
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "views": [],
-                "cart_actions": [],
-                "dwell_times": {},
-                "current_page": None,
-                "page_entered_at": None,
-                "ab_group": self._assign_ab_group(user_id)
-            }
+            self._in_memory_sessions[user_id] = self._new_session(user_id)
         return self._in_memory_sessions[user_id]
     
+    async def _get_session_meta(self, user_id: str) -> Dict:
+        """
+        AB-группа и размеры views/cart_actions сессии.
+        
+        Читается из MongoDB один раз на пользователя и процесс, дальше
+        обновляется локально; в ответах трекинга счётчики приблизительные,
+        если пользователя обслуживают несколько воркеров.
+        """
+        meta = self._session_meta.get(user_id)
+        if meta is not None:
+            self._session_meta.move_to_end(user_id)
+            return meta
+        
+        session = None
+        if self._db is not None:
+            session = await self._db.user_sessions.find_one(
+                {"user_id": user_id},
+                {"_id": 0, "ab_group": 1, "views.product_id": 1, "cart_actions.product_id": 1}
+            )
+        else:
+            session = self._in_memory_sessions.get(user_id)
+        session = session or {}
+        meta = {
+            "ab_group": session.get("ab_group") or self._assign_ab_group(user_id),
+            "views": len(session.get("views", [])),
+            "cart_actions": len(session.get("cart_actions", [])),
+        }
+        self._session_meta[user_id] = meta
+        if len(self._session_meta) > SESSION_META_CACHE_SIZE:
+            self._session_meta.popitem(last=False)
+        return meta
+    
     def _assign_ab_group(self, user_id: str) -> str:
         """Assign user to A/B test group based on user_id hash"""
-        hash_val = hash(user_id)
+        # crc32, not hash(): every worker must pick the same group
+        hash_val = zlib.crc32(user_id.encode())
         # 50/50 split for now
         return "A" if hash_val % 2 == 0 else "B"
     
     async def _save_event(self, event_type: str, user_id: str, data: Dict):
-        """Save event to MongoDB for analytics"""
+        """Queue event for MongoDB (written in batches by event_ingestor)"""
         await self._ensure_db()
         
         if self._db is not None:
@@ -280,22 +355,46 @@ class Observer:
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "data": data
             }
-            await self._db.behavior_events.insert_one(event)
+            await event_ingestor.add_event(event)
     
-    async def _update_session(self, user_id: str, updates: Dict):
-        """Update session in MongoDB"""
+    async def _update_session(self, user_id: str, update: Dict):
+        """
+        Update session with a $set/$push update document, creating it if needed.
+        
+        MongoDB writes go through event_ingestor; the in-memory fallback
+        applies the same update directly.
+        """
         await self._ensure_db()
         
-        updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+        now = datetime.now(timezone.utc).isoformat()
+        update.setdefault("$set", {})["updated_at"] = now
         
         if self._db is not None:
-            await self._db.user_sessions.update_one(
-                {"user_id": user_id},
-                {"$set": updates}
-            )
+            meta = await self._get_session_meta(user_id)
+            touched = {path.split(".", 1)[0] for op in update.values() for path in op}
+            defaults = self._new_session(user_id)
+            defaults["ab_group"] = meta["ab_group"]
+            update["$setOnInsert"] = {k: v for k, v in defaults.items() if k not in touched}
+            await event_ingestor.update_session(user_id, update)
         else:
-            if user_id in self._in_memory_sessions:
-                self._in_memory_sessions[user_id].update(updates)
+            session = await self._get_or_create_session(user_id)
+            for path, value in update.get("$set", {}).items():
+                if path.startswith("dwell_times."):
+                    session["dwell_times"][_dwell_page(path.split(".", 1)[1])] = value
+                else:
+                    session[path] = value
+            for field, push in update.get("$push", {}).items():
+                session[field] = (session.get(field, []) + push["$each"])[push["$slice"]:]
+    
+    async def _update_features(self, user_id: str, update: Dict):
+        """Incremental update of the "session" feature group (MongoDB only)"""
+        if self._db is not None:
+            await event_ingestor.add_update("user_features", feature_store.update_op(user_id, "session", update))
+    
+    async def _update_dwell_features(self, user_id: str, session_updates: Dict):
+        dwell = {path: seconds for path, seconds in session_updates.items() if path.startswith("dwell_times.")}
+        if dwell:
+            await self._update_features(user_id, {"$set": dwell})
     
     async def track_user_view(
         self, 
@@ -304,7 +403,8 @@ class Observer:
         product_data: Optional[Dict] = None
     ) -> Dict:
         """Отслеживание просмотра товара с сохранением в MongoDB"""
-        session = await self._get_or_create_session(user_id)
+        await self._ensure_db()
+        meta = await self._get_session_meta(user_id)
         
         view_event = {
             "product_id": product_id,
@@ -313,22 +413,28 @@ class Observer:
         }
         
         # Update session views (keep last 50)
-        views = session.get("views", [])
-        views.append(view_event)
-        views = views[-50:]  # Keep only last 50 views
-        
-        await self._update_session(user_id, {"views": views})
+        await self._update_session(user_id, {
+            "$push": {"views": {"$each": [view_event], "$slice": -SESSION_MAX_VIEWS}}
+        })
+        await self._update_features(user_id, {
+            "$push": {
+                "viewed_products": {"$each": [product_id], "$slice": -SESSION_CONTEXT_VIEWS},
+                "recent_categories": {"$each": [view_event["data"].get("category")], "$slice": -SESSION_CONTEXT_VIEWS}
+            },
+            "$inc": {"total_views": 1}
+        })
         await self._save_event("view", user_id, view_event)
+        meta["views"] = min(meta["views"] + 1, SESSION_MAX_VIEWS)
         
         self._global_stats["total_views"] += 1
-        logger.info(f"👁️ View tracked: user={user_id}, product={product_id}")
+        logger.debug(f"👁️ View tracked: user={user_id}, product={product_id}")
         
         return {
             "event": "view",
             "user_id": user_id,
             "product_id": product_id,
-            "total_views_in_session": len(views),
-            "ab_group": session.get("ab_group", "A")
+            "total_views_in_session": meta["views"],
+            "ab_group": meta["ab_group"]
         }
     
     async def track_cart_add(
@@ -339,7 +445,8 @@ class Observer:
         product_data: Optional[Dict] = None
     ) -> Dict:
         """Отслеживание добавления в корзину с сохранением в MongoDB"""
-        session = await self._get_or_create_session(user_id)
+        await self._ensure_db()
+        meta = await self._get_session_meta(user_id)
         
         cart_event = {
             "product_id": product_id,
@@ -348,37 +455,60 @@ class Observer:
             "data": product_data or {}
         }
         
-        cart_actions = session.get("cart_actions", [])
-        cart_actions.append(cart_event)
-        cart_actions = cart_actions[-30:]  # Keep last 30 cart actions
-        
-        await self._update_session(user_id, {"cart_actions": cart_actions})
+        # Keep last 30 cart actions
+        await self._update_session(user_id, {
+            "$push": {"cart_actions": {"$each": [cart_event], "$slice": -SESSION_MAX_CART_ACTIONS}}
+        })
+        await self._update_features(user_id, {
+            "$push": {"cart_products": {"$each": [product_id], "$slice": -SESSION_MAX_CART_ACTIONS}},
+            "$inc": {"total_cart_adds": 1, "cart_total": _cart_action_total(cart_event)}
+        })
         await self._save_event("cart_add", user_id, cart_event)
+        meta["cart_actions"] = min(meta["cart_actions"] + 1, SESSION_MAX_CART_ACTIONS)
         
         self._global_stats["total_cart_adds"] += 1
-        logger.info(f"🛒 Cart add tracked: user={user_id}, product={product_id}, qty={quantity}")
+        logger.debug(f"🛒 Cart add tracked: user={user_id}, product={product_id}, qty={quantity}")
         
         return {
             "event": "cart_add",
             "user_id": user_id,
             "product_id": product_id,
             "quantity": quantity,
-            "total_cart_actions": len(cart_actions)
+            "total_cart_actions": meta["cart_actions"]
         }
     
+    async def _get_current_page(self, user_id: str) -> Dict:
+        """current_page / page_entered_at сессии (без массивов)"""
+        await self._ensure_db()
+        if self._db is not None:
+            return await self._db.user_sessions.find_one(
+                {"user_id": user_id},
+                {"_id": 0, "current_page": 1, "page_entered_at": 1}
+            ) or {}
+        return self._in_memory_sessions.get(user_id) or {}
+    
     async def analyze_dwell_time(
         self, 
         user_id: str, 
         page_id: str, 
         action: str = "enter"
     ) -> Dict:
-        """Анализ времени на странице (dwell time) с сохранением в MongoDB"""
-        session = await self._get_or_create_session(user_id)
+        """
+        Анализ времени на странице (dwell time) с сохранением в MongoDB.
+        
+        Записи сессии буферизуются, поэтому уход со страницы раньше чем через
+        EVENT_FLUSH_INTERVAL после входа может не найти current_page.
+        """
+        session = await self._get_current_page(user_id)
         now = datetime.now(timezone.utc)
         
         if action == "enter":
+            updates = {
+                "current_page": page_id,
+                "page_entered_at": now.isoformat()
+            }
+            
             # Calculate dwell time for previous page
-            dwell_times = session.get("dwell_times", {})
             current_page = session.get("current_page")
             page_entered_at = session.get("page_entered_at")
             
@@ -386,18 +516,15 @@ class Observer:
                 try:
                     entered_dt = datetime.fromisoformat(page_entered_at.replace('Z', '+00:00'))
                     dwell_seconds = (now - entered_dt).total_seconds()
-                    dwell_times[current_page] = dwell_seconds
+                    updates[f"dwell_times.{_dwell_key(current_page)}"] = dwell_seconds
                     logger.debug(f"Dwell time recorded: {current_page} = {dwell_seconds:.1f}s")
                 except:
                     pass
             
-            await self._update_session(user_id, {
-                "current_page": page_id,
-                "page_entered_at": now.isoformat(),
-                "dwell_times": dwell_times
-            })
+            await self._update_session(user_id, {"$set": updates})
+            await self._update_dwell_features(user_id, updates)
             
-            logger.info(f"📍 Page enter: user={user_id}, page={page_id}")
+            logger.debug(f"📍 Page enter: user={user_id}, page={page_id}")
             
             return {
                 "event": "page_enter",
@@ -407,29 +534,29 @@ class Observer:
         
         elif action == "leave":
             dwell_seconds = 0.0
-            dwell_times = session.get("dwell_times", {})
+            updates = {
+                "current_page": None,
+                "page_entered_at": None
+            }
             page_entered_at = session.get("page_entered_at")
             
             if session.get("current_page") == page_id and page_entered_at:
                 try:
                     entered_dt = datetime.fromisoformat(page_entered_at.replace('Z', '+00:00'))
                     dwell_seconds = (now - entered_dt).total_seconds()
-                    dwell_times[page_id] = dwell_seconds
+                    updates[f"dwell_times.{_dwell_key(page_id)}"] = dwell_seconds
                 except:
                     pass
             
-            await self._update_session(user_id, {
-                "current_page": None,
-                "page_entered_at": None,
-                "dwell_times": dwell_times
-            })
+            await self._update_session(user_id, {"$set": updates})
+            await self._update_dwell_features(user_id, updates)
             
             await self._save_event("dwell", user_id, {
                 "page_id": page_id,
                 "dwell_seconds": dwell_seconds
             })
             
-            logger.info(f"📍 Page leave: user={user_id}, page={page_id}, dwell={dwell_seconds:.1f}s")
+            logger.debug(f"📍 Page leave: user={user_id}, page={page_id}, dwell={dwell_seconds:.1f}s")
             
             return {
                 "event": "page_leave",
@@ -440,42 +567,62 @@ class Observer:
         
         return {"event": "unknown", "action": action}
     
-    async def get_user_context(self, user_id: str) -> Dict:
-        """Получить полный контекст пользователя для AI"""
-        session = await self._get_or_create_session(user_id)
-        
+    def _session_features(self, user_id: str, session: Dict) -> Dict:
+        """Группа "session" feature store из документа сессии"""
         views = session.get("views", [])
         cart_actions = session.get("cart_actions", [])
-        dwell_times = session.get("dwell_times", {})
-        
-        # Categories from views
-        viewed_categories = []
-        viewed_products = []
-        for view in views[-20:]:
-            viewed_products.append(view["product_id"])
-            if "data" in view and "category" in view["data"]:
-                viewed_categories.append(view["data"]["category"])
-        
-        # Cart products
-        cart_products = [ca["product_id"] for ca in cart_actions]
-        
-        # Top dwell pages
-        top_pages = sorted(
-            dwell_times.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:5]
-        
+        recent_views = views[-SESSION_CONTEXT_VIEWS:]
         return {
-            "user_id": user_id,
             "session_start": session.get("started_at"),
-            "viewed_products": viewed_products,
-            "viewed_categories": list(set(viewed_categories)),
-            "cart_products": cart_products,
-            "top_dwell_pages": dict(top_pages),
+            "ab_group": session.get("ab_group") or self._assign_ab_group(user_id),
+            "viewed_products": [view["product_id"] for view in recent_views],
+            "recent_categories": [(view.get("data") or {}).get("category") for view in recent_views],
+            "cart_products": [ca["product_id"] for ca in cart_actions],
+            "cart_total": sum(_cart_action_total(ca) for ca in cart_actions),
+            "dwell_times": session.get("dwell_times", {}),
             "total_views": len(views),
             "total_cart_adds": len(cart_actions),
-            "ab_group": session.get("ab_group", "A")
+        }
+    
+    async def _load_session_features(self, user_id: str) -> Dict:
+        """Loader группы "session": одна проекция user_sessions"""
+        await self._ensure_db()
+        session = await self._db.user_sessions.find_one(
+            {"user_id": user_id},
+            {
+                "_id": 0, "started_at": 1, "ab_group": 1, "dwell_times": 1,
+                "views.product_id": 1, "views.data.category": 1,
+                "cart_actions.product_id": 1, "cart_actions.quantity": 1, "cart_actions.data.price": 1
+            }
+        )
+        return self._session_features(user_id, session or {})
+    
+    async def get_user_context(self, user_id: str) -> Dict:
+        """Получить полный контекст пользователя для AI (группа "session" feature store)"""
+        await self._ensure_db()
+        if self._db is not None:
+            features = (await feature_store.get(user_id, ["session"]))["session"]
+        else:
+            session = await self._get_or_create_session(user_id)
+            features = self._session_features(user_id, session)
+        
+        dwell_times = {_dwell_page(page): seconds for page, seconds in features["dwell_times"].items()}
+        top_pages = sorted(dwell_times.items(), key=lambda x: x[1], reverse=True)[:5]
+        
+        return {
+            "user_id": user_id,
+            "session_start": features["session_start"],
+            "viewed_products": features["viewed_products"],
+            "viewed_categories": list({c for c in features["recent_categories"] if c is not None}),
+            # С повторами: частоты категорий для правил
+            "recent_categories": [c for c in features["recent_categories"] if c is not None],
+            "cart_products": features["cart_products"],
+            "cart_total": features["cart_total"],
+            "top_dwell_pages": dict(top_pages),
+            # Счётчики инкрементальные; в сессии массивы обрезаются $slice
+            "total_views": min(features["total_views"], SESSION_MAX_VIEWS),
+            "total_cart_adds": min(features["total_cart_adds"], SESSION_MAX_CART_ACTIONS),
+            "ab_group": features["ab_group"]
         }
     
     async def get_global_stats(self) -> Dict:
@@ -503,7 +650,8 @@ class Observer:
                 "total_sessions": total_sessions,
                 "total_events": total_events,
                 "views_last_24h": recent_views,
-                "storage": "mongodb"
+                "storage": "mongodb",
+                "ingestion": event_ingestor.summary()
             })
         else:
             stats.update({
@@ -569,14 +717,14 @@ class Observer:
         Установить статус агента для пользователя.
         Делегирует в state_manager.
         """
-        self.state_manager.update_state(user_id, status=status, suggestion=suggestion)
+        await self.state_manager.update_state(user_id, status=status, suggestion=suggestion)
         logger.info(f"🎯 Agent status for {user_id}: {status}" + (f" - '{suggestion[:50]}...'" if suggestion else ""))
     
     async def get_agent_status(self, user_id: str) -> Dict:
         """
         Получить текущий статус агента для пользователя.
         """
-        state = self.state_manager.get_user_state(user_id)
+        state = await self.state_manager.get_user_state(user_id)
         return {
             "status": state.get("status", AgentStatus.IDLE),
             "updated_at": state.get("last_active", datetime.now(timezone.utc)).isoformat() if state.get("last_active") else datetime.now(timezone.utc).isoformat(),
@@ -584,6 +732,17 @@ class Observer:
             "action_count": state.get("action_count", 0)
         }
     
+    async def evaluate_rules(self, user_id: str, event_type: str, current_page: Optional[str] = None) -> Optional[Dict]:
+        """
+        Прогнать правила для события трекинга (/track/*) по контексту пользователя.
+        
+        Записи сессии буферизуются, поэтому контекст может ещё не включать
+        само событие: правило сработает на следующем.
+        """
+        context = await self.get_user_context(user_id)
+        context["current_page"] = current_page or ""
+        return await self.market_observer.apply_rules(user_id, event_type, context)
+    
     async def process_event(self, user_id: str, event_type: str, metadata: Optional[Dict] = None) -> str:
         """
         Обработать событие пользователя через MarketObserver.
@@ -597,7 +756,7 @@ class Observer:
         
         Теперь также учитывает action_count из state_manager.
         """
-        state = self.state_manager.get_user_state(user_id)
+        state = await self.state_manager.get_user_state(user_id)
         
         # Если уже есть подсказка готова — возвращаем её
         if state.get("status") == AgentStatus.READY_TO_SUGGEST and state.get("suggestion"):
@@ -607,7 +766,7 @@ class Observer:
         if state.get("action_count", 0) >= self.state_manager.ACTION_THRESHOLD:
             context = await self.get_user_context(user_id)
             suggestion = self._generate_context_suggestion(context)
-            self.state_manager.set_suggestion(user_id, suggestion)
+            await self.state_manager.set_suggestion(user_id, suggestion)
             return suggestion
         
         # Иначе анализируем контекст
@@ -634,9 +793,9 @@ class Observer:
         
         # Устанавливаем финальный статус
         if suggestion:
-            self.state_manager.set_suggestion(user_id, suggestion)
+            await self.state_manager.set_suggestion(user_id, suggestion)
         else:
-            self.state_manager.update_state(user_id, status=AgentStatus.IDLE)
+            await self.state_manager.update_state(user_id, status=AgentStatus.IDLE)
         
         return suggestion
     
@@ -654,8 +813,13 @@ class Observer:
     
     async def clear_suggestion(self, user_id: str):
         """Сбрасывает статус обратно в idle после показа подсказки"""
-        self.state_manager.clear_suggestion(user_id)
+        await self.state_manager.clear_suggestion(user_id)
 
 
 # Singleton instance
 observer = Observer()
+
+# Контекст правил и AI читается из feature store одной выборкой
+feature_store.register(FeatureGroup(
+    "session", SESSION_FEATURES_VERSION, observer._load_session_features, ttl_seconds=SESSION_FEATURES_TTL
+))
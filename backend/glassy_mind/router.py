@@ -73,6 +73,7 @@ class ChatRequest(BaseModel):
 @router.post("/track/view")
 async def track_view(
     request: TrackViewRequest,
+    background_tasks: BackgroundTasks,
     current_user: Optional[dict] = Depends(get_optional_user)
 ):
     """Отслеживание просмотра товара с сохранением в MongoDB."""
@@ -83,6 +84,8 @@ async def track_view(
         product_id=request.product_id,
         product_data=request.product_data
     )
+    # Правила, подписанные на просмотры, — после ответа
+    background_tasks.add_task(observer.evaluate_rules, user_id, "view")
     
     return {
         "success": True,
@@ -93,6 +96,7 @@ async def track_view(
 @router.post("/track/cart")
 async def track_cart_add(
     request: TrackCartRequest,
+    background_tasks: BackgroundTasks,
     current_user: Optional[dict] = Depends(get_optional_user)
 ):
     """Отслеживание добавления в корзину."""
@@ -104,6 +108,7 @@ async def track_cart_add(
         quantity=request.quantity,
         product_data=request.product_data
     )
+    background_tasks.add_task(observer.evaluate_rules, user_id, "cart_add")
     
     return {
         "success": True,
@@ -114,6 +119,7 @@ async def track_cart_add(
 @router.post("/track/dwell")
 async def track_dwell_time(
     request: DwellTimeRequest,
+    background_tasks: BackgroundTasks,
     current_user: Optional[dict] = Depends(get_optional_user)
 ):
     """Отслеживание времени на странице."""
@@ -124,6 +130,8 @@ async def track_dwell_time(
         page_id=request.page_id,
         action=request.action
     )
+    current_page = request.page_id if request.action == "enter" else None
+    background_tasks.add_task(observer.evaluate_rules, user_id, "dwell", current_page)
     
     return {
         "success": True,
@@ -405,7 +413,7 @@ async def get_mind_status():
             "GET /api/mind/ab-test/results",
             "GET /api/mind/ab-test/my-group"
         ],
-        "state_manager_stats": state_manager.get_stats()
+        "state_manager_stats": await state_manager.get_stats()
     }
 
 
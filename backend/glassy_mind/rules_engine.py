@@ -4,14 +4,24 @@ Glassy Mind - Rules Engine
 
 Анализирует контекст пользователя и определяет, когда агент должен вмешаться.
 Правила основаны на паттернах поведения, не просто на количестве кликов.
+
+Правила компилируются в таблицу диспетчеризации:
+- каждое правило объявляет признаки контекста (features), от которых
+  зависит, и типы событий (events), которые могут их изменить
+- на событие оцениваются только правила, подписанные на его тип
+  (плюс правила без events — они зависят от чего угодно)
+- производные признаки (DERIVED_FEATURES, например частоты категорий)
+  считаются лениво один раз за оценку и общие для всех правил
 """
 
 import logging
+from collections import Counter
 from dataclasses import dataclass
-from typing import Callable, Dict, List, Optional, Any
-from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from enum import Enum
 
+from .state_manager import state_manager
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +47,51 @@ class RuleReaction:
             self.metadata = {}
 
 
+# ==================== Признаки контекста ====================
+
+def _builder_dwell_seconds(ctx: "RuleContext") -> float:
+    """Максимальное время на страницах сборки ПК"""
+    return max(
+        (
+            seconds for page, seconds in ctx.get("top_dwell_pages", {}).items()
+            if "pc-builder" in page.lower() or "assembly" in page.lower()
+        ),
+        default=0
+    )
+
+
+# Производные признаки: имя -> функция от RuleContext
+DERIVED_FEATURES: Dict[str, Callable[["RuleContext"], Any]] = {
+    # recent_categories — с повторами; viewed_categories в контексте Observer уникальны
+    "category_counts": lambda ctx: Counter(ctx.get("recent_categories", ctx.get("viewed_categories", []))),
+    "top_category_views": lambda ctx: max(ctx.feature("category_counts").values(), default=0),
+    "cart_size": lambda ctx: len(ctx.get("cart_products", [])),
+    "builder_dwell_seconds": _builder_dwell_seconds,
+    "current_page_lower": lambda ctx: (ctx.get("current_page") or "").lower(),
+}
+
+
+class RuleContext(dict):
+    """
+    Контекст пользователя для условий правил.
+    
+    Обычный dict (ctx.get работает как раньше) плюс ctx.feature(name):
+    производный признак, посчитанный один раз за оценку.
+    """
+    __slots__ = ("_features",)
+    
+    def __init__(self, user_context: Dict):
+        super().__init__(user_context)
+        self._features: Dict[str, Any] = {}
+    
+    def feature(self, name: str) -> Any:
+        try:
+            return self._features[name]
+        except KeyError:
+            value = self._features[name] = DERIVED_FEATURES[name](self)
+            return value
+
+
 @dataclass 
 class Rule:
     """
@@ -45,15 +100,19 @@ class Rule:
     Attributes:
         name: Уникальное имя правила
         description: Описание для логов
-        condition: Функция (user_context) -> bool
+        condition: Функция (RuleContext) -> bool
         reaction: Результат при срабатывании
         cooldown_minutes: Минимальное время между срабатываниями
+        features: Ключи контекста / производные признаки, которые читает condition
+        events: Типы событий, меняющие эти признаки (None — любое событие)
     """
     name: str
     description: str
     condition: Callable[[Dict], bool]
     reaction: RuleReaction
     cooldown_minutes: int = 30
+    features: Tuple[str, ...] = ()
+    events: Optional[Tuple[str, ...]] = None
 
 
 class RulesEngine:
@@ -66,8 +125,10 @@ class RulesEngine:
     
     def __init__(self):
         self.rules: List[Rule] = []
-        self._rule_cooldowns: Dict[str, Dict[str, datetime]] = {}  # user_id -> {rule_name -> last_triggered}
+        self._dispatch: Dict[str, Tuple[Rule, ...]] = {}
+        self._wildcard: Tuple[Rule, ...] = ()
         self._init_default_rules()
+        self.compile()
         logger.info(f"⚙️ RulesEngine initialized with {len(self.rules)} rules")
     
     def _init_default_rules(self):
@@ -79,20 +140,11 @@ class RulesEngine:
             Условие: Пользователь посетил одну категорию > 4 раз
             и ничего не добавил в корзину.
             """
-            viewed_categories = ctx.get("viewed_categories", [])
-            cart_products = ctx.get("cart_products", [])
-            
-            if cart_products:  # Уже что-то в корзине — не нерешительный
+            if ctx.feature("cart_size"):  # Уже что-то в корзине — не нерешительный
                 return False
             
-            # Считаем повторы категорий
-            category_counts = {}
-            for cat in viewed_categories:
-                category_counts[cat] = category_counts.get(cat, 0) + 1
-            
             # Если какая-то категория просмотрена > 4 раз
-            max_views = max(category_counts.values()) if category_counts else 0
-            return max_views > 4
+            return ctx.feature("top_category_views") > 4
         
         self.rules.append(Rule(
             name="hesitation",
@@ -103,7 +155,9 @@ class RulesEngine:
                 message="Помочь сравнить характеристики?",
                 priority=2
             ),
-            cooldown_minutes=15
+            cooldown_minutes=15,
+            features=("top_category_views", "cart_size"),
+            events=("view", "cart_add")
         ))
         
         # ==================== RULE 2: Big Spender (Мажор) ====================
@@ -125,7 +179,9 @@ class RulesEngine:
                 priority=3,
                 metadata={"show_analyzing_first": True}
             ),
-            cooldown_minutes=60
+            cooldown_minutes=60,
+            features=("cart_total",),
+            events=("cart_add",)
         ))
         
         # ==================== RULE 3: Tech Geek (Гик) ====================
@@ -133,15 +189,7 @@ class RulesEngine:
             """
             Условие: Пользователь на /pc-builder > 5 минут.
             """
-            top_dwell_pages = ctx.get("top_dwell_pages", {})
-            
-            # Ищем страницу pc-builder
-            for page, dwell_seconds in top_dwell_pages.items():
-                if "pc-builder" in page.lower() or "assembly" in page.lower():
-                    if dwell_seconds > 300:  # 5 минут = 300 секунд
-                        return True
-            
-            return False
+            return ctx.feature("builder_dwell_seconds") > 300  # 5 минут = 300 секунд
         
         self.rules.append(Rule(
             name="tech_geek",
@@ -153,7 +201,9 @@ class RulesEngine:
                 priority=2,
                 metadata={"tip_type": "cable_management"}
             ),
-            cooldown_minutes=30
+            cooldown_minutes=30,
+            features=("builder_dwell_seconds",),
+            events=("dwell",)
         ))
         
         # ==================== RULE 4: Window Shopper (Витринный покупатель) ====================
@@ -161,9 +211,7 @@ class RulesEngine:
             """
             Условие: Много просмотров (> 10), но 0 в корзине.
             """
-            total_views = ctx.get("total_views", 0)
-            cart_products = ctx.get("cart_products", [])
-            return total_views > 10 and len(cart_products) == 0
+            return ctx.get("total_views", 0) > 10 and ctx.feature("cart_size") == 0
         
         self.rules.append(Rule(
             name="window_shopper",
@@ -174,7 +222,9 @@ class RulesEngine:
                 message="Не можете определиться? Давайте подберём вместе!",
                 priority=1
             ),
-            cooldown_minutes=20
+            cooldown_minutes=20,
+            features=("total_views", "cart_size"),
+            events=("view", "cart_add")
         ))
         
         # ==================== RULE 5: Cart Abandonment Risk ====================
@@ -183,18 +233,11 @@ class RulesEngine:
             Условие: Есть товары в корзине, но пользователь
             смотрит другие страницы (не checkout).
             """
-            cart_products = ctx.get("cart_products", [])
-            current_page = ctx.get("current_page", "")
-            total_views = ctx.get("total_views", 0)
-            
-            if len(cart_products) == 0:
+            if ctx.feature("cart_size") == 0:
                 return False
             
             # Корзина не пуста, но пользователь ушёл с checkout
-            if "checkout" not in current_page.lower() and total_views > 5:
-                return True
-            
-            return False
+            return "checkout" not in ctx.feature("current_page_lower") and ctx.get("total_views", 0) > 5
         
         self.rules.append(Rule(
             name="cart_abandonment_risk",
@@ -206,7 +249,9 @@ class RulesEngine:
                 priority=2,
                 metadata={"queue_email": True}
             ),
-            cooldown_minutes=45
+            cooldown_minutes=45,
+            # current_page приходит с каждым событием
+            features=("cart_size", "current_page_lower", "total_views")
         ))
         
         # ==================== RULE 6: Comparison Mode ====================
@@ -214,19 +259,11 @@ class RulesEngine:
             """
             Условие: Пользователь открывал > 3 разных товаров одной категории.
             """
-            viewed_products = ctx.get("viewed_products", [])
-            viewed_categories = ctx.get("viewed_categories", [])
-            
-            if len(viewed_products) < 3:
+            if len(ctx.get("viewed_products", [])) < 3:
                 return False
             
             # Проверяем, что категория повторяется
-            if viewed_categories:
-                main_category = max(set(viewed_categories), key=viewed_categories.count)
-                category_count = viewed_categories.count(main_category)
-                return category_count >= 3
-            
-            return False
+            return ctx.feature("top_category_views") >= 3
         
         self.rules.append(Rule(
             name="comparison_mode",
@@ -237,7 +274,9 @@ class RulesEngine:
                 message="Сравнить выбранные товары бок о бок?",
                 priority=2
             ),
-            cooldown_minutes=10
+            cooldown_minutes=10,
+            features=("viewed_products", "top_category_views"),
+            events=("view",)
         ))
         
         # ==================== RULE 7: Incompatible Build Risk ====================
@@ -246,8 +285,7 @@ class RulesEngine:
             Условие: В корзине/сборке есть несовместимые компоненты.
             Проверяется через CompatibilityService.
             """
-            compatibility_issues = ctx.get("compatibility_issues", [])
-            return len(compatibility_issues) > 0
+            return len(ctx.get("compatibility_issues", [])) > 0
         
         self.rules.append(Rule(
             name="incompatible_build_risk",
@@ -259,55 +297,84 @@ class RulesEngine:
                 priority=5,  # Наивысший приоритет
                 metadata={"show_compatibility_modal": True, "urgent": True}
             ),
-            cooldown_minutes=5  # Быстрый cooldown для критических ошибок
+            cooldown_minutes=5,  # Быстрый cooldown для критических ошибок
+            features=("compatibility_issues",),
+            events=("cart_add", "build_complete")
         ))
     
-    def _check_cooldown(self, user_id: str, rule_name: str, cooldown_minutes: int) -> bool:
-        """Проверить, не на кулдауне ли правило"""
-        if user_id not in self._rule_cooldowns:
-            return True
-        
-        if rule_name not in self._rule_cooldowns[user_id]:
-            return True
-        
-        last_triggered = self._rule_cooldowns[user_id][rule_name]
-        cooldown_delta = timedelta(minutes=cooldown_minutes)
-        
-        return datetime.now(timezone.utc) - last_triggered > cooldown_delta
+    # ==================== Компиляция ====================
     
-    def _set_cooldown(self, user_id: str, rule_name: str):
-        """Установить кулдаун для правила"""
-        if user_id not in self._rule_cooldowns:
-            self._rule_cooldowns[user_id] = {}
+    def compile(self):
+        """
+        Построить таблицу событие -> правила.
         
-        self._rule_cooldowns[user_id][rule_name] = datetime.now(timezone.utc)
+        Правила без events попадают в каждую строку и в _wildcard (для
+        типов событий, на которые никто не подписан). Порядок правил
+        внутри строки — порядок регистрации.
+        """
+        event_types = {event for rule in self.rules for event in rule.events or ()}
+        self._wildcard = tuple(rule for rule in self.rules if rule.events is None)
+        self._dispatch = {
+            event: tuple(rule for rule in self.rules if rule.events is None or event in rule.events)
+            for event in event_types
+        }
+    
+    def rules_for(self, event_type: Optional[str] = None) -> Tuple[Rule, ...]:
+        """Правила, которые может затронуть событие (все, если тип не указан)"""
+        if event_type is None:
+            return tuple(self.rules)
+        return self._dispatch.get(event_type, self._wildcard)
+    
+    def match(self, user_context: Dict, event_type: Optional[str] = None, skip: frozenset = frozenset()) -> List[Rule]:
+        """Правила, чьи условия выполнены (без учёта кулдаунов, кроме `skip`)"""
+        ctx = user_context if isinstance(user_context, RuleContext) else RuleContext(user_context)
+        matched: List[Rule] = []
+        for rule in self.rules_for(event_type):
+            if rule.name in skip:
+                continue
+            try:
+                if rule.condition(ctx):
+                    matched.append(rule)
+            except Exception as e:
+                logger.warning(f"Rule '{rule.name}' evaluation failed: {e}")
+        return matched
     
-    def evaluate(self, user_context: Dict) -> Optional[RuleReaction]:
+    async def evaluate(self, user_context: Dict, event_type: Optional[str] = None) -> Optional[RuleReaction]:
         """
         Оценить контекст пользователя и вернуть реакцию.
         
+        Оцениваются только правила, подписанные на event_type (все, если
+        он не указан). Кулдауны хранятся в state_manager (ключи Redis с
+        TTL), поэтому правило срабатывает раз в cooldown_minutes на всех
+        воркерах.
+        
         Args:
             user_context: Контекст от Observer (viewed_products, cart_products, etc.)
+            event_type: Тип события, вызвавшего оценку
             
         Returns:
             RuleReaction если какое-то правило сработало, иначе None
         """
         user_id = user_context.get("user_id", "guest")
-        triggered_reactions: List[RuleReaction] = []
+        candidates = self.rules_for(event_type)
+        if not candidates:
+            return None
         
-        for rule in self.rules:
-            # Проверяем кулдаун
-            if not self._check_cooldown(user_id, rule.name, rule.cooldown_minutes):
-                continue
-            
-            # Проверяем условие
-            try:
-                if rule.condition(user_context):
-                    logger.info(f"🎯 Rule '{rule.name}' triggered for user {user_id}")
-                    triggered_reactions.append(rule.reaction)
-                    self._set_cooldown(user_id, rule.name)
-            except Exception as e:
-                logger.warning(f"Rule '{rule.name}' evaluation failed: {e}")
+        # Проверяем кулдауны кандидатов одним запросом
+        cooling = await state_manager.active_cooldowns(user_id, [rule.name for rule in candidates])
+        matched = self.match(user_context, event_type, skip=frozenset(cooling))
+        if not matched:
+            return None
+        
+        # Срабатывают только правила, кулдаун которых поставили мы
+        started = await state_manager.start_cooldowns(
+            user_id, {rule.name: rule.cooldown_minutes * 60 for rule in matched}
+        )
+        triggered_reactions: List[RuleReaction] = []
+        for rule in matched:
+            if rule.name in started:
+                logger.info(f"🎯 Rule '{rule.name}' triggered for user {user_id}")
+                triggered_reactions.append(rule.reaction)
         
         if not triggered_reactions:
             return None
@@ -321,6 +388,7 @@ class RulesEngine:
     def add_rule(self, rule: Rule):
         """Добавить кастомное правило"""
         self.rules.append(rule)
+        self.compile()
         logger.info(f"➕ Added rule: {rule.name}")
     
     def get_rules_info(self) -> List[Dict]:
@@ -330,6 +398,8 @@ class RulesEngine:
                 "name": rule.name,
                 "description": rule.description,
                 "cooldown_minutes": rule.cooldown_minutes,
+                "features": list(rule.features),
+                "events": list(rule.events) if rule.events is not None else None,
                 "reaction_type": rule.reaction.trigger_type.value,
                 "reaction_message": rule.reaction.message,
                 "priority": rule.reaction.priority
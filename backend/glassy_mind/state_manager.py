@@ -1,20 +1,40 @@
 """
 Glassy Mind - State Manager
-Singleton для управления состоянием агента в памяти.
+Singleton для управления состоянием агента.
 
 Хранит для каждого пользователя:
 - status: текущий статус агента (idle, analyzing, ready_to_suggest)
 - action_count: количество действий с момента последнего сброса
 - last_active: время последней активности
 - suggestion: текст подсказки (если есть)
+
+И кулдауны правил RulesEngine (user_id + rule -> время окончания).
+
+Хранилище подключаемое (MIND_STATE_BACKEND):
+- redis (по умолчанию): hash на пользователя и ключ на кулдаун с TTL,
+  общие для всех воркеров; пайплайны, атомарный HINCRBY для action_count
+- memory: в процессе, LRU на MIND_STATE_MAX_USERS и вытеснение после
+  MIND_STATE_TTL_SECONDS бездействия
+
+В обоих случаях состояние неактивного пользователя удаляется через
+MIND_STATE_TTL_SECONDS.
 """
 
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Set
 import logging
+import os
+import time
+
+from utils.cache import get_redis
 
 logger = logging.getLogger(__name__)
 
+MIND_STATE_BACKEND = os.getenv('MIND_STATE_BACKEND', 'redis').lower()
+MIND_STATE_TTL_SECONDS = int(os.getenv('MIND_STATE_TTL_SECONDS', str(24 * 3600)))
+MIND_STATE_MAX_USERS = int(os.getenv('MIND_STATE_MAX_USERS', '50000'))
+
 
 class AgentStatus:
     """Константы статусов агента"""
@@ -23,144 +43,380 @@ class AgentStatus:
     READY_TO_SUGGEST = "ready_to_suggest"
 
 
+def _default_state() -> Dict:
+    return {
+        "status": AgentStatus.IDLE,
+        "action_count": 0,
+        "last_active": None,
+        "suggestion": None
+    }
+
+
+def _empty_stats() -> Dict[str, int]:
+    return {
+        AgentStatus.IDLE: 0,
+        AgentStatus.ANALYZING: 0,
+        AgentStatus.READY_TO_SUGGEST: 0
+    }
+
+
+# ==================== Backends ====================
+
+class MemoryStateBackend:
+    """
+    Состояние в памяти процесса.
+
+    OrderedDict в порядке последнего обращения: голова — самые давние,
+    поэтому и LRU-вытеснение, и удаление по idle-TTL снимают записи с головы.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_users: int = MIND_STATE_MAX_USERS, idle_ttl: float = MIND_STATE_TTL_SECONDS):
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self._states: "OrderedDict[str, Dict]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._cooldowns: "OrderedDict[str, float]" = OrderedDict()  # "user_id:rule" -> expires_at
+        self.evictions = 0
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._states:
+            user_id = next(iter(self._states))
+            if len(self._states) <= self.max_users and now - self._touched[user_id] <= self.idle_ttl:
+                break
+            del self._states[user_id]
+            del self._touched[user_id]
+            self.evictions += 1
+        while self._cooldowns:
+            key, expires_at = next(iter(self._cooldowns.items()))
+            if len(self._cooldowns) <= self.max_users and expires_at > now:
+                break
+            del self._cooldowns[key]
+
+    def _get(self, user_id: str, create: bool = False) -> Optional[Dict]:
+        self._evict()
+        state = self._states.get(user_id)
+        if state is None:
+            if not create:
+                return None
+            state = _default_state()
+            state["last_active"] = datetime.now(timezone.utc)
+            self._states[user_id] = state
+        else:
+            self._states.move_to_end(user_id)
+        self._touched[user_id] = time.monotonic()
+        return state
+
+    async def get(self, user_id: str) -> Optional[Dict]:
+        state = self._get(user_id)
+        return state.copy() if state else None
+
+    async def update(self, user_id: str, status: Optional[str], increment_action: bool, suggestion: Optional[str]) -> Dict:
+        state = self._get(user_id, create=True)
+        if status:
+            state["status"] = status
+        if increment_action:
+            state["action_count"] += 1
+            state["last_active"] = datetime.now(timezone.utc)
+        if suggestion is not None:
+            state["suggestion"] = suggestion
+        return state.copy()
+
+    async def reset(self, user_id: str) -> None:
+        state = self._get(user_id)
+        if state:
+            state.update(action_count=0, status=AgentStatus.IDLE, suggestion=None)
+
+    async def set_suggestion(self, user_id: str, suggestion: str) -> None:
+        state = self._get(user_id, create=True)
+        state.update(suggestion=suggestion, status=AgentStatus.READY_TO_SUGGEST)
+
+    async def all_states(self) -> Dict[str, Dict]:
+        self._evict()
+        return {user_id: state.copy() for user_id, state in self._states.items()}
+
+    async def active_cooldowns(self, user_id: str, rules: Iterable[str]) -> Set[str]:
+        now = time.monotonic()
+        return {rule for rule in rules if self._cooldowns.get(f"{user_id}:{rule}", 0) > now}
+
+    async def start_cooldowns(self, user_id: str, cooldowns: Dict[str, float]) -> Set[str]:
+        now = time.monotonic()
+        started = set()
+        for rule, seconds in cooldowns.items():
+            key = f"{user_id}:{rule}"
+            if self._cooldowns.get(key, 0) > now:
+                continue
+            self._cooldowns.pop(key, None)
+            self._cooldowns[key] = now + seconds
+            started.add(rule)
+        self._evict()
+        return started
+
+
+class RedisStateBackend:
+    """
+    Состояние в Redis: hash ``mind:state:<user_id>`` и ключи
+    ``mind:cooldown:<user_id>:<rule>`` с TTL кулдауна.
+
+    Каждая операция — один пайплайн; при недоступности Redis возвращается
+    состояние по умолчанию (агент молчит, а не падает).
+    """
+
+    name = "redis"
+    STATE_PREFIX = "mind:state:"
+    COOLDOWN_PREFIX = "mind:cooldown:"
+    SCAN_BATCH = 500
+
+    def __init__(self, idle_ttl: int = MIND_STATE_TTL_SECONDS):
+        self.idle_ttl = idle_ttl
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.STATE_PREFIX}{user_id}"
+
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> Optional[Dict]:
+        if not raw:
+            return None
+        last_active = raw.get("last_active")
+        return {
+            "status": raw.get("status") or AgentStatus.IDLE,
+            "action_count": int(raw.get("action_count") or 0),
+            "last_active": datetime.fromisoformat(last_active) if last_active else None,
+            "suggestion": raw.get("suggestion") or None
+        }
+
+    def _init_fields(self, pipe, key: str) -> None:
+        pipe.hsetnx(key, "status", AgentStatus.IDLE)
+        pipe.hsetnx(key, "action_count", 0)
+        pipe.hsetnx(key, "last_active", datetime.now(timezone.utc).isoformat())
+
+    async def get(self, user_id: str) -> Optional[Dict]:
+        try:
+            client = await get_redis()
+            return self._decode(await client.hgetall(self._key(user_id)))
+        except Exception as e:
+            logger.error(f"Mind state read error: {e}")
+            return None
+
+    async def update(self, user_id: str, status: Optional[str], increment_action: bool, suggestion: Optional[str]) -> Dict:
+        key = self._key(user_id)
+        try:
+            client = await get_redis()
+            async with client.pipeline(transaction=True) as pipe:
+                self._init_fields(pipe, key)
+                if increment_action:
+                    pipe.hincrby(key, "action_count", 1)
+                    pipe.hset(key, "last_active", datetime.now(timezone.utc).isoformat())
+                if status:
+                    pipe.hset(key, "status", status)
+                if suggestion is not None:
+                    pipe.hset(key, "suggestion", suggestion)
+                pipe.expire(key, self.idle_ttl)
+                pipe.hgetall(key)
+                results = await pipe.execute()
+            return self._decode(results[-1])
+        except Exception as e:
+            logger.error(f"Mind state write error: {e}")
+            return _default_state()
+
+    async def reset(self, user_id: str) -> None:
+        key = self._key(user_id)
+        try:
+            client = await get_redis()
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={"action_count": 0, "status": AgentStatus.IDLE, "suggestion": ""})
+                pipe.expire(key, self.idle_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Mind state write error: {e}")
+
+    async def set_suggestion(self, user_id: str, suggestion: str) -> None:
+        key = self._key(user_id)
+        try:
+            client = await get_redis()
+            async with client.pipeline(transaction=True) as pipe:
+                self._init_fields(pipe, key)
+                pipe.hset(key, mapping={"suggestion": suggestion, "status": AgentStatus.READY_TO_SUGGEST})
+                pipe.expire(key, self.idle_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Mind state write error: {e}")
+
+    async def all_states(self) -> Dict[str, Dict]:
+        """SCAN по всем состояниям — только для отладочных эндпоинтов"""
+        states: Dict[str, Dict] = {}
+        try:
+            client = await get_redis()
+            keys = []
+            async for key in client.scan_iter(match=f"{self.STATE_PREFIX}*", count=self.SCAN_BATCH):
+                keys.append(key)
+            for start in range(0, len(keys), self.SCAN_BATCH):
+                batch = keys[start:start + self.SCAN_BATCH]
+                async with client.pipeline(transaction=False) as pipe:
+                    for key in batch:
+                        pipe.hgetall(key)
+                    for key, raw in zip(batch, await pipe.execute()):
+                        state = self._decode(raw)
+                        if state:
+                            states[key[len(self.STATE_PREFIX):]] = state
+        except Exception as e:
+            logger.error(f"Mind state scan error: {e}")
+        return states
+
+    async def active_cooldowns(self, user_id: str, rules: Iterable[str]) -> Set[str]:
+        rules = list(rules)
+        if not rules:
+            return set()
+        try:
+            client = await get_redis()
+            async with client.pipeline(transaction=False) as pipe:
+                for rule in rules:
+                    pipe.exists(f"{self.COOLDOWN_PREFIX}{user_id}:{rule}")
+                return {rule for rule, exists in zip(rules, await pipe.execute()) if exists}
+        except Exception as e:
+            logger.error(f"Mind cooldown read error: {e}")
+            # Без Redis считаем всё на кулдауне, чтобы не спамить подсказками
+            return set(rules)
+
+    async def start_cooldowns(self, user_id: str, cooldowns: Dict[str, float]) -> Set[str]:
+        """SET NX EX: кулдаун достаётся ровно одному воркеру"""
+        if not cooldowns:
+            return set()
+        try:
+            client = await get_redis()
+            async with client.pipeline(transaction=False) as pipe:
+                for rule, seconds in cooldowns.items():
+                    pipe.set(f"{self.COOLDOWN_PREFIX}{user_id}:{rule}", 1, nx=True, ex=max(int(seconds), 1))
+                results = await pipe.execute()
+            return {rule for rule, started in zip(cooldowns, results) if started}
+        except Exception as e:
+            logger.error(f"Mind cooldown write error: {e}")
+            return set()
+
+
+def create_backend(name: str = MIND_STATE_BACKEND):
+    if name == "memory":
+        return MemoryStateBackend()
+    if name != "redis":
+        logger.warning(f"Unknown MIND_STATE_BACKEND '{name}', using redis")
+    return RedisStateBackend()
+
+
+# ==================== Manager ====================
+
 class MindStateManager:
     """
     Singleton менеджер состояния агента.
-    
-    Хранит состояние в памяти (RAM).
-    В продакшене можно заменить на Redis.
+
+    Делегирует хранение в backend (Redis или память процесса).
     """
     _instance = None
-    
-    # Хранилище: {user_id: {"status": "idle", "last_active": timestamp, "action_count": 0, "suggestion": None}}
-    _states: Dict[str, Dict] = {}
-    
+
     # Порог действий для переключения в ready_to_suggest
     ACTION_THRESHOLD = 3
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            logger.info("🧠 MindStateManager initialized (Singleton)")
+            cls._instance.backend = create_backend()
+            logger.info(f"🧠 MindStateManager initialized (Singleton, {cls._instance.backend.name} backend)")
         return cls._instance
-    
+
     @classmethod
     def get_instance(cls) -> "MindStateManager":
         """Получить единственный экземпляр менеджера"""
         if cls._instance is None:
             cls._instance = cls()
         return cls._instance
-    
-    def get_user_state(self, user_id: str) -> Dict:
+
+    async def get_user_state(self, user_id: str) -> Dict:
         """
         Получить состояние пользователя.
         Если не существует — возвращает дефолтное.
         """
-        if user_id not in self._states:
-            return {
-                "status": AgentStatus.IDLE,
-                "action_count": 0,
-                "last_active": None,
-                "suggestion": None
-            }
-        return self._states[user_id].copy()
-    
-    def update_state(
-        self, 
-        user_id: str, 
-        status: Optional[str] = None, 
+        return await self.backend.get(user_id) or _default_state()
+
+    async def update_state(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
         increment_action: bool = False,
         suggestion: Optional[str] = None
     ) -> Dict:
         """
-        Обновить состояние пользователя.
-        
+        Обновить состояние пользователя (создаёт его при необходимости).
+
         Args:
             user_id: ID пользователя
             status: новый статус (если нужно обновить)
             increment_action: увеличить счётчик действий
             suggestion: текст подсказки
-            
+
         Returns:
             Обновлённое состояние
         """
-        # Инициализация если пользователя нет
-        if user_id not in self._states:
-            self._states[user_id] = {
-                "status": AgentStatus.IDLE,
-                "action_count": 0,
-                "last_active": datetime.now(timezone.utc),
-                "suggestion": None
-            }
-        
-        state = self._states[user_id]
-        
-        # Обновляем статус если передан
+        state = await self.backend.update(user_id, status, increment_action, suggestion)
         if status:
-            state["status"] = status
             logger.debug(f"🎯 User {user_id} status -> {status}")
-        
-        # Увеличиваем счётчик действий
         if increment_action:
-            state["action_count"] += 1
-            state["last_active"] = datetime.now(timezone.utc)
             logger.debug(f"📊 User {user_id} action_count: {state['action_count']}")
-        
-        # Обновляем подсказку
-        if suggestion is not None:
-            state["suggestion"] = suggestion
-        
-        return state.copy()
-    
-    def reset_actions(self, user_id: str):
+        return state
+
+    async def reset_actions(self, user_id: str):
         """Сбросить счётчик действий и статус в idle"""
-        if user_id in self._states:
-            self._states[user_id]["action_count"] = 0
-            self._states[user_id]["status"] = AgentStatus.IDLE
-            self._states[user_id]["suggestion"] = None
-            logger.info(f"🔄 User {user_id} state reset to idle")
-    
-    def set_suggestion(self, user_id: str, suggestion: str):
+        await self.backend.reset(user_id)
+        logger.info(f"🔄 User {user_id} state reset to idle")
+
+    async def set_suggestion(self, user_id: str, suggestion: str):
         """Установить подсказку для пользователя"""
-        if user_id not in self._states:
-            self.update_state(user_id)
-        
-        self._states[user_id]["suggestion"] = suggestion
-        self._states[user_id]["status"] = AgentStatus.READY_TO_SUGGEST
+        await self.backend.set_suggestion(user_id, suggestion)
         logger.info(f"💡 Suggestion set for {user_id}: {suggestion[:50]}...")
-    
-    def clear_suggestion(self, user_id: str):
+
+    async def clear_suggestion(self, user_id: str):
         """Очистить подсказку и сбросить статус"""
-        self.reset_actions(user_id)
-    
-    def get_all_active_users(self) -> Dict[str, Dict]:
+        await self.reset_actions(user_id)
+
+    async def get_all_active_users(self) -> Dict[str, Dict]:
         """Получить всех пользователей с активным состоянием (не idle)"""
         return {
-            uid: state.copy() 
-            for uid, state in self._states.items() 
+            uid: state
+            for uid, state in (await self.backend.all_states()).items()
             if state["status"] != AgentStatus.IDLE
         }
-    
-    def get_stats(self) -> Dict:
+
+    async def get_stats(self) -> Dict:
         """Статистика по состояниям"""
-        total = len(self._states)
-        by_status = {
-            AgentStatus.IDLE: 0,
-            AgentStatus.ANALYZING: 0,
-            AgentStatus.READY_TO_SUGGEST: 0
-        }
-        
-        for state in self._states.values():
+        states = await self.backend.all_states()
+        by_status = _empty_stats()
+
+        for state in states.values():
             status = state.get("status", AgentStatus.IDLE)
             if status in by_status:
                 by_status[status] += 1
-        
+
         return {
-            "total_users": total,
+            "backend": self.backend.name,
+            "total_users": len(states),
             "by_status": by_status,
             "action_threshold": self.ACTION_THRESHOLD
         }
 
+    # ==================== Кулдауны правил ====================
+
+    async def active_cooldowns(self, user_id: str, rules: Iterable[str]) -> Set[str]:
+        """Правила из `rules`, которые сейчас на кулдауне у пользователя"""
+        return await self.backend.active_cooldowns(user_id, rules)
+
+    async def start_cooldowns(self, user_id: str, cooldowns: Dict[str, float]) -> Set[str]:
+        """
+        Поставить кулдауны {rule: seconds}; возвращает правила, кулдаун
+        которых поставил именно этот вызов (остальные уже сработали у
+        другого воркера).
+        """
+        return await self.backend.start_cooldowns(user_id, cooldowns)
+
 
 # Singleton instance для импорта
 state_manager = MindStateManager.get_instance()
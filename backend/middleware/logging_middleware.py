@@ -1,68 +1,100 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from utils.logger import logger
-from utils.metrics import metrics
+from utils.metrics import metrics, route_template
+from utils.db_profiler import current_request
+import os
+import random
 import time
+import uuid
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging all requests and responses"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Start timer
-        start_time = time.time()
-        
-        # Get client info
-        client_host = request.client.host if request.client else "unknown"
-        
-        # Log incoming request
-        logger.info(
-            f"➡️  {request.method:6} {request.url.path:50} | Client: {client_host}"
-        )
-        
-        # Process request
+SLOW_REQUEST_SECONDS = 1.0
+
+# Fraction of successful (< 400, not slow) requests that get a log line.
+# Errors and slow requests are always logged.
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', '1.0'))
+
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI middleware for request timing, metrics and logging
+
+    Unlike BaseHTTPMiddleware it does not run the app in a separate task
+    or buffer the response through a memory stream, so streaming responses
+    pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = REQUEST_LOG_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        request_id = self._request_id(scope)
+        scope.setdefault("state", {})["request_id"] = request_id
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Response-Time"] = f"{time.perf_counter() - start_time:.3f}s"
+                headers["X-Request-ID"] = request_id
+            await send(message)
+
+        metrics.request_started()
+        # Lets the Mongo profiler attribute commands to this route
+        request_token = current_request.set(scope)
+        error = None
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # Log unhandled exceptions
-            duration = time.time() - start_time
-            logger.error(
-                f"⬅️  500 {request.method:6} {request.url.path:50} | "
-                f"Duration: {duration:.3f}s | ERROR: {str(e)}"
-            )
-            
-            # Record metrics
-            metrics.record_request(request.url.path, duration, 500)
-            
+            error = e
+            status_code = 500
             raise
-        
-        # Calculate duration
-        duration = time.time() - start_time
-        
-        # Record metrics
-        metrics.record_request(request.url.path, duration, response.status_code)
-        
-        # Log response with color coding
-        status = response.status_code
+        finally:
+            current_request.reset(request_token)
+            duration = time.perf_counter() - start_time
+            metrics.request_finished()
+            # Keyed by route template, not raw path, to bound cardinality
+            metrics.record_request(route_template(scope), duration, status_code, scope["method"])
+            self._log(scope, status_code, duration, error)
+
+    @staticmethod
+    def _request_id(scope: Scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                return value.decode("latin-1")[:64]
+        return uuid.uuid4().hex
+
+    def _log(self, scope: Scope, status: int, duration: float, error: Exception = None) -> None:
+        slow = duration > SLOW_REQUEST_SECONDS
+        if status < 400 and not slow and random.random() >= self.sample_rate:
+            return
+
+        client = scope.get("client")
+        client_host = client[0] if client else "unknown"
         log_msg = (
-            f"⬅️  {status} {request.method:6} {request.url.path:50} | "
-            f"Duration: {duration:.3f}s"
+            f"⬅️  {status} {scope['method']:6} {scope['path']:50} | "
+            f"Duration: {duration:.3f}s | Client: {client_host}"
         )
-        
+
         # Add slow query warning
-        if duration > 1.0:
+        if slow:
             log_msg += " ⚠️ SLOW"
-        
+        if error is not None:
+            log_msg += f" | ERROR: {error}"
+
         # Log with appropriate level
         if status >= 500:
             logger.error(log_msg)
-        elif status >= 400:
+        elif status >= 400 or slow:
             logger.warning(log_msg)
         else:
             logger.info(log_msg)
-        
-        # Add custom header with response time
-        response.headers["X-Response-Time"] = f"{duration:.3f}s"
-        response.headers["X-Request-ID"] = str(id(request))
-        
-        return response
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
 import uuid
@@ -11,7 +11,12 @@ class PricePoint(BaseModel):
 
 
 class PriceHistory(BaseModel):
-    """Price history for a product"""
+    """
+    Price history for a product.
+
+    tasks.price_tracker appends points with $push/$slice and keeps running
+    lowest/highest/sum/count, so average_price is derived on load.
+    """
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -20,17 +25,29 @@ class PriceHistory(BaseModel):
     lowest_price: Optional[float] = None
     highest_price: Optional[float] = None
     average_price: Optional[float] = None
+    last_price: Optional[float] = None
+    price_sum: float = 0.0
+    price_count: int = 0
     last_updated: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
+    @model_validator(mode="after")
+    def _derive_average(self):
+        if self.price_count:
+            self.average_price = self.price_sum / self.price_count
+        return self
+    
     def add_price(self, price: float):
         """Add new price point and update stats"""
         self.prices.append(PricePoint(price=price))
+        self.last_price = price
+        self.price_sum += price
+        self.price_count += 1
         
         # Update stats
         all_prices = [p.price for p in self.prices]
         self.lowest_price = min(all_prices)
         self.highest_price = max(all_prices)
-        self.average_price = sum(all_prices) / len(all_prices)
+        self.average_price = self.price_sum / self.price_count
         self.last_updated = datetime.now(timezone.utc)
         
         # Keep last 90 days only
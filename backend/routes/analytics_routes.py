@@ -4,7 +4,7 @@ from typing import Optional
 from datetime import datetime, timezone, timedelta
 import random
 
-from database import db
+from database import analytics_db
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -22,7 +22,7 @@ async def get_popular_products(
     products = []
     try:
         # Get products sorted by views
-        products = await db.products.find(
+        products = await analytics_db.products.find(
             {"is_active": True},
             {"_id": 0}
         ).sort("views", -1).limit(limit).to_list(limit)
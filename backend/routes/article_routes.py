@@ -4,6 +4,7 @@ from models.article import Article, ArticleCreate, ArticleUpdate, ArticleRespons
 from models.user import User
 from utils.auth_utils import get_current_user
 from database import get_database
+from services.xp_service import add_monthly_rp
 from datetime import datetime, timezone
 import re
 
@@ -160,10 +161,7 @@ async def toggle_like(
             {"id": article_id},
             {"$inc": {"likes": -1}, "$pull": {"liked_by": current_user.id}}
         )
-        await db.user_stats.update_one(
-            {"user_id": article["user_id"]},
-            {"$inc": {"monthly_rp": -5}}
-        )
+        await add_monthly_rp(article["user_id"], -5, upsert=False)
         action = "unliked"
     else:
         await db.articles.update_one(
@@ -171,11 +169,7 @@ async def toggle_like(
             {"$inc": {"likes": 1}, "$addToSet": {"liked_by": current_user.id}}
         )
         # Articles get more RP than posts
-        await db.user_stats.update_one(
-            {"user_id": article["user_id"]},
-            {"$inc": {"monthly_rp": 5, "total_likes_received": 1}},
-            upsert=True
-        )
+        await add_monthly_rp(article["user_id"], 5, {"total_likes_received": 1})
         action = "liked"
     
     return {"status": action, "article_id": article_id}
@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from models.user import UserCreate, UserLogin, User, UserResponse, TokenResponse
 from utils.auth_utils import hash_password, verify_password, create_access_token, get_current_user
 from database import db
+from services.leaderboard_service import leaderboard_service
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -43,6 +44,7 @@ async def register(user_data: UserCreate):
     
     # Insert into database
     await db.users.insert_one(user_dict)
+    await leaderboard_service.add_user(user_dict)
     
     # Create access token
     access_token = create_access_token(data={"sub": user.id, "email": user.email, "is_seller": user.is_seller, "is_admin": user.is_admin})
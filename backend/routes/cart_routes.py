@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from models.cart import Cart, CartResponse, AddToCartRequest, UpdateCartItemRequest, CartItem
 from utils.auth_utils import get_current_user
 from database import db
+from services.feature_store import feature_store
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -96,6 +97,7 @@ async def add_to_cart(item_data: AddToCartRequest, current_user: dict = Depends(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await feature_store.invalidate(current_user["id"], "cart")
     
     return {"message": "Item added to cart", "item_count": item_count, "total": round(total, 2)}
 
@@ -146,6 +148,7 @@ async def update_cart_item(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await feature_store.invalidate(current_user["id"], "cart")
     
     return {"message": "Cart updated", "item_count": item_count, "total": round(total, 2)}
 
@@ -180,6 +183,7 @@ async def remove_from_cart(product_id: str, current_user: dict = Depends(get_cur
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await feature_store.invalidate(current_user["id"], "cart")
     
     return {"message": "Item removed from cart", "item_count": item_count, "total": round(total, 2)}
 
@@ -198,5 +202,6 @@ async def clear_cart(current_user: dict = Depends(get_current_user)):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await feature_store.invalidate(current_user["id"], "cart")
     
     return {"message": "Cart cleared"}
@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 import uuid
 
 from database import db
+from services.feature_store import feature_store
 from utils.auth_utils import get_current_user, get_current_user_optional
 
 router = APIRouter()
@@ -74,6 +75,7 @@ async def create_checkout(
         
         # Clear user's cart
         await db.carts.delete_one({"user_id": current_user.get("id")})
+        await feature_store.invalidate(current_user.get("id"), "cart", "past_orders", "budget")
         
         return CheckoutResponse(
             success=True,
@@ -4,6 +4,7 @@ from models.post import Post, PostCreate, PostWithComments, Comment, CommentCrea
 from models.user import User
 from utils.auth_utils import get_current_user
 from database import get_database
+from services.xp_service import add_monthly_rp
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/feed", tags=["feed"])
@@ -41,11 +42,7 @@ async def create_post(
     await db.posts.insert_one(post.dict())
     
     # Award RP for posting
-    await db.user_stats.update_one(
-        {"user_id": current_user.id},
-        {"$inc": {"total_posts": 1, "monthly_rp": 5}},
-        upsert=True
-    )
+    await add_monthly_rp(current_user.id, 5, {"total_posts": 1})
     
     return post
 
@@ -114,10 +111,7 @@ async def toggle_like(
             {"$inc": {"likes": -1}, "$pull": {"liked_by": current_user.id}}
         )
         # Remove RP from post author
-        await db.user_stats.update_one(
-            {"user_id": post["user_id"]},
-            {"$inc": {"monthly_rp": -2}}
-        )
+        await add_monthly_rp(post["user_id"], -2, upsert=False)
         action = "unliked"
     else:
         # Like
@@ -126,11 +120,7 @@ async def toggle_like(
             {"$inc": {"likes": 1}, "$addToSet": {"liked_by": current_user.id}}
         )
         # Award RP to post author
-        await db.user_stats.update_one(
-            {"user_id": post["user_id"]},
-            {"$inc": {"monthly_rp": 2, "total_likes_received": 1}},
-            upsert=True
-        )
+        await add_monthly_rp(post["user_id"], 2, {"total_likes_received": 1})
         action = "liked"
     
     return {"status": action, "post_id": post_id}
@@ -163,11 +153,7 @@ async def add_comment(
     await db.posts.update_one({"id": post_id}, {"$inc": {"comments_count": 1}})
     
     # Award RP for commenting
-    await db.user_stats.update_one(
-        {"user_id": current_user.id},
-        {"$inc": {"total_comments": 1, "monthly_rp": 1}},
-        upsert=True
-    )
+    await add_monthly_rp(current_user.id, 1, {"total_comments": 1})
     
     return comment
 
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 from models.groupbuy import GroupBuy, GroupBuyCreate, Participant, GroupBuyComment
 from models.user import User
 from utils.auth_utils import get_current_user
 from database import get_database
+from services.xp_service import add_monthly_rp
+from utils.pagination import apply_cursor, next_cursor
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/groupbuy", tags=["groupbuy"])
@@ -49,19 +51,17 @@ async def create_groupbuy(
     await db.groupbuys.insert_one(groupbuy.dict())
     
     # Award RP for organizing
-    await db.user_stats.update_one(
-        {"user_id": current_user.id},
-        {"$inc": {"monthly_rp": 10}},
-        upsert=True
-    )
+    await add_monthly_rp(current_user.id, 10)
     
     return groupbuy
 
 
 @router.get("", response_model=List[GroupBuy])
 async def get_groupbuys(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor from X-Next-Cursor"),
     status: Optional[str] = Query(None, regex="^(active|successful|failed|completed)$"),
     sort_by: str = Query("created_at", regex="^(created_at|deadline|current_participants)$")
 ):
@@ -72,7 +72,16 @@ async def get_groupbuys(
     if status:
         query["status"] = status
     
-    groupbuys = await db.groupbuys.find(query).sort(sort_by, -1).skip(skip).limit(limit).to_list(length=limit)
+    sort = [(sort_by, -1), ("id", -1)]
+    if cursor:
+        query = apply_cursor(query, sort, cursor)
+        groupbuys = await db.groupbuys.find(query).sort(sort).limit(limit).to_list(length=limit)
+    else:
+        groupbuys = await db.groupbuys.find(query).sort(sort).skip(skip).limit(limit).to_list(length=limit)
+    
+    next_token = next_cursor(groupbuys, sort, limit)
+    if next_token:
+        response.headers["X-Next-Cursor"] = next_token
     return [GroupBuy(**gb) for gb in groupbuys]
 
 
@@ -165,11 +174,7 @@ async def join_groupbuy(
         )
     
     # Award RP for joining
-    await db.user_stats.update_one(
-        {"user_id": current_user.id},
-        {"$inc": {"monthly_rp": 5}},
-        upsert=True
-    )
+    await add_monthly_rp(current_user.id, 5)
     
     return {
         "status": "joined",
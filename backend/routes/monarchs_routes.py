@@ -8,12 +8,13 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 
-from database import db
+from database import db, analytics_db
 from models.monarchs import (
     LeaderboardPeriod, LeaderboardCategory,
     Achievement, LeaderboardEntry, UserMiniProfile
 )
 from routes.auth_routes import get_current_user
+from services.leaderboard_service import BOARDS, leaderboard_service
 
 router = APIRouter(prefix="/monarchs", tags=["monarchs"])
 
@@ -22,6 +23,34 @@ router = APIRouter(prefix="/monarchs", tags=["monarchs"])
 # LEADERBOARDS
 # ========================================
 
+# Categories materialised in services.leaderboard_service
+CATEGORY_BOARDS = {"xp": "xp", "trust": "trust"}
+
+
+async def _users_by_id(user_ids: List[str]) -> dict:
+    """One $in lookup for the users on a leaderboard page"""
+    users = await analytics_db["users"].find({"id": {"$in": user_ids}}).to_list(length=len(user_ids))
+    return {user["id"]: user for user in users}
+
+
+def _leaderboard_entry(rank: int, user: dict, score) -> dict:
+    return {
+        "rank": rank,
+        "user_id": user.get("id"),
+        "username": user.get("username"),
+        "user_avatar": user.get("avatar_url"),
+        "user_level": user.get("level", 1),
+        "user_class": user.get("class_type"),
+        "trust_score": user.get("trust_score", 500.0),
+        "score": score,
+        "stats": {
+            "xp_total": user.get("xp_total", 0),
+            "trust_score": user.get("trust_score", 500.0),
+            "level": user.get("level", 1)
+        }
+    }
+
+
 @router.get("/top")
 async def get_leaderboard(
     period: str = Query("month", description="Period: week, month, year, all_time"),
@@ -57,38 +86,65 @@ async def get_leaderboard(
     elif category == "ideas":
         sort_field = "ideas_count"
     
-    # Get users
-    query = {"is_active": True}
+    board = CATEGORY_BOARDS.get(category)
+    rows = await leaderboard_service.top(board, 0, limit) if board else None
     
-    users = await db["users"].find(query).sort(sort_field, -1).limit(limit).to_list(length=limit)
-    
-    entries = []
-    for rank, user in enumerate(users, 1):
-        entries.append({
-            "rank": rank,
-            "user_id": user.get("id"),
-            "username": user.get("username"),
-            "user_avatar": user.get("avatar_url"),
-            "user_level": user.get("level", 1),
-            "user_class": user.get("class_type"),
-            "trust_score": user.get("trust_score", 500.0),
-            "score": user.get(sort_field, 0),
-            "stats": {
-                "xp_total": user.get("xp_total", 0),
-                "trust_score": user.get("trust_score", 500.0),
-                "level": user.get("level", 1)
-            }
-        })
+    if rows is not None:
+        users = await _users_by_id([user_id for user_id, _, _ in rows])
+        entries = [
+            _leaderboard_entry(rank, users[user_id], users[user_id].get(sort_field, score))
+            for user_id, score, rank in rows
+            if user_id in users
+        ]
+        total_participants = await leaderboard_service.total(board)
+    else:
+        # Get users
+        query = {"is_active": True}
+        
+        users = await db["users"].find(query).sort(sort_field, -1).limit(limit).to_list(length=limit)
+        entries = [
+            _leaderboard_entry(rank, user, user.get(sort_field, 0))
+            for rank, user in enumerate(users, 1)
+        ]
+        total_participants = await db["users"].count_documents({"is_active": True})
     
     return {
         "period": period,
         "category": category,
         "entries": entries,
-        "total_participants": await db["users"].count_documents({"is_active": True}),
+        "total_participants": total_participants,
         "calculated_at": now.isoformat()
     }
 
 
+@router.get("/user/{user_id}/around")
+async def get_leaderboard_around_user(
+    user_id: str,
+    category: str = Query("xp", description="Category: xp, trust"),
+    radius: int = Query(5, ge=1, le=25)
+):
+    """Leaderboard window centred on a user"""
+    board = CATEGORY_BOARDS.get(category)
+    if not board:
+        raise HTTPException(status_code=400, detail="Category must be xp or trust")
+    
+    rows = await leaderboard_service.around(board, user_id, radius)
+    if rows is None:
+        raise HTTPException(status_code=503, detail="Leaderboard is not available")
+    
+    users = await _users_by_id([row_user_id for row_user_id, _, _ in rows])
+    score_field = BOARDS[board].score_field
+    return {
+        "user_id": user_id,
+        "category": category,
+        "entries": [
+            _leaderboard_entry(rank, users[row_user_id], users[row_user_id].get(score_field, score))
+            for row_user_id, score, rank in rows
+            if row_user_id in users
+        ]
+    }
+
+
 @router.get("/user/{user_id}/rank")
 async def get_user_rank(user_id: str):
     """Get a user's current rankings"""
@@ -97,36 +153,35 @@ async def get_user_rank(user_id: str):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Calculate ranks
-    xp_rank = await db["users"].count_documents({
-        "is_active": True,
-        "xp_total": {"$gt": user.get("xp_total", 0)}
-    }) + 1
-    
-    trust_rank = await db["users"].count_documents({
-        "is_active": True,
-        "trust_score": {"$gt": user.get("trust_score", 500.0)}
-    }) + 1
-    
-    total_users = await db["users"].count_documents({"is_active": True})
+    rankings = {}
+    for category, field, default in (("xp", "xp_total", 0), ("trust", "trust_score", 500.0)):
+        ranking = await _rank(category, user, field, default)
+        total_users = ranking["total"]
+        rankings[category] = {
+            "rank": ranking["rank"],
+            "total": total_users,
+            "percentile": round((1 - ranking["rank"] / total_users) * 100, 1) if total_users > 0 else 0
+        }
     
     return {
         "user_id": user_id,
-        "rankings": {
-            "xp": {
-                "rank": xp_rank,
-                "total": total_users,
-                "percentile": round((1 - xp_rank / total_users) * 100, 1) if total_users > 0 else 0
-            },
-            "trust": {
-                "rank": trust_rank,
-                "total": total_users,
-                "percentile": round((1 - trust_rank / total_users) * 100, 1) if total_users > 0 else 0
-            }
-        }
+        "rankings": rankings
     }
 
 
+async def _rank(category: str, user: dict, field: str, default) -> dict:
+    """{"rank", "total"} from the sorted set, or by counting when it is unavailable"""
+    ranking = await leaderboard_service.rank(CATEGORY_BOARDS[category], user["id"], user.get(field, default))
+    if ranking is not None:
+        return ranking
+    
+    rank = await db["users"].count_documents({
+        "is_active": True,
+        field: {"$gt": user.get(field, default)}
+    }) + 1
+    return {"rank": rank, "total": await db["users"].count_documents({"is_active": True})}
+
+
 # ========================================
 # ACHIEVEMENTS
 # ========================================
@@ -201,10 +256,7 @@ async def get_mini_profile(user_id: str):
     })
     
     # Get ranks
-    xp_rank = await db["users"].count_documents({
-        "is_active": True,
-        "xp_total": {"$gt": user.get("xp_total", 0)}
-    }) + 1
+    xp_rank = (await _rank("xp", user, "xp_total", 0))["rank"]
     
     return {
         "user_id": user_id,
@@ -236,7 +288,7 @@ async def get_hall_of_fame():
     """Get notable users: implementers, top contributors"""
     
     # Top idea implementers
-    implementers = await db["consensus_ideas"].aggregate([
+    implementers = await analytics_db["consensus_ideas"].aggregate([
         {"$match": {"status": "implemented"}},
         {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}},
@@ -245,14 +297,15 @@ async def get_hall_of_fame():
     
     # Enrich with user data
     for impl in implementers:
-        user = await db["users"].find_one({"id": impl["_id"]})
+        user = await analytics_db["users"].find_one({"id": impl["_id"]})
         if user:
             impl["username"] = user.get("username")
             impl["avatar_url"] = user.get("avatar_url")
             impl["level"] = user.get("level", 1)
     
-    # Top XP all time
-    top_xp = await db["users"].find({"is_active": True}).sort("xp_total", -1).limit(10).to_list(length=10)
+    # Top XP all time / most trusted
+    top_xp = await _hall_of_fame_users("xp", "xp_total")
+    most_trusted = await _hall_of_fame_users("trust", "trust_score")
     
     top_xp_clean = [{
         "user_id": u.get("id"),
@@ -262,9 +315,6 @@ async def get_hall_of_fame():
         "xp_total": u.get("xp_total", 0)
     } for u in top_xp]
     
-    # Most trusted
-    most_trusted = await db["users"].find({"is_active": True}).sort("trust_score", -1).limit(10).to_list(length=10)
-    
     most_trusted_clean = [{
         "user_id": u.get("id"),
         "username": u.get("username"),
@@ -278,3 +328,12 @@ async def get_hall_of_fame():
         "top_xp": top_xp_clean,
         "most_trusted": most_trusted_clean
     }
+
+
+async def _hall_of_fame_users(category: str, sort_field: str, limit: int = 10) -> List[dict]:
+    rows = await leaderboard_service.top(CATEGORY_BOARDS[category], 0, limit)
+    if rows is None:
+        return await analytics_db["users"].find({"is_active": True}).sort(sort_field, -1).limit(limit).to_list(length=limit)
+    
+    users = await _users_by_id([user_id for user_id, _, _ in rows])
+    return [users[user_id] for user_id, _, _ in rows if user_id in users]
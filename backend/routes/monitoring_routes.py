@@ -1,6 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import Optional
 from datetime import datetime, timezone
 from utils.metrics import metrics
+from utils import prometheus
+from utils.db_profiler import db_profiler
+from tasks.scheduler import scheduler
+from utils.cache import get_cache_stats
 from utils.auth_utils import get_current_user
 from models.user import User
 from database import db
@@ -31,41 +36,75 @@ async def health_check():
 @router.get("/metrics")
 async def get_metrics(
     endpoint: str = None,
+    window: Optional[str] = Query(None, regex="^(1m|5m|1h)$"),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get performance metrics
     Requires authentication (admin for full metrics)
+    Pass `window` (1m/5m/1h) for rolling-window instead of lifetime latencies
     """
+    # Admin can see detailed metrics
+    if current_user.is_admin:
+        return metrics.get_stats(endpoint, window)
+    
     # All users can see basic metrics
-    basic_metrics = {
-        'uptime': metrics.get_stats()['summary']['uptime_seconds'],
-        'total_requests': metrics.get_stats()['summary']['total_requests']
+    summary = metrics.get_stats()['summary']
+    return {
+        'uptime': summary['uptime_seconds'],
+        'total_requests': summary['total_requests']
     }
+
+
+@router.get("/metrics/prometheus")
+async def get_prometheus_metrics():
+    """
+    Metrics in OpenMetrics text format for Prometheus scraping
+    (requests, latency histograms, in-flight, cache hit ratios, Mongo timings)
     
-    # Admin can see detailed metrics
-    if current_user.is_admin:
-        if endpoint:
-            return metrics.get_stats(endpoint)
-        else:
-            return metrics.get_stats()
+    Unauthenticated like /health: restrict it at the ingress/network level.
+    """
+    return Response(content=prometheus.render(), media_type=prometheus.CONTENT_TYPE)
+
+
+@router.get("/db")
+async def get_db_profile(
+    route: Optional[str] = Query(None, description='Route key, e.g. "GET /api/products/"'),
+    current_user: User = Depends(get_current_user)
+):
+    """Mongo commands per route template and collection, plus recent slow queries (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return db_profiler.get_stats(route)
+
+
+@router.get("/jobs")
+async def get_job_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Scheduled jobs: run history on this worker and last run cluster-wide (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    return basic_metrics
+    return await scheduler.get_stats()
 
 
 @router.get("/metrics/slow")
 async def get_slow_endpoints(
     threshold: float = 1.0,
+    window: Optional[str] = Query(None, regex="^(1m|5m|1h)$"),
     current_user: User = Depends(get_current_user)
 ):
     """Get slow endpoints (admin only)"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    slow_endpoints = metrics.get_slow_endpoints(threshold)
+    slow_endpoints = metrics.get_slow_endpoints(threshold, window)
     
     return {
         "threshold_seconds": threshold,
+        "window": window or "lifetime",
         "slow_endpoints": slow_endpoints,
         "count": len(slow_endpoints)
     }
@@ -100,6 +139,7 @@ async def get_system_status(
             "indexes": db_stats.get('indexes', 0)
         },
         "performance": metrics.get_stats()['summary'],
+        "cache": await get_cache_stats(),
         "environment": {
             "env": os.getenv('ENVIRONMENT', 'development'),
             "debug": os.getenv('DEBUG', 'True'),
@@ -16,6 +16,7 @@ from models.network_post import (
 from routes.auth_routes import get_current_user
 from utils.auth_utils import get_current_user_optional
 from services.network_service import NetworkService
+from utils.pagination import next_cursor
 
 router = APIRouter(prefix="/network", tags=["network"])
 
@@ -33,6 +34,7 @@ async def get_feed(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=50),
     sort: str = Query("hot", description="Sort by: hot, new, top"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from next_cursor"),
     current_user: dict = Depends(get_current_user_optional)
 ):
     """Get network feed with posts"""
@@ -48,9 +50,12 @@ async def get_feed(
         category=cat,
         page=page,
         limit=limit,
-        sort=sort
+        sort=sort,
+        after=cursor
     )
     
+    next_token = next_cursor(posts, network_service.feed_sort(sort), limit)
+    
     # Add user interaction flags
     user_id = current_user.get("id") if current_user else None
     
@@ -65,7 +70,8 @@ async def get_feed(
         "posts": posts,
         "page": page,
         "limit": limit,
-        "has_more": len(posts) == limit
+        "has_more": len(posts) == limit,
+        "next_cursor": next_token
     }
 
 
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Optional
 from datetime import datetime, timezone
 from database import db as db_client
 from models.order import OrderCreate, Order, OrderResponse, OrderUpdate
 from utils.auth_utils import get_current_user_optional
+from utils.pagination import apply_cursor, next_cursor
+from services.feature_store import feature_store
 import logging
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
@@ -44,6 +46,8 @@ async def create_order(order: OrderCreate, current_user: Optional[dict] = Depend
         
         # Insert into database
         await db_client.orders.insert_one(order_data)
+        if order_data.get('user_id'):
+            await feature_store.invalidate(order_data['user_id'], "past_orders", "budget")
         
         logger.info(f"Order created: {new_order.order_number} ({new_order.id})")
         
@@ -56,8 +60,10 @@ async def create_order(order: OrderCreate, current_user: Optional[dict] = Depend
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
@@ -66,6 +72,7 @@ async def get_orders(
     - Admins/sellers can see all orders
     - Regular users can see only their orders
     - Unauthenticated users cannot access this endpoint
+    - Pass `cursor` from the X-Next-Cursor header to page without `skip`
     """
     try:
         if not current_user:
@@ -83,8 +90,17 @@ async def get_orders(
             query['order_status'] = status
         
         # Fetch orders
-        cursor = db_client.orders.find(query).skip(skip).limit(limit).sort('created_at', -1)
-        orders = await cursor.to_list(length=limit)
+        sort = [('created_at', -1), ('id', -1)]
+        if cursor:
+            query = apply_cursor(query, sort, cursor)
+            db_cursor = db_client.orders.find(query).sort(sort).limit(limit)
+        else:
+            db_cursor = db_client.orders.find(query).sort(sort).skip(skip).limit(limit)
+        orders = await db_cursor.to_list(length=limit)
+        
+        next_token = next_cursor(orders, sort, limit)
+        if next_token:
+            response.headers["X-Next-Cursor"] = next_token
         
         return [OrderResponse(**order) for order in orders]
     
@@ -171,6 +187,8 @@ async def update_order(
             {"id": order_id},
             {"$set": update_data}
         )
+        if order.get("user_id"):
+            await feature_store.invalidate(order["user_id"], "past_orders", "budget")
         
         # Fetch and return updated order
         updated_order = await db_client.orders.find_one({"id": order_id})
@@ -208,6 +226,8 @@ async def delete_order(order_id: str, current_user: dict = Depends(get_current_u
         
         # Delete order
         await db_client.orders.delete_one({"id": order_id})
+        if order.get("user_id"):
+            await feature_store.invalidate(order["user_id"], "past_orders", "budget")
         
         logger.info(f"Order deleted: {order_id}")
         
@@ -3,6 +3,7 @@ from typing import List, Optional
 from models.pc_build import PCBuild, PCBuildCreate, PCBuildUpdate
 from models.user import User
 from database import db
+from services.feature_store import feature_store
 from utils.auth_utils import get_current_user, get_current_user_optional
 from datetime import datetime, timezone
 import uuid
@@ -69,6 +70,8 @@ async def create_pc_build(
     )
     
     await db.pc_builds.insert_one(new_build.model_dump())
+    if current_user:
+        await feature_store.invalidate(current_user.id, "current_build")
     
     return new_build
 
@@ -167,6 +170,7 @@ async def update_pc_build(
         {"id": build_id},
         {"$set": update_data}
     )
+    await feature_store.invalidate(current_user.id, "current_build")
     
     updated_build = await db.pc_builds.find_one({"id": build_id})
     return PCBuild(**updated_build)
@@ -184,6 +188,7 @@ async def delete_pc_build(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="PC build not found or unauthorized"
         )
+    await feature_store.invalidate(current_user.id, "current_build")
     
     return None
 
@@ -261,6 +266,7 @@ async def add_build_to_cart(
         {"$set": cart},
         upsert=True
     )
+    await feature_store.invalidate(current_user.id, "cart")
     
     return {
         "message": "Build added to cart successfully",
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional, Dict
 from utils.auth_utils import get_current_user
+from utils.loaders import RequestLoaders, get_loaders
 from database import get_database
+from tasks.price_tracker import alert_trigger_price
 from datetime import datetime, timezone
 import uuid
 
@@ -53,6 +55,9 @@ async def create_or_update_price_alert(
     })
     
     now = datetime.now(timezone.utc).isoformat()
+    original_price = product.get("price", 0)
+    # Effective threshold the price tracker range-scans on
+    trigger_price = alert_trigger_price(alert_data.target_price, alert_data.price_drop_percent, original_price)
     
     if existing:
         # Update existing alert
@@ -65,7 +70,8 @@ async def create_or_update_price_alert(
                 "enabled": alert_data.enabled,
                 "triggered": False,  # Reset triggered status on update
                 "updated_at": now,
-                "original_price": product.get("price", 0)  # Track price at alert time
+                "original_price": original_price,  # Track price at alert time
+                "trigger_price": trigger_price
             }}
         )
         return {"success": True, "message": "Price alert updated", "id": existing["id"]}
@@ -80,7 +86,8 @@ async def create_or_update_price_alert(
             "notification_methods": alert_data.notification_methods,
             "enabled": alert_data.enabled,
             "triggered": False,
-            "original_price": product.get("price", 0),  # Track price at alert creation
+            "original_price": original_price,  # Track price at alert creation
+            "trigger_price": trigger_price,
             "created_at": now,
             "updated_at": now
         }
@@ -91,7 +98,8 @@ async def create_or_update_price_alert(
 
 @router.get("/")
 async def get_user_alerts(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loaders: RequestLoaders = Depends(get_loaders)
 ):
     """Get all price alerts for current user"""
     db = await get_database()
@@ -101,13 +109,14 @@ async def get_user_alerts(
         {"_id": 0}
     ).to_list(None)
     
-    # Enrich with product data
+    # Enrich with product data (one $in query)
+    products = await loaders.loader(
+        "products", projection={"_id": 0, "id": 1, "title": 1, "price": 1, "images": 1}
+    ).load_map(alert["product_id"] for alert in alerts)
+    
     enriched_alerts = []
     for alert in alerts:
-        product = await db.products.find_one(
-            {"id": alert["product_id"]},
-            {"_id": 0, "id": 1, "title": 1, "price": 1, "images": 1}
-        )
+        product = products.get(alert["product_id"])
         if product:
             alert["product"] = product
         enriched_alerts.append(alert)
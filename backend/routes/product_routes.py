@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Query, Response
 from typing import List, Optional
 from datetime import datetime, timezone
 
 from models.product import Product, ProductCreate, ProductResponse, ProductUpdate
 from models.category import Category
 from utils.auth_utils import get_current_user
-from utils.cache import cache_response, invalidate_cache
+from utils.cache import cache_response, invalidate_tags
+from utils.pagination import apply_cursor, next_cursor
+from services.search_index import product_search_index
+from services.catalog_sync import catalog_sync
+from services.facet_engine import product_facet_engine
+from tasks.price_tracker import process_price_change
 from database import db
 
 router = APIRouter(prefix="/products", tags=["products"])
@@ -89,60 +94,42 @@ async def get_product_deals(active: bool = True, limit: int = 3):
 
 
 @router.get("/facets")
-@cache_response(ttl_seconds=300)  # Cache for 5 minutes
-async def get_product_facets():
-    """Get dynamic facets for filtering"""
-    from collections import defaultdict
-    
-    # Get all approved products
-    products = await db.products.find({"status": "approved"}).to_list(length=None)
-    
-    facets = {
-        "categories": defaultdict(lambda: {"count": 0, "name": ""}),
-        "brands": defaultdict(lambda: {"count": 0}),
-        "ratings": {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}
-    }
+async def get_product_facets(
+    category_id: Optional[str] = None,
+    persona_id: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    specific_filters: Optional[str] = None  # JSON string of specific filters
+):
+    """
+    Get dynamic facets for filtering.
+    Counts reflect the current selection and are served from memory.
+    """
+    import json
     
-    for product in products:
-        # Category facets
-        cat_id = product.get("category_id")
-        if cat_id:
-            facets["categories"][cat_id]["count"] += 1
-            facets["categories"][cat_id]["id"] = cat_id
-            facets["categories"][cat_id]["name"] = cat_id
-        
-        # Brand facets (if exists)
-        brand = product.get("brand", product.get("seller_id", ""))[:20]  # Limit brand name
-        if brand:
-            facets["brands"][brand]["count"] += 1
-            facets["brands"][brand]["id"] = brand
-            facets["brands"][brand]["name"] = brand
-        
-        # Rating facets
-        rating = int(product.get("rating", 0))
-        if rating >= 1:
-            for r in range(1, rating + 1):
-                facets["ratings"][r] += 1
+    filters_dict = None
+    if specific_filters:
+        try:
+            filters_dict = json.loads(specific_filters)
+        except json.JSONDecodeError:
+            pass  # Ignore invalid JSON
+        if not isinstance(filters_dict, dict):
+            filters_dict = None
+    
+    await product_facet_engine.ensure_ready(db)
     
     return {
         "success": True,
-        "data": {
-            "categories": [
-                {**v, "id": k} 
-                for k, v in facets["categories"].items()
-            ],
-            "brands": sorted(
-                [{"id": k, "name": k, "count": v["count"]} for k, v in facets["brands"].items()],
-                key=lambda x: x["count"],
-                reverse=True
-            )[:20],  # Top 20 brands
-            "ratings": facets["ratings"]
-        }
+        "data": product_facet_engine.facets(
+            category_id=category_id,
+            persona_id=persona_id,
+            min_price=min_price,
+            max_price=max_price,
+            specific_filters=filters_dict
+        )
     }
 
 
-
-
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(product_data: ProductCreate, current_user: dict = Depends(get_current_user)):
     """
@@ -168,17 +155,44 @@ async def create_product(product_data: ProductCreate, current_user: dict = Depen
     product_dict['updated_at'] = product_dict['updated_at'].isoformat()
     
     await db.products.insert_one(product_dict)
+    await catalog_sync.product_changed(product_dict)
     
-    # Invalidate products list cache
-    invalidate_cache("get_products:*")
+    # Only list pages that could now include the new product
+    await invalidate_tags(product_cache_tags(product_dict))
     
     return ProductResponse(**product.model_dump())
 
 
+def product_cache_tags(product: dict) -> List[str]:
+    """Cache tags a write to `product` must invalidate"""
+    tags = [f"product:{product.get('id')}", "category:any"]
+    if product.get("category_id"):
+        tags.append(f"category:{product['category_id']}")
+    return tags
+
+
+def _product_page_tags(products, query, sort, skip, limit, category_id=None) -> List[str]:
+    """Tag a list page with every product and category it contains plus its category filter"""
+    tags = {f"category:{category_id or 'any'}"}
+    for product in products:
+        tags.add(f"product:{product.get('id')}")
+        if product.get("category_id"):
+            tags.add(f"category:{product['category_id']}")
+    return sorted(tags)
+
+
+@cache_response(ttl_seconds=60, tags=_product_page_tags)
+async def _fetch_product_page(query: dict, sort: list, skip: int, limit: int, category_id: Optional[str] = None):
+    """One page of the product listing (cached, tag-invalidated)"""
+    return await db.products.find(query, {"_id": 0}).sort(sort).skip(skip).limit(limit).to_list(limit)
+
+
 @router.get("/", response_model=List[ProductResponse])
 async def get_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque keyset cursor from X-Next-Cursor"),
     category_id: Optional[str] = None,
     subcategory_id: Optional[str] = None,
     persona_id: Optional[str] = None,
@@ -193,6 +207,9 @@ async def get_products(
     """
     Get all products with filters and pagination
     Supports persona filtering and specific_filters (dynamic filters by subcategory)
+    
+    Pass `cursor` (from the X-Next-Cursor response header) instead of `skip`
+    for constant-cost deep pagination.
     """
     import json
     
@@ -212,7 +229,11 @@ async def get_products(
     if persona_id:
         query["personas"] = {"$in": [persona_id]}
     
-    if search:
+    if search and product_search_index.ready and catalog_sync.in_sync:
+        # Resolve matches in memory, Mongo only applies the remaining filters.
+        # Out of sync the index may miss other workers' changes: use $regex
+        query["id"] = {"$in": product_search_index.match_ids(search, status=None)}
+    elif search:
         query["$or"] = [
             {"title": {"$regex": search, "$options": "i"}},
             {"description": {"$regex": search, "$options": "i"}},
@@ -258,20 +279,31 @@ async def get_products(
         except json.JSONDecodeError:
             pass  # Ignore invalid JSON
     
-    # Sort order
+    # Sort order (id makes the sort tuple unique for keyset pagination)
     sort_direction = -1 if sort_order == "desc" else 1
+    sort = [(sort_by, sort_direction), ("id", sort_direction)]
     
     # Query database
-    products = await db.products.find(query, {"_id": 0}).sort(sort_by, sort_direction).skip(skip).limit(limit).to_list(limit)
+    if cursor:
+        query = apply_cursor(query, sort, cursor)
+        skip = 0
+    products = await _fetch_product_page(query, sort, skip, limit, category_id)
     
-    # Parse datetime
+    next_token = next_cursor(products, sort, limit)
+    if next_token:
+        response.headers["X-Next-Cursor"] = next_token
+    
+    # Parse datetime (on copies: the page may be shared with the cache)
+    items = []
     for product in products:
+        product = dict(product)
         if isinstance(product.get('created_at'), str):
             product['created_at'] = datetime.fromisoformat(product['created_at'])
         if isinstance(product.get('updated_at'), str):
             product['updated_at'] = datetime.fromisoformat(product['updated_at'])
+        items.append(ProductResponse(**product))
     
-    return [ProductResponse(**p) for p in products]
+    return items
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
@@ -307,6 +339,7 @@ async def get_product(product_id: str):
 async def update_product(
     product_id: str,
     product_data: ProductUpdate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -336,6 +369,12 @@ async def update_product(
     
     # Get updated product
     updated_product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    await catalog_sync.product_changed(updated_product)
+    # Old tags cover pages it left (e.g. category change), new tags pages it may join
+    await invalidate_tags(product_cache_tags(product) + product_cache_tags(updated_product))
+    # Price history, wishlist drops and price alerts after the response
+    if update_data.get("price") is not None and update_data["price"] != product.get("price"):
+        background_tasks.add_task(process_price_change, dict(updated_product), product.get("price"))
     
     # Parse datetime
     if isinstance(updated_product.get('created_at'), str):
@@ -369,6 +408,8 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
     
     # Soft delete
     await db.products.update_one({"id": product_id}, {"$set": {"is_active": False}})
+    await catalog_sync.product_removed(product_id)
+    await invalidate_tags(product_cache_tags(product))
     
     return {"message": "Product deleted successfully"}
 
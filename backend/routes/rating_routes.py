@@ -5,13 +5,14 @@ from models.rating import UserStats, Achievement, XPTransaction, MonthlyLeaderbo
 from models.user import User
 from utils.auth_utils import get_current_user
 from utils.cache import cache_response, invalidate_cache
-from database import get_database
+from database import get_database, get_analytics_database
 from datetime import datetime, timezone
 
 # Import Ghost Protocol services
 from services.leveling_system import (
     calculate_level_from_xp,
     calculate_xp_progress,
+    calculate_level_progress_many,
     get_hierarchy,
     get_trust_tier,
     calculate_rp_cap,
@@ -30,6 +31,7 @@ from services.xp_service import (
     select_class,
     get_user_ghost_profile,
 )
+from services.leaderboard_service import leaderboard_service
 
 router = APIRouter(prefix="/rating", tags=["rating"])
 
@@ -56,7 +58,7 @@ def calculate_level(xp: int) -> int:
 
 def xp_to_next_level(current_xp: int, current_level: int) -> int:
     """Calculate XP needed for next level"""
-    _, xp_needed, _ = calculate_xp_progress(current_xp)
+    _, xp_needed, _, _ = calculate_xp_progress(current_xp)
     return xp_needed
 
 
@@ -72,7 +74,7 @@ async def get_my_stats(
     # Get Ghost Protocol profile
     xp = current_user.xp_total if hasattr(current_user, 'xp_total') else current_user.experience
     level = calculate_level_from_xp(xp)
-    _, xp_to_next, progress = calculate_xp_progress(xp)
+    _, xp_to_next, progress, _ = calculate_xp_progress(xp)
     hierarchy = get_hierarchy(level)
     trust = current_user.trust_score if hasattr(current_user, 'trust_score') else 500.0
     trust_tier, halo_color = get_trust_tier(trust)
@@ -131,6 +133,40 @@ async def get_my_stats(
     return stats
 
 
+def _refresh_levels(stats_list: List[UserStats]) -> List[UserStats]:
+    """Recompute level fields from total_xp for a whole page at once"""
+    if not stats_list:
+        return stats_list
+    levels = calculate_level_progress_many([stats.total_xp for stats in stats_list])
+    for stats, level, xp_to_next, progress, hierarchy in zip(
+        stats_list,
+        levels.levels.tolist(),
+        levels.xp_to_next.tolist(),
+        levels.progress.tolist(),
+        levels.hierarchy.tolist(),
+    ):
+        stats.current_level = level
+        stats.xp_to_next_level = xp_to_next
+        stats.xp_progress_percent = progress
+        stats.hierarchy = hierarchy
+    return stats_list
+
+
+async def _ranked_stats(db, rows) -> List[UserStats]:
+    """Hydrate leaderboard rows [(user_id, score, rank)] with one $in on user_stats"""
+    user_ids = [user_id for user_id, _, _ in rows]
+    docs = await db.user_stats.find({"user_id": {"$in": user_ids}}).to_list(length=len(user_ids))
+    by_id = {doc["user_id"]: doc for doc in docs}
+    
+    result = []
+    for user_id, _, rank in rows:
+        if user_id in by_id:
+            stats_obj = UserStats(**by_id[user_id])
+            stats_obj.monthly_rank = rank
+            result.append(stats_obj)
+    return _refresh_levels(result)
+
+
 @router.get("/leaderboard", response_model=List[UserStats])
 @cache_response(ttl_seconds=60)  # 1 minute cache - updates frequently
 async def get_leaderboard(
@@ -139,14 +175,17 @@ async def get_leaderboard(
     period: str = Query("monthly", regex="^(monthly|all_time)$")
 ):
     """Get leaderboard"""
-    db = await get_database()
+    db = await get_analytics_database()
     
-    if period == "monthly":
-        # Sort by monthly RP
-        stats_list = await db.user_stats.find().sort("monthly_rp", -1).skip(skip).limit(limit).to_list(length=limit)
-    else:
-        # Sort by total XP
-        stats_list = await db.user_stats.find().sort("total_xp", -1).skip(skip).limit(limit).to_list(length=limit)
+    # Sort by monthly RP or total XP
+    board, sort_field = ("monthly_rp", "monthly_rp") if period == "monthly" else ("xp", "total_xp")
+    
+    rows = await leaderboard_service.top(board, skip, limit)
+    if rows is not None:
+        return await _ranked_stats(db, rows)
+    
+    # Leaderboard not built (or Redis down): sort in Mongo
+    stats_list = await db.user_stats.find().sort(sort_field, -1).skip(skip).limit(limit).to_list(length=limit)
     
     result = []
     for i, stats in enumerate(stats_list, start=skip + 1):
@@ -154,7 +193,24 @@ async def get_leaderboard(
         stats_obj.monthly_rank = i
         result.append(stats_obj)
     
-    return result
+    return _refresh_levels(result)
+
+
+@router.get("/leaderboard/around-me", response_model=List[UserStats])
+async def get_leaderboard_around_me(
+    radius: int = Query(5, ge=1, le=25),
+    period: str = Query("monthly", regex="^(monthly|all_time)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Leaderboard window centred on the current user"""
+    board = "monthly_rp" if period == "monthly" else "xp"
+    
+    rows = await leaderboard_service.around(board, current_user.id, radius)
+    if rows is None:
+        raise HTTPException(status_code=503, detail="Leaderboard is not available")
+    
+    db = await get_analytics_database()
+    return await _ranked_stats(db, rows)
 
 
 @router.get("/top-monthly", response_model=List[UserStats])
@@ -163,7 +219,11 @@ async def get_top_monthly(
     limit: int = Query(10, ge=1, le=10)
 ):
     """Get top users of current month (for rewards)"""
-    db = await get_database()
+    db = await get_analytics_database()
+    
+    rows = await leaderboard_service.top("monthly_rp", 0, limit)
+    if rows is not None:
+        return await _ranked_stats(db, rows)
     
     stats_list = await db.user_stats.find().sort("monthly_rp", -1).limit(limit).to_list(length=limit)
     
@@ -173,7 +233,7 @@ async def get_top_monthly(
         stats_obj.monthly_rank = i
         result.append(stats_obj)
     
-    return result
+    return _refresh_levels(result)
 
 
 @router.post("/award-xp")
@@ -295,13 +355,24 @@ async def reset_monthly_rp(
     
     db = await get_database()
     
-    # Get top 10 before reset
-    top_10 = await db.user_stats.find().sort("monthly_rp", -1).limit(10).to_list(length=10)
-    
-    # Award legendary achievements and video hover to top 10
     now = datetime.now(timezone.utc)
     month_str = now.strftime("%Y-%m")
     
+    # Archive + clear the monthly board atomically and take its top 10
+    archived = await leaderboard_service.reset_monthly(month_str, limit=10)
+    if archived is not None:
+        archived_ids = [user_id for user_id, _, _ in archived]
+        docs = await db.user_stats.find({"user_id": {"$in": archived_ids}}).to_list(length=10)
+        by_id = {doc["user_id"]: doc for doc in docs}
+        top_10 = [
+            {**by_id.get(user_id, {"user_id": user_id}), "monthly_rp": int(score)}
+            for user_id, score, _ in archived
+        ]
+    else:
+        # Get top 10 before reset
+        top_10 = await db.user_stats.find().sort("monthly_rp", -1).limit(10).to_list(length=10)
+    
+    # Award legendary achievements and video hover to top 10
     for i, user_stats in enumerate(top_10, start=1):
         legendary_badge = f"🏆 Top {i} - {month_str}"
         
@@ -325,7 +396,7 @@ async def reset_monthly_rp(
         top_users=[
             {
                 "user_id": stats["user_id"],
-                "username": stats["username"],
+                "username": stats.get("username"),
                 "rp": stats["monthly_rp"],
                 "rank": i
             }
@@ -346,6 +417,9 @@ async def reset_monthly_rp(
         }
     )
     
+    await invalidate_cache("get_leaderboard:*")
+    await invalidate_cache("get_top_monthly:*")
+    
     return {"status": "reset_complete", "month": month_str, "top_10_awarded": len(top_10)}
 
 
@@ -5,6 +5,8 @@ from models.search_history import SearchHistory
 from models.user import User
 from utils.auth_utils import get_current_user
 from utils.responses import success_response
+from services.search_index import product_search_index
+from services.catalog_sync import catalog_sync
 from datetime import datetime, timezone, timedelta
 import re
 
@@ -14,6 +16,11 @@ router = APIRouter(prefix="/search", tags=["search"])
 @router.get("/suggestions")
 async def get_search_suggestions(q: str = Query(..., min_length=1)):
     """Get autocomplete suggestions for products"""
+    if product_search_index.ready and catalog_sync.in_sync:
+        suggestions = product_search_index.suggest(q, limit=8)
+        return success_response(data=suggestions, message=f"Found {len(suggestions)} suggestions")
+    
+    # Fallback while the in-memory index is not built yet or may be stale
     db = await get_database()
     
     # Escape regex special characters
@@ -9,6 +9,7 @@ import json
 
 from database import db
 from utils.auth_utils import get_current_user
+from utils.loaders import RequestLoaders, get_loaders
 
 router = APIRouter(prefix="/swap/chat", tags=["Swap Chat"])
 
@@ -58,7 +59,8 @@ async def get_or_create_conversation(listing_id: str, buyer_id: str, seller_id:
 
 @router.get("/conversations")
 async def get_my_conversations(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loaders: RequestLoaders = Depends(get_loaders)
 ):
     """Get all conversations for current user (as buyer or seller)"""
     
@@ -70,15 +72,21 @@ async def get_my_conversations(
         "status": "active"
     }, {"_id": 0}).sort("updated_at", -1).to_list(50)
     
-    # Enrich with listing and user info
+    # Enrich with listing and user info (batched)
+    def other_party(conv):
+        return conv["seller_id"] if conv["buyer_id"] == current_user["id"] else conv["buyer_id"]
+    
+    listings = await loaders.loader(
+        "swap_listings", projection={"_id": 0, "title": 1, "price": 1, "images": 1}
+    ).load_map(conv["listing_id"] for conv in conversations)
+    users = await loaders.loader(
+        "users", projection={"_id": 0, "username": 1}
+    ).load_map(other_party(conv) for conv in conversations)
+    
     enriched = []
     for conv in conversations:
-        # Get listing info
-        listing = await db.swap_listings.find_one({"id": conv["listing_id"]}, {"_id": 0, "title": 1, "price": 1, "images": 1})
-        
-        # Get other user info
-        other_user_id = conv["seller_id"] if conv["buyer_id"] == current_user["id"] else conv["buyer_id"]
-        other_user = await db.users.find_one({"id": other_user_id}, {"_id": 0, "username": 1})
+        listing = listings.get(conv["listing_id"])
+        other_user = users.get(other_party(conv))
         
         # Calculate unread count for current user
         is_buyer = conv["buyer_id"] == current_user["id"]
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 import uuid
@@ -13,6 +13,8 @@ from models.swap_transaction import (
     SwapReview, SwapReviewCreate, TransactionStatus
 )
 from utils.auth_utils import get_current_user, get_current_user_optional
+from utils.pagination import apply_cursor, next_cursor
+from utils.loaders import RequestLoaders, get_loaders
 
 router = APIRouter(prefix="/swap", tags=["Glassy Swap"])
 
@@ -23,6 +25,7 @@ router = APIRouter(prefix="/swap", tags=["Glassy Swap"])
 
 @router.get("/listings", response_model=List[SwapListingResponse])
 async def get_swap_listings(
+    response: Response,
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
     condition: Optional[SwapCondition] = None,
@@ -34,9 +37,16 @@ async def get_swap_listings(
     seller_min_rating: Optional[float] = None,
     sort_by: str = Query("newest", enum=["newest", "oldest", "price_asc", "price_desc", "popular"]),
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    loaders: RequestLoaders = Depends(get_loaders)
 ):
-    """Get swap listings with filters - infinite scroll support"""
+    """
+    Get swap listings with filters - infinite scroll support
+    
+    Infinite scroll should pass `cursor` from the X-Next-Cursor header
+    instead of growing `skip`.
+    """
     
     # Build query
     query = {"status": SwapListingStatus.ACTIVE.value}
@@ -67,29 +77,45 @@ async def get_swap_listings(
             {"tags": {"$in": [search.lower()]}}
         ]
     
-    # Sorting
+    # Sorting (id keeps the sort tuple unique for keyset pagination)
     sort_options = {
-        "newest": [("created_at", -1)],
-        "oldest": [("created_at", 1)],
-        "price_asc": [("price", 1)],
-        "price_desc": [("price", -1)],
-        "popular": [("views", -1)]
+        "newest": [("created_at", -1), ("id", -1)],
+        "oldest": [("created_at", 1), ("id", 1)],
+        "price_asc": [("price", 1), ("id", 1)],
+        "price_desc": [("price", -1), ("id", -1)],
+        "popular": [("views", -1), ("id", -1)]
     }
-    sort = sort_options.get(sort_by, [("created_at", -1)])
+    sort = sort_options.get(sort_by, sort_options["newest"])
     
     # Boosted first
     sort = [("is_boosted", -1)] + sort
     
     # Fetch listings
-    cursor = db.swap_listings.find(query, {"_id": 0}).sort(sort).skip(skip).limit(limit)
-    listings = await cursor.to_list(length=limit)
+    if cursor:
+        query = apply_cursor(query, sort, cursor)
+        db_cursor = db.swap_listings.find(query, {"_id": 0}).sort(sort).limit(limit)
+    else:
+        db_cursor = db.swap_listings.find(query, {"_id": 0}).sort(sort).skip(skip).limit(limit)
+    listings = await db_cursor.to_list(length=limit)
+    
+    # Cursor follows the raw page, before the seller-rating filter below
+    next_token = next_cursor(listings, sort, limit)
+    if next_token:
+        response.headers["X-Next-Cursor"] = next_token
+    
+    # Enrich with seller info (one batched query per collection)
+    seller_ids = [listing["seller_id"] for listing in listings]
+    sellers = await loaders.loader(
+        "users", projection={"_id": 0, "username": 1, "is_verified_creator": 1}
+    ).load_map(seller_ids)
+    seller_ratings = await loaders.loader(
+        "swap_seller_ratings", key_field="user_id", projection={"_id": 0}
+    ).load_map(seller_ids)
     
-    # Enrich with seller info
     enriched_listings = []
     for listing in listings:
-        # Get seller info
-        seller = await db.users.find_one({"id": listing["seller_id"]}, {"_id": 0})
-        seller_rating = await db.swap_seller_ratings.find_one({"user_id": listing["seller_id"]}, {"_id": 0})
+        seller = sellers.get(listing["seller_id"])
+        seller_rating = seller_ratings.get(listing["seller_id"])
         
         if seller:
             listing["seller_username"] = seller.get("username")
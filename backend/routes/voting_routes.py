@@ -4,6 +4,7 @@ from models.voting import Proposal, ProposalCreate, ProposalWithComments, Propos
 from models.user import User
 from utils.auth_utils import get_current_user
 from database import get_database
+from services.xp_service import add_monthly_rp
 from datetime import datetime, timezone, timedelta
 
 router = APIRouter(prefix="/voting", tags=["voting"])
@@ -138,11 +139,7 @@ async def cast_vote(
     await db.proposals.update_one({"id": proposal_id}, update_dict)
     
     # Award RP for voting
-    await db.user_stats.update_one(
-        {"user_id": current_user.id},
-        {"$inc": {"total_votes_cast": 1, "monthly_rp": 3}},
-        upsert=True
-    )
+    await add_monthly_rp(current_user.id, 3, {"total_votes_cast": 1})
     
     return {"status": "voted", "vote_type": vote_type, "weight": weight}
 
@@ -57,6 +57,7 @@ from routes.user_address_routes import router as user_address_router
 # Glassy Mind - AI Brain
 from glassy_mind import router as mind_router
 from glassy_mind.websocket_handler import router as ws_router
+from glassy_mind.event_ingestor import event_ingestor
 
 # PC Builder - Compatibility Service
 from routes.builder_routes import router as builder_router
@@ -72,8 +73,13 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 # Import background tasks
-from tasks.price_tracker import track_product_prices
-import asyncio
+from tasks.scheduler import scheduler, SCHEDULER_ENABLED
+from tasks.price_tracker import merge_duplicate_price_histories, start_price_watcher, stop_price_watcher
+from tasks.jobs import register_jobs
+
+# In-memory product search index and facet counters
+from services.catalog_sync import catalog_sync
+from services.leaderboard_service import leaderboard_service
 
 
 ROOT_DIR = Path(__file__).parent
@@ -214,14 +220,37 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await scheduler.stop()
+    await stop_price_watcher()
+    await catalog_sync.stop()
+    # Write buffered Glassy Mind events before the client goes away
+    await event_ingestor.stop()
     client.close()
 
 
 @app.on_event("startup")
 async def startup_db_indexes():
     """Create database indexes and start background tasks on startup"""
-    await create_indexes()
+    # Duplicate histories would keep the unique price_history.product_id index from building
+    await create_indexes(prepare=merge_duplicate_price_histories)
+    
+    # Build the in-memory search index and facet counters and keep them in
+    # sync with other workers (search falls back to $regex until they are)
+    try:
+        await catalog_sync.start(db)
+    except Exception as e:
+        logger.error(f"❌ Error starting product catalog sync: {e}")
+    
+    # Sorted-set leaderboards (routes sort in Mongo until built)
+    try:
+        await leaderboard_service.ensure_built(db)
+    except Exception as e:
+        logger.error(f"❌ Error building leaderboards: {e}")
+    
+    # Start periodic jobs (each runs once per cluster via leases)
+    if SCHEDULER_ENABLED:
+        register_jobs(scheduler)
+        scheduler.start()
     
-    # Start background tasks
-    asyncio.create_task(track_product_prices())
-    logger.info("🚀 Background tasks started: price_tracker")
\ No newline at end of file
+    # Price drops and alerts from writes outside the API (no-op without change streams)
+    start_price_watcher()
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Catalog Sync
+============
+Keeps every worker's in-memory product indexes (search index, facet
+engine) current across workers.
+
+Each gunicorn worker holds its own copy of the product indexes, and a
+product route only runs on one of them:
+- the route calls ``product_changed`` / ``product_removed`` after writing
+  Mongo: the index on this worker is updated directly and the product id
+  is published on CATALOG_CHANNEL
+- every worker (the writer included) re-reads published products from
+  Mongo and applies their current state, so out-of-order messages settle
+  on whatever Mongo holds last
+- changes published while a worker isn't subscribed are lost to it: each
+  (re)subscription rebuilds the indexes, and ``in_sync`` is False until it
+  has, so search falls back to Mongo instead of filtering on a stale index
+- a slow periodic rebuild (CATALOG_REBUILD_INTERVAL) bounds anything else,
+  e.g. FakeRedis in development, whose pub/sub stays inside one process
+"""
+
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+
+from services.facet_engine import product_facet_engine
+from services.search_index import product_search_index
+from utils.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CHANNEL = "catalog:products"
+CATALOG_REBUILD_INTERVAL = float(os.getenv('CATALOG_REBUILD_INTERVAL', '900'))
+CATALOG_START_TIMEOUT = float(os.getenv('CATALOG_START_TIMEOUT', '30'))
+POLL_SECONDS = 1.0
+
+
+class CatalogSync:
+    """Per-worker subscriber applying product changes to the in-memory indexes"""
+
+    def __init__(self, indexes: List[Any]):
+        # Anything with build(db), upsert(product) and remove(product_id)
+        self.indexes = indexes
+        self.in_sync = False
+        self.last_rebuild: Optional[float] = None
+        self.stats = {"published": 0, "applied": 0, "rebuilds": 0, "errors": 0}
+        self._db = None
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+        self._synced = asyncio.Event()
+
+    # ========================================
+    # LIFECYCLE
+    # ========================================
+
+    async def start(self, db, client=None) -> None:
+        """Subscribe and build the indexes; waits up to CATALOG_START_TIMEOUT for the first build"""
+        self._db = db
+        self._client = client or await get_redis()
+        if self._task is None or self._task.done():
+            self._synced.clear()
+            self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._synced.wait(), timeout=CATALOG_START_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Search keeps using Mongo until the listener catches up
+            logger.warning("⚠️ Product indexes not synced yet, continuing startup")
+
+    async def stop(self) -> None:
+        self.in_sync = False
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # ========================================
+    # PUBLISH
+    # ========================================
+
+    async def product_changed(self, product: Dict[str, Any]) -> None:
+        """A product was created or updated: apply here, then tell every worker"""
+        for index in self.indexes:
+            index.upsert(product)
+        await self._publish(product["id"])
+
+    async def product_removed(self, product_id: str) -> None:
+        """A product was deleted: drop it here, then tell every worker"""
+        for index in self.indexes:
+            index.remove(product_id)
+        await self._publish(product_id)
+
+    async def _publish(self, product_id: str) -> None:
+        try:
+            client = self._client or await get_redis()
+            await client.publish(CATALOG_CHANNEL, json.dumps({"id": product_id}))
+            self.stats["published"] += 1
+        except Exception as e:
+            # Other workers pick it up with their next rebuild
+            self.stats["errors"] += 1
+            logger.warning(f"Catalog change publish error for {product_id}: {e}")
+
+    # ========================================
+    # SUBSCRIBE
+    # ========================================
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                # Messages published during the rebuild queue up on the subscription
+                await self._rebuild()
+                self.in_sync = True
+                self._synced.set()
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=POLL_SECONDS)
+                    if message is not None:
+                        await self._apply(message["data"])
+                    if time.monotonic() - self.last_rebuild >= CATALOG_REBUILD_INTERVAL:
+                        await self._rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.in_sync = False
+                self.stats["errors"] += 1
+                logger.warning(f"Catalog sync listener error: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    async def _rebuild(self) -> None:
+        for index in self.indexes:
+            await index.build(self._db)
+        self.last_rebuild = time.monotonic()
+        self.stats["rebuilds"] += 1
+
+    async def _apply(self, data: str) -> None:
+        try:
+            product_id = json.loads(data)["id"]
+        except (TypeError, ValueError, KeyError):
+            return
+        product = await self._db.products.find_one({"id": product_id}, {"_id": 0})
+        for index in self.indexes:
+            if product is None:
+                index.remove(product_id)
+            else:
+                index.upsert(product)
+        self.stats["applied"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "in_sync": self.in_sync,
+            "seconds_since_rebuild": (
+                round(time.monotonic() - self.last_rebuild, 1) if self.last_rebuild is not None else None
+            ),
+        }
+
+
+# Global instance
+catalog_sync = CatalogSync([product_search_index, product_facet_engine])
@@ -18,6 +18,7 @@ from models.consensus_idea import (
     ConsensusIdea, IdeaCreate, IdeaUpdate, IdeaComment,
     IdeaStatus, IdeaCategory, IdeaVote, RP_COSTS, XP_REWARDS
 )
+from services.leveling_system import ActionType
 
 logger = logging.getLogger(__name__)
 
@@ -222,12 +223,12 @@ class ConsensusService:
             }
         )
         
-        # Award XP to voter
-        from services.xp_service import xp_service
-        await xp_service.award_xp(user_id, XP_REWARDS["idea_voted"], "vote_cast")
-        
-        # Award XP to idea author
-        await xp_service.award_xp(idea["user_id"], 10, "vote_received")
+        # Award XP to voter and idea author in one batch
+        from services.xp_service import award_xp_many
+        await award_xp_many([
+            (user_id, ActionType.VOTE_CAST.value, XP_REWARDS["idea_voted"]),
+            (idea["user_id"], ActionType.LIKE_RECEIVED.value, 10),
+        ])
         
         logger.info(f"User {user_id} voted on idea {idea_id}. New score: {new_score}")
         
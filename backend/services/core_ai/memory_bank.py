@@ -1,30 +1,34 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
 from database import get_database
+from services.feature_store import FeatureGroup, feature_store
+from utils.loaders import BatchLoader
 import logging
 
 logger = logging.getLogger(__name__)
 
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Поля профиля в контексте AI (копия уходит в user_features — только явный список)
+USER_CONTEXT_FIELDS = (
+    "id", "username", "created_at", "is_seller", "level", "xp_total",
+    "trust_score", "hierarchy", "class_type", "class_tier", "equipped_title"
+)
+
+# Группы контекста AI в feature store
+MEMORY_GROUPS = (
+    "user", "recent_views", "cart", "wishlist",
+    "past_orders", "current_build", "preferences", "budget"
+)
+
 
 class MemoryBank:
     """Централизованная память для всех AI агентов"""
     
     async def get_user_context(self, user_id: str) -> Dict:
-        """Получить полный контекст пользователя"""
-        db = await get_database()
-        
-        context = {
-            "user": await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0}),
-            "recent_views": await self._get_recent_views(user_id),
-            "cart": await self._get_cart(user_id),
-            "wishlist": await self._get_wishlist(user_id),
-            "past_orders": await self._get_past_orders(user_id),
-            "current_build": await self._get_current_build(user_id),
-            "preferences": await self._get_preferences(user_id),
-            "budget": await self._estimate_budget(user_id)
-        }
-        
-        return context
+        """Получить полный контекст пользователя (одна выборка из feature store)"""
+        return await feature_store.get(user_id, MEMORY_GROUPS)
     
     async def get_conversation(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Получить историю разговора для AI контекста"""
@@ -93,9 +97,19 @@ class MemoryBank:
             }},
             upsert=True
         )
+        await feature_store.invalidate(user_id, "preferences")
     
     # ==================== Helper Methods ====================
     
+    async def _get_user(self, user_id: str) -> Optional[Dict]:
+        """Получить профиль пользователя"""
+        db = await get_database()
+        
+        return await db.users.find_one(
+            {"id": user_id},
+            {"_id": 0, **{field: 1 for field in USER_CONTEXT_FIELDS}}
+        )
+    
     async def _get_recent_views(self, user_id: str) -> List[Dict]:
         """Получить недавно просмотренные товары"""
         db = await get_database()
@@ -105,13 +119,15 @@ class MemoryBank:
             {"_id": 0}
         ).sort("viewed_at", -1).limit(10).to_list(10)
         
-        # Обогатить данными о продуктах
+        # Обогатить данными о продуктах (один $in запрос)
+        products = await BatchLoader(
+            db.products,
+            projection={"_id": 0, "id": 1, "title": 1, "price": 1, "category": 1}
+        ).load_map(view.get("product_id") for view in views)
+        
         enriched = []
         for view in views:
-            product = await db.products.find_one(
-                {"id": view.get("product_id")},
-                {"_id": 0, "id": 1, "title": 1, "price": 1, "category": 1}
-            )
+            product = products.get(view.get("product_id"))
             if product:
                 view["product"] = product
                 enriched.append(view)
@@ -206,3 +222,17 @@ class MemoryBank:
 
 # Global instance
 memory_bank = MemoryBank()
+
+# Loaders групп: пересчитываются после invalidate() или по TTL
+# (просмотры, профиль и wishlist меняются без хука на запись)
+for _name, _version, _loader, _ttl in (
+    ("user", 2, memory_bank._get_user, HOUR),
+    ("recent_views", 1, memory_bank._get_recent_views, 10 * 60),
+    ("cart", 1, memory_bank._get_cart, DAY),
+    ("wishlist", 1, memory_bank._get_wishlist, 10 * 60),
+    ("past_orders", 1, memory_bank._get_past_orders, HOUR),
+    ("current_build", 1, memory_bank._get_current_build, DAY),
+    ("preferences", 1, memory_bank._get_preferences, None),
+    ("budget", 1, memory_bank._estimate_budget, HOUR),
+):
+    feature_store.register(FeatureGroup(_name, _version, _loader, _ttl))
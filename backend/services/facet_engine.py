@@ -0,0 +1,396 @@
+"""
+Product Facet Engine
+====================
+Incrementally maintained facet counters for the catalog filter sidebar.
+
+Replaces the full-collection scan in ``/products/facets``:
+- Per-facet counters (category, brand, rating, persona) updated on
+  product create/update/soft-delete
+- Posting sets per facet value for conditional (filtered) counts
+- Multi-select semantics: a facet ignores its own filter so siblings
+  keep their counts
+
+Reads are answered from memory. Each worker holds its own copy, built and
+kept current across workers by ``services.catalog_sync``.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+ValueKey = Tuple[str, Any]
+
+
+def _value_key(value: Any) -> Optional[ValueKey]:
+    """Hashable key mirroring Mongo equality (bool ≠ 1, 16 == 16.0)"""
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, (int, float)):
+        return ("n", float(value))
+    if isinstance(value, str):
+        return ("s", value)
+    return None
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class FacetRecord:
+    """Facet-relevant projection of a product"""
+    id: str
+    category_id: Optional[str]
+    brand: str
+    rating: int
+    price: Optional[float]
+    personas: Tuple[str, ...] = ()
+    specific_filters: Dict[str, Any] = field(default_factory=dict)
+
+
+class ProductFacetEngine:
+    """Facet counters and posting sets over approved, active products"""
+
+    TOP_BRANDS = 20
+
+    PROJECTION = {
+        "_id": 0, "id": 1, "status": 1, "is_active": 1, "category_id": 1,
+        "brand": 1, "seller_id": 1, "rating": 1, "price": 1, "personas": 1,
+        "specific_filters": 1,
+    }
+
+    def __init__(self):
+        self._reset()
+        self.ready = False
+        self._build_lock = asyncio.Lock()
+
+    def _reset(self) -> None:
+        self._records: Dict[str, FacetRecord] = {}
+
+        # Unconditional counters
+        self._category_counts: Counter = Counter()
+        self._brand_counts: Counter = Counter()
+        self._rating_counts: Counter = Counter()
+        self._persona_counts: Counter = Counter()
+
+        # Posting sets for conditional facets
+        self._by_category: Dict[str, Set[str]] = {}
+        self._by_persona: Dict[str, Set[str]] = {}
+        self._by_filter_value: Dict[str, Dict[ValueKey, Set[str]]] = {}
+        self._filter_numbers: Dict[str, Dict[str, float]] = {}
+        self._filter_strings: Dict[str, Dict[str, List[str]]] = {}
+        self._prices: List[Tuple[float, str]] = []
+
+    # ----------------------------------------
+    # Building
+    # ----------------------------------------
+
+    async def build(self, db) -> int:
+        """(Re)build all counters from the ``products`` collection"""
+        started = time.perf_counter()
+        fresh = ProductFacetEngine()
+
+        cursor = db.products.find(
+            {"status": "approved", "is_active": {"$ne": False}},
+            self.PROJECTION
+        )
+        async for product in cursor:
+            fresh.upsert(product)
+
+        # Swap state in one synchronous step
+        self.__dict__.update({
+            k: v for k, v in fresh.__dict__.items() if k != "_build_lock"
+        })
+        self.ready = True
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"📊 Product facet engine built: {len(self._records)} products in {elapsed_ms:.1f}ms"
+        )
+        return len(self._records)
+
+    async def ensure_ready(self, db) -> None:
+        """Build once on first use if startup didn't get to it"""
+        if self.ready:
+            return
+        async with self._build_lock:
+            if not self.ready:
+                await self.build(db)
+
+    # ----------------------------------------
+    # Incremental updates
+    # ----------------------------------------
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        """Apply the current state of a product (approved + active are counted)"""
+        product_id = product.get("id")
+        if not product_id:
+            return
+
+        self.remove(product_id)
+        if product.get("status") != "approved" or product.get("is_active", True) is False:
+            return
+
+        brand = (product.get("brand") or product.get("seller_id") or "")[:20]
+        record = FacetRecord(
+            id=product_id,
+            category_id=product.get("category_id"),
+            brand=brand,
+            rating=int(product.get("rating") or 0),
+            price=_as_number(product.get("price")),
+            personas=tuple(dict.fromkeys(product.get("personas") or [])),
+            specific_filters=dict(product.get("specific_filters") or {}),
+        )
+        self._records[product_id] = record
+
+        if record.category_id:
+            self._category_counts[record.category_id] += 1
+            self._by_category.setdefault(record.category_id, set()).add(product_id)
+        if record.brand:
+            self._brand_counts[record.brand] += 1
+        self._rating_counts[record.rating] += 1
+        for persona in record.personas:
+            self._persona_counts[persona] += 1
+            self._by_persona.setdefault(persona, set()).add(product_id)
+        if record.price is not None:
+            insort(self._prices, (record.price, product_id))
+
+        for key, value in record.specific_filters.items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                vkey = _value_key(item)
+                if vkey is not None:
+                    self._by_filter_value.setdefault(key, {}).setdefault(vkey, set()).add(product_id)
+                if isinstance(item, str):
+                    self._filter_strings.setdefault(key, {}).setdefault(product_id, []).append(item.lower())
+            number = _as_number(value) if not isinstance(value, list) else None
+            if number is not None:
+                self._filter_numbers.setdefault(key, {})[product_id] = number
+
+    def remove(self, product_id: str) -> None:
+        """Drop a product from all counters (no-op if absent)"""
+        record = self._records.pop(product_id, None)
+        if record is None:
+            return
+
+        if record.category_id:
+            _decrement(self._category_counts, record.category_id)
+            _discard(self._by_category, record.category_id, product_id)
+        if record.brand:
+            _decrement(self._brand_counts, record.brand)
+        _decrement(self._rating_counts, record.rating)
+        for persona in record.personas:
+            _decrement(self._persona_counts, persona)
+            _discard(self._by_persona, persona, product_id)
+        if record.price is not None:
+            i = bisect_left(self._prices, (record.price, product_id))
+            if i < len(self._prices) and self._prices[i] == (record.price, product_id):
+                del self._prices[i]
+
+        for key, value in record.specific_filters.items():
+            values = value if isinstance(value, list) else [value]
+            buckets = self._by_filter_value.get(key, {})
+            for item in values:
+                vkey = _value_key(item)
+                if vkey is not None:
+                    _discard(buckets, vkey, product_id)
+            if not buckets:
+                self._by_filter_value.pop(key, None)
+            for index in (self._filter_numbers, self._filter_strings):
+                per_key = index.get(key)
+                if per_key is not None:
+                    per_key.pop(product_id, None)
+                    if not per_key:
+                        del index[key]
+
+    # ----------------------------------------
+    # Selections
+    # ----------------------------------------
+
+    def _price_ids(self, min_price: Optional[float], max_price: Optional[float]) -> Set[str]:
+        lo = 0 if min_price is None else bisect_left(self._prices, (min_price, ""))
+        hi = len(self._prices)
+        if max_price is not None:
+            # "￿" sorts after any product id at the same price
+            hi = bisect_right(self._prices, (max_price, "￿"))
+        return {product_id for _, product_id in self._prices[lo:hi]}
+
+    def _specific_filter_ids(self, key: str, value: Any) -> Optional[Set[str]]:
+        """Ids matching one specific_filters entry (same semantics as get_products)"""
+        if isinstance(value, list):
+            buckets = self._by_filter_value.get(key, {})
+            ids: Set[str] = set()
+            for item in value:
+                vkey = _value_key(item)
+                if vkey is not None:
+                    ids |= buckets.get(vkey, set())
+            return ids
+        if isinstance(value, dict):
+            low = _as_number(value.get("min")) if value.get("min") else None
+            high = _as_number(value.get("max")) if value.get("max") else None
+            if low is None and high is None:
+                return None
+            return {
+                product_id
+                for product_id, number in self._filter_numbers.get(key, {}).items()
+                if (low is None or number >= low) and (high is None or number <= high)
+            }
+        if isinstance(value, bool):
+            return set(self._by_filter_value.get(key, {}).get(("b", value), set()))
+        needle = str(value).lower()
+        return {
+            product_id
+            for product_id, strings in self._filter_strings.get(key, {}).items()
+            if any(needle in s for s in strings)
+        }
+
+    def _selection(
+        self,
+        category_id: Optional[str],
+        persona_id: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        specific_filters: Optional[Dict[str, Any]]
+    ) -> Dict[str, Set[str]]:
+        """Matching id sets per filter dimension (absent = unfiltered)"""
+        selection: Dict[str, Set[str]] = {}
+        if category_id:
+            selection["category"] = self._by_category.get(category_id, set())
+        if persona_id:
+            selection["persona"] = self._by_persona.get(persona_id, set())
+        if min_price is not None or max_price is not None:
+            selection["price"] = self._price_ids(min_price, max_price)
+        for key, value in (specific_filters or {}).items():
+            if not value:
+                continue
+            ids = self._specific_filter_ids(key, value)
+            if ids is not None:
+                selection[f"filter:{key}"] = ids
+        return selection
+
+    @staticmethod
+    def _intersect(selection: Dict[str, Set[str]], exclude: Optional[str] = None) -> Optional[Set[str]]:
+        sets = sorted(
+            (ids for dim, ids in selection.items() if dim != exclude),
+            key=len
+        )
+        if not sets:
+            return None
+        result = set(sets[0])
+        for ids in sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _count(self, ids: Optional[Set[str]], attr: str) -> Counter:
+        """Count an attribute over a subset, or return the global counter"""
+        if ids is None:
+            return {
+                "category_id": self._category_counts,
+                "brand": self._brand_counts,
+                "rating": self._rating_counts,
+                "personas": self._persona_counts,
+            }[attr]
+
+        counts: Counter = Counter()
+        for product_id in ids:
+            value = getattr(self._records[product_id], attr)
+            if attr == "personas":
+                counts.update(value)
+            elif value or attr == "rating":
+                counts[value] += 1
+        return counts
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+
+    def facets(
+        self,
+        category_id: Optional[str] = None,
+        persona_id: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        specific_filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Facet counts under the given selection"""
+        selection = self._selection(category_id, persona_id, min_price, max_price, specific_filters)
+        matched = self._intersect(selection)
+
+        categories = self._count(self._intersect(selection, exclude="category"), "category_id")
+        personas = self._count(self._intersect(selection, exclude="persona"), "personas")
+        brands = self._count(matched, "brand")
+        ratings = self._count(matched, "rating")
+
+        # Cumulative "N stars & up" counts
+        rating_facets = {
+            stars: sum(count for rating, count in ratings.items() if rating >= stars)
+            for stars in range(5, 0, -1)
+        }
+
+        price_ids = self._intersect(selection, exclude="price")
+        if price_ids is None:
+            prices = [p for p, _ in (self._prices[0], self._prices[-1])] if self._prices else []
+        else:
+            prices = [self._records[pid].price for pid in price_ids if self._records[pid].price is not None]
+
+        return {
+            "categories": [
+                {"id": cat_id, "name": cat_id, "count": count}
+                for cat_id, count in categories.items() if count
+            ],
+            "brands": [
+                {"id": brand, "name": brand, "count": count}
+                for brand, count in brands.most_common(self.TOP_BRANDS) if count
+            ],
+            "ratings": rating_facets,
+            "personas": [
+                {"id": persona, "count": count}
+                for persona, count in personas.most_common() if count
+            ],
+            "price_range": {
+                "min": min(prices) if prices else None,
+                "max": max(prices) if prices else None,
+            },
+            "total": len(self._records) if matched is None else len(matched),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "products": len(self._records),
+            "categories": len(self._category_counts),
+            "brands": len(self._brand_counts),
+            "filter_keys": len(self._by_filter_value),
+        }
+
+
+def _decrement(counter: Counter, key: Any) -> None:
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def _discard(index: Dict[Any, Set[str]], key: Any, product_id: str) -> None:
+    bucket = index.get(key)
+    if bucket is not None:
+        bucket.discard(product_id)
+        if not bucket:
+            del index[key]
+
+
+# Global facet engine instance
+product_facet_engine = ProductFacetEngine()
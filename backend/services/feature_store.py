@@ -0,0 +1,233 @@
+"""
+User Feature Store
+==================
+One ``user_features`` document per user holding materialised feature
+groups, so Glassy Mind rules and the AI agents read a complete user context
+with a single lookup instead of rebuilding it from raw collections.
+
+Feature groups are registered by their owners (``register``):
+- the Observer materialises ``session`` incrementally: every tracked event
+  queues a $push/$inc/$set against the stored group (``update_op``); its
+  TTL recomputes it from the source now and then, because a read racing
+  those ops can store a copy that misses (or repeats) an event
+- the MemoryBank registers profile groups (cart, orders, build, ...) that
+  are recomputed on read after ``invalidate`` or when their TTL runs out
+
+Each stored group carries the version it was computed with. Bumping a
+group's version makes every stored copy stale; incremental updates only
+apply to a group at the current version, so a stale or missing group is
+simply recomputed from its source on the next read.
+
+Every invalidation bumps the document's ``gen``. A read only writes its
+recomputed groups back if ``gen`` is unchanged since it loaded the
+document, so a value computed before an invalidation can't overwrite it.
+
+Reads go through a small per-worker LRU (FEATURE_CACHE_TTL seconds). Local
+writes drop the user's entry; other workers see them once their entry
+expires. Groups stored by an older version are removed by
+``drop_stale_versions`` (scheduled job).
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import get_database
+from utils.cache import LocalCache
+from utils.prometheus import counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COLLECTION = "user_features"
+FEATURE_CACHE_TTL = float(os.getenv('FEATURE_CACHE_TTL', '10'))
+FEATURE_CACHE_SIZE = int(os.getenv('FEATURE_CACHE_SIZE', '10000'))
+
+
+@dataclass
+class FeatureGroup:
+    name: str
+    version: int
+    loader: Callable[[str], Awaitable[Any]]   # user_id -> value, from the source collections
+    ttl_seconds: Optional[float] = None       # None: only invalidation/version makes it stale
+
+
+class FeatureStore:
+    """Versioned per-user feature groups with read-through materialisation"""
+
+    def __init__(self, cache_ttl: float = FEATURE_CACHE_TTL, cache_size: int = FEATURE_CACHE_SIZE):
+        self.groups: Dict[str, FeatureGroup] = {}
+        self.cache_ttl = cache_ttl
+        self._cache = LocalCache(cache_size)
+        self.stats = {"lookups": 0, "computed": 0, "discarded": 0, "invalidations": 0}
+
+    def register(self, group: FeatureGroup) -> None:
+        self.groups[group.name] = group
+
+    # ========================================
+    # READ
+    # ========================================
+
+    async def get(self, user_id: str, groups: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        {group: value} for the user; one find_one, plus loaders for groups
+        that are missing, stale or expired (written back in one update).
+        """
+        names = list(groups) if groups is not None else list(self.groups)
+        cached = self._cache.get(user_id)
+        if cached is not None and all(name in cached["value"] for name in names):
+            return {name: cached["value"][name] for name in names}
+
+        self.stats["lookups"] += 1
+        db = await get_database()
+        doc = await db[FEATURE_COLLECTION].find_one(
+            {"user_id": user_id},
+            {"_id": 0, "gen": 1, **{f"groups.{name}": 1 for name in names}}
+        )
+        stored = (doc or {}).get("groups", {})
+        generation = (doc or {}).get("gen")
+
+        now = datetime.now(timezone.utc)
+        values, stale = {}, []
+        for name in names:
+            entry = stored.get(name)
+            if entry is not None and self._is_fresh(self.groups[name], entry, now):
+                values[name] = entry["value"]
+            else:
+                stale.append(name)
+
+        if stale:
+            computed = await asyncio.gather(*(self.groups[name].loader(user_id) for name in stale))
+            values.update(zip(stale, computed))
+            self.stats["computed"] += len(stale)
+            if not await self._write_back(db, user_id, generation, stale, values, now):
+                # Invalidated while we were loading: serve, but don't persist or cache
+                self.stats["discarded"] += 1
+                return values
+
+        merged = dict(cached["value"]) if cached is not None else {}
+        merged.update(values)
+        self._cache.set(user_id, {"t": time.time(), "ttl": self.cache_ttl, "value": merged})
+        return values
+
+    async def _write_back(
+        self, db, user_id: str, generation: Optional[int], names: List[str], values: Dict[str, Any], now: datetime
+    ) -> bool:
+        """Store recomputed groups unless the document was invalidated since it was read"""
+        try:
+            result = await db[FEATURE_COLLECTION].update_one(
+                # $exists, not gen: None — an upsert would copy gen: null into the new document
+                {"user_id": user_id, "gen": generation if generation is not None else {"$exists": False}},
+                {"$set": {
+                    f"groups.{name}": {
+                        "v": self.groups[name].version,
+                        "at": now.isoformat(),
+                        "value": values[name],
+                    }
+                    for name in names
+                }},
+                # A missing document has no gen yet; the unique user_id index
+                # rejects the insert if an invalidation created it meanwhile
+                upsert=generation is None
+            )
+        except DuplicateKeyError:
+            return False
+        return bool(result.matched_count or result.upserted_id is not None)
+
+    @staticmethod
+    def _is_fresh(group: FeatureGroup, entry: Dict[str, Any], now: datetime) -> bool:
+        if entry.get("v") != group.version:
+            return False
+        if group.ttl_seconds is None:
+            return True
+        try:
+            computed_at = datetime.fromisoformat(entry["at"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return (now - computed_at).total_seconds() < group.ttl_seconds
+
+    # ========================================
+    # WRITE
+    # ========================================
+
+    def update_op(self, user_id: str, group: str, update: Dict[str, Dict[str, Any]]) -> UpdateOne:
+        """
+        Incremental update of one group's value as a bulk-writable op.
+
+        Paths in ``update`` are relative to the group value. The op only
+        matches a group stored at the current version; otherwise it is a
+        no-op and the group is rebuilt on the next read.
+        """
+        prefix = f"groups.{group}.value."
+        scoped = {
+            op: {prefix + path: value for path, value in fields.items()}
+            for op, fields in update.items()
+        }
+        self._cache.discard([user_id])
+        return UpdateOne(
+            {"user_id": user_id, f"groups.{group}.v": self.groups[group].version},
+            scoped
+        )
+
+    async def invalidate(self, user_id: str, *groups: str) -> None:
+        """Drop groups whose source changed; they are recomputed on the next read"""
+        self._cache.discard([user_id])
+        self.stats["invalidations"] += 1
+        try:
+            db = await get_database()
+            await db[FEATURE_COLLECTION].update_one(
+                {"user_id": user_id},
+                {"$unset": {f"groups.{name}": "" for name in groups}, "$inc": {"gen": 1}},
+                upsert=True
+            )
+        except Exception as e:
+            # A missed invalidation is bounded by the group's TTL
+            logger.warning(f"Feature invalidation failed for {user_id} ({', '.join(groups)}): {e}")
+
+    async def drop_stale_versions(self) -> int:
+        """Remove stored groups computed by an older version of their loader"""
+        db = await get_database()
+        removed = 0
+        for name, group in self.groups.items():
+            result = await db[FEATURE_COLLECTION].update_many(
+                {f"groups.{name}": {"$exists": True}, f"groups.{name}.v": {"$ne": group.version}},
+                {"$unset": {f"groups.{name}": ""}}
+            )
+            removed += result.modified_count
+        if removed:
+            logger.info(f"🧹 Removed {removed} outdated feature groups")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "groups": {name: {"version": g.version, "ttl_seconds": g.ttl_seconds} for name, g in self.groups.items()},
+            "cache": self._cache.get_stats(),
+        }
+
+
+feature_store = FeatureStore()
+
+
+def _collect_prometheus():
+    cache = feature_store._cache.stats
+    lines = counter(
+        "feature_store_operations",
+        "User feature store lookups, recomputed groups, discarded write-backs and invalidations on this worker",
+        (({"op": op}, n) for op, n in feature_store.stats.items())
+    )
+    lines += counter(
+        "feature_store_cache_lookups",
+        "User feature store L1 lookups by result",
+        [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]
+    )
+    return lines
+
+
+register_collector(_collect_prometheus)
@@ -0,0 +1,276 @@
+"""
+Leaderboard Service
+===================
+Materialised rankings in Redis sorted sets (FakeRedis in development).
+
+Boards:
+- ``xp``          users.xp_total (active users)
+- ``trust``       users.trust_score (active users)
+- ``monthly_rp``  user_stats.monthly_rp
+
+Boards are bulk-loaded from MongoDB once (startup, or on demand) and then
+kept current by the write paths in ``services.xp_service``. Ranks use
+competition ranking (ties share a rank), the same as counting
+``{field: {"$gt": score}}`` in Mongo, but cost O(log n).
+
+Every read returns ``None`` when a board has not been built or Redis is
+unreachable; callers fall back to sorting in Mongo.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from utils.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = "leaderboard:"
+META_KEY = f"{KEY_PREFIX}meta"  # board -> built_at
+REBUILD_LOCK_SECONDS = 300
+ARCHIVE_TTL_SECONDS = 90 * 24 * 3600
+REBUILD_BATCH = 1000
+
+
+@dataclass(frozen=True)
+class BoardSpec:
+    collection: str
+    id_field: str
+    score_field: str
+    default: float = 0.0
+    query: Dict[str, Any] = field(default_factory=dict, hash=False)
+
+
+BOARDS: Dict[str, BoardSpec] = {
+    "xp": BoardSpec("users", "id", "xp_total", 0, {"is_active": True}),
+    "trust": BoardSpec("users", "id", "trust_score", 500.0, {"is_active": True}),
+    "monthly_rp": BoardSpec("user_stats", "user_id", "monthly_rp", 0),
+}
+
+
+def board_key(board: str) -> str:
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard: {board}")
+    return f"{KEY_PREFIX}{board}"
+
+
+class LeaderboardService:
+    """Sorted-set leaderboards for XP, trust and monthly RP"""
+
+    # ========================================
+    # WRITES
+    # ========================================
+
+    async def set_score(self, board: str, user_id: str, score: float) -> None:
+        """Set a user's absolute score (xp / trust)"""
+        try:
+            client = await get_redis()
+            await client.zadd(board_key(board), {user_id: score})
+        except Exception as e:
+            logger.error(f"Leaderboard update error ({board}): {e}")
+
+    async def set_scores(self, board: str, scores: Dict[str, float]) -> None:
+        """Set many users' absolute scores in one ZADD"""
+        if not scores:
+            return
+        try:
+            client = await get_redis()
+            await client.zadd(board_key(board), scores)
+        except Exception as e:
+            logger.error(f"Leaderboard update error ({board}): {e}")
+
+    async def incr_score(self, board: str, user_id: str, amount: float) -> None:
+        """Add to a user's score (monthly_rp)"""
+        try:
+            client = await get_redis()
+            await client.zincrby(board_key(board), amount, user_id)
+        except Exception as e:
+            logger.error(f"Leaderboard update error ({board}): {e}")
+
+    async def add_user(self, user: Dict[str, Any]) -> None:
+        """Place a newly registered user on the user-backed boards"""
+        for board, spec in BOARDS.items():
+            if spec.collection == "users" and user.get("is_active", True):
+                await self.set_score(board, user["id"], user.get(spec.score_field, spec.default))
+
+    # ========================================
+    # READS
+    # ========================================
+
+    async def top(self, board: str, offset: int = 0, limit: int = 10) -> Optional[List[Tuple[str, float, int]]]:
+        """[(user_id, score, rank)] ordered by score, or None if unavailable"""
+        try:
+            client = await get_redis()
+            if not await client.hexists(META_KEY, board):
+                return None
+            rows = await client.zrevrange(board_key(board), offset, offset + limit - 1, withscores=True)
+            return await self._with_ranks(client, board, rows)
+        except Exception as e:
+            logger.error(f"Leaderboard read error ({board}): {e}")
+            return None
+
+    async def rank(self, board: str, user_id: str, score: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        {"rank", "score", "total"} for a user, or None if unavailable.
+
+        Users missing from the board (e.g. inactive) are ranked by `score`
+        against it without being counted in the total.
+        """
+        try:
+            client = await get_redis()
+            if not await client.hexists(META_KEY, board):
+                return None
+            key = board_key(board)
+            on_board = await client.zscore(key, user_id)
+            if on_board is not None:
+                score = on_board
+            elif score is None:
+                score = BOARDS[board].default
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zcount(key, f"({score}", "+inf")
+                pipe.zcard(key)
+                above, total = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Leaderboard read error ({board}): {e}")
+            return None
+        return {"rank": above + 1, "score": score, "total": total}
+
+    async def around(self, board: str, user_id: str, radius: int = 5) -> Optional[List[Tuple[str, float, int]]]:
+        """Up to `radius` entries either side of a user; [] if they are not ranked"""
+        try:
+            client = await get_redis()
+            if not await client.hexists(META_KEY, board):
+                return None
+            key = board_key(board)
+            position = await client.zrevrank(key, user_id)
+            if position is None:
+                return []
+            start = max(0, position - radius)
+            rows = await client.zrevrange(key, start, position + radius, withscores=True)
+            return await self._with_ranks(client, board, rows)
+        except Exception as e:
+            logger.error(f"Leaderboard read error ({board}): {e}")
+            return None
+
+    async def total(self, board: str) -> Optional[int]:
+        try:
+            client = await get_redis()
+            if not await client.hexists(META_KEY, board):
+                return None
+            return await client.zcard(board_key(board))
+        except Exception as e:
+            logger.error(f"Leaderboard read error ({board}): {e}")
+            return None
+
+    @staticmethod
+    async def _with_ranks(client, board: str, rows: List[Tuple[str, float]]) -> List[Tuple[str, float, int]]:
+        """Attach competition ranks; one ZCOUNT per distinct score in the page"""
+        key = board_key(board)
+        scores = list(dict.fromkeys(score for _, score in rows))
+        if not scores:
+            return []
+        async with client.pipeline(transaction=False) as pipe:
+            for score in scores:
+                pipe.zcount(key, f"({score}", "+inf")
+            above = dict(zip(scores, await pipe.execute()))
+        return [(user_id, score, above[score] + 1) for user_id, score in rows]
+
+    # ========================================
+    # MONTHLY RESET
+    # ========================================
+
+    async def reset_monthly(self, month: str, limit: int = 10) -> Optional[List[Tuple[str, float, int]]]:
+        """
+        Archive and clear the monthly_rp board in one MULTI/EXEC.
+
+        RP earned after the reset lands on a fresh board and is never
+        attributed to the closed month. Returns the archived top `limit`,
+        or None if the board is unavailable.
+        """
+        key = board_key("monthly_rp")
+        archive_key = f"{key}:{month}"
+        try:
+            client = await get_redis()
+            if not await client.hexists(META_KEY, "monthly_rp"):
+                return None
+            async with client.pipeline(transaction=True) as pipe:
+                # ZUNIONSTORE copies (or empties) without erroring on a missing key
+                pipe.zunionstore(archive_key, [key])
+                pipe.delete(key)
+                pipe.expire(archive_key, ARCHIVE_TTL_SECONDS)
+                await pipe.execute()
+            rows = await client.zrevrange(archive_key, 0, limit - 1, withscores=True)
+        except Exception as e:
+            logger.error(f"Leaderboard monthly reset error: {e}")
+            return None
+        # Positional: each of the top `limit` gets its own badge
+        return [(user_id, score, rank) for rank, (user_id, score) in enumerate(rows, start=1)]
+
+    # ========================================
+    # BUILD
+    # ========================================
+
+    async def rebuild(self, db, board: str) -> int:
+        """
+        Reload a board from MongoDB into a scratch key, then RENAME it into
+        place so readers never see a half-built board.
+        """
+        spec = BOARDS[board]
+        key = board_key(board)
+        scratch_key = f"{key}:rebuild"
+        client = await get_redis()
+        await client.delete(scratch_key)
+
+        loaded = 0
+        batch: Dict[str, float] = {}
+        cursor = db[spec.collection].find(
+            spec.query, {"_id": 0, spec.id_field: 1, spec.score_field: 1}
+        )
+        async for doc in cursor:
+            member = doc.get(spec.id_field)
+            if not member:
+                continue
+            batch[member] = doc.get(spec.score_field) or spec.default
+            if len(batch) >= REBUILD_BATCH:
+                await client.zadd(scratch_key, batch)
+                loaded += len(batch)
+                batch = {}
+        if batch:
+            await client.zadd(scratch_key, batch)
+            loaded += len(batch)
+
+        async with client.pipeline(transaction=True) as pipe:
+            if loaded:
+                pipe.rename(scratch_key, key)
+            else:
+                pipe.delete(key)
+            pipe.hset(META_KEY, board, datetime.now(timezone.utc).isoformat())
+            await pipe.execute()
+        return loaded
+
+    async def ensure_built(self, db, force: bool = False) -> Dict[str, int]:
+        """
+        Build boards that have never been built (all of them if `force`).
+
+        A short Redis lock keeps concurrent workers from rebuilding at once.
+        """
+        client = await get_redis()
+        lock_key = f"{KEY_PREFIX}rebuild:lock"
+        if not await client.set(lock_key, "1", nx=True, ex=REBUILD_LOCK_SECONDS):
+            return {}
+        report = {}
+        try:
+            built = await client.hgetall(META_KEY)
+            for board in BOARDS:
+                if force or board not in built:
+                    report[board] = await self.rebuild(db, board)
+        finally:
+            await client.delete(lock_key)
+        if report:
+            logger.info(f"🏆 Leaderboards built: {report}")
+        return report
+
+
+leaderboard_service = LeaderboardService()
@@ -12,10 +12,13 @@ Key Formulas:
 """
 
 import math
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Tuple, Any, List
+from typing import Optional, Dict, NamedTuple, Tuple, Any, List
 from enum import Enum
 from pydantic import BaseModel
+import numpy as np
 
 
 # ============================================
@@ -215,7 +218,7 @@ LEGACY_TRAITS = {
 # XP & LEVELING CALCULATIONS - SINGULARITY CURVE
 # ============================================
 
-def calculate_xp_for_level(level: int) -> int:
+def _xp_curve_formula(level: int) -> int:
     """
     Calculate total XP required to reach a specific level.
     SINGULARITY CURVE:
@@ -237,16 +240,27 @@ def calculate_xp_for_level(level: int) -> int:
         return base_40 + additional
     elif level <= 70:
         # Extreme zone
-        base_60 = calculate_xp_for_level(60)
+        base_60 = _xp_curve_formula(60)
         additional = int(500 * ((level - 60) ** GhostConfig.XP_EXPONENT_LATE))
         return base_60 + additional
     else:
         # Achievement wall - XP requirement is same as 70, but needs achievements
-        base_70 = calculate_xp_for_level(70)
+        base_70 = _xp_curve_formula(70)
         # Each level after 70 adds 20% more XP requirement
         multiplier = 1.2 ** (level - 70)
         return int(base_70 * multiplier)
 
+# Total XP to reach each level, index = level (0 and 1 are both 0).
+# The curve is strictly increasing from level 1, so bisect over it finds levels.
+XP_CURVE = array("q", (_xp_curve_formula(level) for level in range(GhostConfig.ABSOLUTE_MAX_LEVEL + 1)))
+
+
+def calculate_xp_for_level(level: int) -> int:
+    """Total XP required to reach a level (table lookup, formula outside it)."""
+    if 0 <= level <= GhostConfig.ABSOLUTE_MAX_LEVEL:
+        return XP_CURVE[level]
+    return _xp_curve_formula(level)
+
 
 def calculate_level_from_xp(total_xp: int, completed_achievements: List[str] = None) -> int:
     """
@@ -258,16 +272,8 @@ def calculate_level_from_xp(total_xp: int, completed_achievements: List[str] = N
     
     completed_achievements = completed_achievements or []
     
-    # Binary search for base level (up to 70)
-    low, high = 1, GhostConfig.XP_WALL_START
-    while low < high:
-        mid = (low + high + 1) // 2
-        if calculate_xp_for_level(mid) <= total_xp:
-            low = mid
-        else:
-            high = mid - 1
-    
-    base_level = min(low, GhostConfig.XP_WALL_START)
+    # Highest level up to 70 whose threshold has been reached
+    base_level = bisect_right(XP_CURVE, total_xp, 1, GhostConfig.XP_WALL_START + 1) - 1
     
     # If at or past level 70, check achievements
     if base_level >= GhostConfig.XP_WALL_START:
@@ -340,6 +346,78 @@ def get_hierarchy(level: int) -> UserHierarchy:
         return UserHierarchy.MONARCH
 
 
+# ============================================
+# BULK (VECTORISED) LEVELING
+# ============================================
+
+_XP_CURVE_ARRAY = np.frombuffer(XP_CURVE, dtype=np.int64)
+_HIERARCHY_BY_LEVEL = np.array([get_hierarchy(level).value for level in range(GhostConfig.ABSOLUTE_MAX_LEVEL + 1)])
+
+
+class LevelProgress(NamedTuple):
+    levels: np.ndarray
+    xp_to_next: np.ndarray
+    progress: np.ndarray
+    hierarchy: np.ndarray
+
+
+def calculate_level_progress_many(xp_totals) -> LevelProgress:
+    """
+    calculate_xp_progress + get_hierarchy over an array of XP totals.
+
+    For bulk recomputation and leaderboard pages. Matches the scalar
+    functions called without achievements (as award_xp does), so levels
+    stop at the XP wall.
+    """
+    xp = np.asarray(xp_totals)
+    
+    # Levels 1..XP_WALL_START: count of reached thresholds (level 1 is 0 XP)
+    wall = GhostConfig.XP_WALL_START
+    levels = np.maximum(np.searchsorted(_XP_CURVE_ARRAY[1:wall + 1], xp, side="right"), 1)
+    
+    xp_current_level = _XP_CURVE_ARRAY[levels]
+    xp_needed = _XP_CURVE_ARRAY[levels + 1] - xp_current_level
+    xp_in_level = xp - xp_current_level
+    progress = xp_in_level / xp_needed * 100
+    
+    # Stuck at 99% in front of an achievement gate
+    gated = (levels >= wall) & np.isin(levels + 1, list(LEVEL_GATE_ACHIEVEMENTS))
+    progress = np.where(gated & (progress > 99), 99.0, progress)
+    
+    return LevelProgress(
+        levels=levels,
+        xp_to_next=np.maximum(0, xp_needed - xp_in_level),
+        progress=np.round(progress, 2),
+        hierarchy=_HIERARCHY_BY_LEVEL[levels],
+    )
+
+
+def calculate_trust_decay_many(trust_scores, days_inactive) -> np.ndarray:
+    """calculate_trust_decay over arrays of trust scores and inactive days"""
+    trust = np.asarray(trust_scores, dtype=np.float64)
+    days = np.asarray(days_inactive)
+    
+    decay_amount = (days - GhostConfig.ENTROPY_START_DAYS) * GhostConfig.TRUST_DAILY_DECAY
+    target = GhostConfig.TRUST_DECAY_TARGET
+    
+    decayed = np.where(
+        trust > target,
+        np.maximum(target, trust - decay_amount),
+        # Recovery is slower
+        np.where(trust < target, np.minimum(target, trust + decay_amount * 0.5), trust)
+    )
+    return np.where(days <= GhostConfig.ENTROPY_START_DAYS, trust, decayed)
+
+
+def get_trust_tier_many(trust_scores) -> Tuple[np.ndarray, np.ndarray]:
+    """get_trust_tier over an array: (tiers, halo_colors)"""
+    trust = np.asarray(trust_scores, dtype=np.float64)
+    conditions = [trust >= 800, trust >= 500, trust >= 400]
+    tiers = np.select(conditions, ["verified", "neutral", "warning"], "danger")
+    colors = np.select(conditions, ["#00FFD4", "rgba(255,255,255,0.4)", "#FF9F43"], "#FF4444")
+    return tiers, colors
+
+
 def get_required_achievements_for_level(target_level: int) -> List[Dict]:
     """Get list of achievements required to reach target level."""
     required = []
@@ -801,6 +801,44 @@ async def check_title_decay(
     return decayed
 
 
+async def run_title_decay_job(db) -> Dict[str, int]:
+    """
+    Sweep users holding decay-type titles through check_title_decay.
+    Only users inactive longer than the shortest decay period are loaded.
+    """
+    decay_titles = {
+        title_id: title_def for title_id, title_def in ALL_TITLES.items()
+        if title_def.get("transfer_logic") == TransferLogic.DECAY
+    }
+    if not decay_titles:
+        return {"checked": 0, "decayed": 0}
+    
+    now = datetime.now(timezone.utc)
+    min_days = min(title_def.get("decay_days", 90) for title_def in decay_titles.values())
+    cutoff = now - timedelta(days=min_days)
+    
+    cursor = db.users.find(
+        {
+            "$or": [{f"titles.{title_id}.is_active": True} for title_id in decay_titles],
+            "$and": [{"$or": [
+                {"last_activity_date": {"$lt": cutoff.isoformat()}},
+                {"last_activity_date": None},
+            ]}],
+        },
+        {"_id": 0, "id": 1, "titles": 1, "last_activity_date": 1}
+    )
+    
+    checked = decayed = 0
+    async for user in cursor:
+        last_activity = user.get("last_activity_date")
+        if isinstance(last_activity, str):
+            last_activity = datetime.fromisoformat(last_activity)
+        decayed += len(await check_title_decay(db, user["id"], user.get("titles", {}), last_activity))
+        checked += 1
+    
+    return {"checked": checked, "decayed": decayed}
+
+
 # ============================================
 # LEGACY TITLE ASSIGNMENT
 # ============================================
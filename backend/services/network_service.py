@@ -17,6 +17,7 @@ from models.network_post import (
     NetworkPost, NetworkPostCreate, NetworkPostUpdate,
     PostStatus, PostCategory, PostComment
 )
+from utils.pagination import apply_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,13 @@ logger = logging.getLogger(__name__)
 class NetworkService:
     """Service for Ghost Network posts"""
     
+    # Feed sort specs; trailing id keeps the tuple unique for keyset cursors
+    FEED_SORTS = {
+        "hot": [("hot_score", -1), ("created_at", -1), ("id", -1)],
+        "new": [("created_at", -1), ("id", -1)],
+        "top": [("likes", -1), ("created_at", -1), ("id", -1)]
+    }
+    
     def __init__(self, db):
         self.db = db
         self.posts_collection = db["network_posts"]
@@ -320,25 +328,24 @@ class NetworkService:
         category: Optional[PostCategory] = None,
         page: int = 1,
         limit: int = 20,
-        sort: str = "hot"  # hot, new, top
+        sort: str = "hot",  # hot, new, top
+        after: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Get feed of posts"""
+        """Get feed of posts. `after` is a keyset cursor that replaces `page`."""
         
         query = {"status": PostStatus.PUBLISHED.value}
         
         if category:
             query["category"] = category.value
         
-        # Sort options
-        sort_options = {
-            "hot": [("hot_score", -1), ("created_at", -1)],
-            "new": [("created_at", -1)],
-            "top": [("likes", -1), ("created_at", -1)]
-        }
+        sort_spec = self.feed_sort(sort)
         
-        cursor = self.posts_collection.find(query)
-        cursor = cursor.sort(sort_options.get(sort, sort_options["hot"]))
-        cursor = cursor.skip((page - 1) * limit).limit(limit)
+        if after:
+            query = apply_cursor(query, sort_spec, after)
+            cursor = self.posts_collection.find(query).sort(sort_spec).limit(limit)
+        else:
+            cursor = self.posts_collection.find(query).sort(sort_spec)
+            cursor = cursor.skip((page - 1) * limit).limit(limit)
         
         posts = await cursor.to_list(length=limit)
         
@@ -348,6 +355,10 @@ class NetworkService:
         
         return posts
     
+    def feed_sort(self, sort: str) -> List[Tuple[str, int]]:
+        """Resolve a feed sort name to its sort spec (defaults to hot)"""
+        return self.FEED_SORTS.get(sort, self.FEED_SORTS["hot"])
+    
     async def get_user_posts(
         self,
         user_id: str,
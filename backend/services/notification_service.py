@@ -120,14 +120,93 @@ class NotificationService:
         logger.info(f"✅ In-app notification created for {user_id}")
         return notification
     
+    async def send_notification_many(self, notifications: List[Dict]) -> int:
+        """
+        Send a batch of notifications (e.g. one price change fanning out to
+        every watcher).
+        
+        Each item takes send_notification's keyword arguments. In-app copies
+        are written with one insert_many, and recipients and their push
+        subscriptions are loaded with one $in query each. Returns the number
+        of notifications delivered to existing users.
+        """
+        if not notifications:
+            return 0
+        
+        now = datetime.now(timezone.utc).isoformat()
+        await db.notifications.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": item["user_id"],
+                "type": item["notification_type"],
+                "title": item["title"],
+                "message": item["message"],
+                "link": item.get("link"),
+                "metadata": item.get("metadata") or {},
+                "is_read": False,
+                "created_at": now
+            }
+            for item in notifications
+        ], ordered=False)
+        
+        user_ids = list({item["user_id"] for item in notifications})
+        users = {
+            user["id"]: user
+            async for user in db.users.find(
+                {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "email": 1, "phone": 1}
+            )
+        }
+        
+        push_enabled = bool(self.vapid_private_key and self.vapid_public_key)
+        subscriptions: Dict[str, List[Dict]] = {}
+        if push_enabled:
+            async for sub in db.push_subscriptions.find({"user_id": {"$in": user_ids}}):
+                subscriptions.setdefault(sub["user_id"], []).append(sub)
+        
+        sent = 0
+        for item in notifications:
+            user = users.get(item["user_id"])
+            if not user:
+                logger.error(f"User {item['user_id']} not found")
+                continue
+            methods = item.get("methods") or {"push": True, "email": False, "sms": False}
+            
+            if methods.get("push") and push_enabled:
+                await self.send_push_notification(
+                    user_id=user["id"],
+                    title=item["title"],
+                    message=item["message"],
+                    link=item.get("link"),
+                    subscriptions=subscriptions.get(user["id"], [])
+                )
+            
+            if methods.get("email"):
+                await self.send_email_notification(
+                    email=user.get("email"),
+                    title=item["title"],
+                    message=item["message"],
+                    link=item.get("link")
+                )
+            
+            if methods.get("sms"):
+                await self.send_sms_notification(
+                    phone=user.get("phone"),
+                    message=f"{item['title']}: {item['message']}"
+                )
+            sent += 1
+        
+        logger.info(f"Batch notifications sent: {sent}/{len(notifications)}")
+        return sent
+    
     async def send_push_notification(
         self,
         user_id: str,
         title: str,
         message: str,
-        link: Optional[str] = None
+        link: Optional[str] = None,
+        subscriptions: Optional[List[Dict]] = None
     ) -> bool:
-        """Send Web Push notification"""
+        """Send Web Push notification (`subscriptions` if already loaded)"""
         
         # Check if VAPID keys are configured
         if not self.vapid_private_key or not self.vapid_public_key:
@@ -135,9 +214,10 @@ class NotificationService:
             return False
         
         # Get user's push subscriptions
-        subscriptions = await db.push_subscriptions.find({
-            "user_id": user_id
-        }).to_list(None)
+        if subscriptions is None:
+            subscriptions = await db.push_subscriptions.find({
+                "user_id": user_id
+            }).to_list(None)
         
         if not subscriptions:
             logger.info(f"No push subscriptions found for user {user_id}")
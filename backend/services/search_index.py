@@ -0,0 +1,364 @@
+"""
+Product Search Index
+====================
+In-process inverted index over the ``products`` collection.
+
+Replaces unanchored ``$regex`` scans for autocomplete and product search:
+- Cyrillic + Latin normalisation (casefold, ё→е, diacritics, transliteration)
+- Exact, prefix and trigram (infix) term matching
+- BM25 ranking with field weights, ``rating`` as tiebreaker
+
+Each worker holds its own copy, built and kept current across workers by
+``services.catalog_sync`` from the product create/update/delete routes.
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+import math
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# NORMALISATION
+# ========================================
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n",
+    "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f",
+    "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y",
+    "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    """Casefold a single character and strip Latin diacritics (é → e)"""
+    ch = ch.casefold()
+    if ch == "ё":
+        return "е"
+    if "Ѐ" <= ch <= "ӿ":
+        # Keep Cyrillic letters intact (NFKD would turn й into и)
+        return ch
+    decomposed = unicodedata.normalize("NFKD", ch)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_text(text: str) -> str:
+    """Normalise text for indexing and querying"""
+    return "".join(_fold_char(ch) for ch in text)
+
+
+def transliterate(token: str) -> str:
+    """Transliterate a Cyrillic token to Latin (видеокарта → videokarta)"""
+    return "".join(_CYRILLIC_TO_LATIN.get(ch, ch) for ch in token)
+
+
+def _has_cyrillic(token: str) -> bool:
+    return any("а" <= ch <= "я" for ch in token)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalised tokens, adding Latin forms of Cyrillic tokens"""
+    if not text:
+        return []
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        tokens.append(token)
+        if _has_cyrillic(token):
+            latin = transliterate(token)
+            if latin and latin != token:
+                tokens.append(latin)
+    return tokens
+
+
+def _trigrams(term: str) -> Set[str]:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+# ========================================
+# INDEX
+# ========================================
+
+@dataclass
+class IndexedProduct:
+    """Per-product entry held by the index"""
+    id: str
+    terms: Dict[str, float]
+    length: float
+    status: str
+    rating: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+class ProductSearchIndex:
+    """Inverted index with prefix/trigram postings and BM25 ranking"""
+
+    # Field weights (name/title matter more than description)
+    FIELD_WEIGHTS = {"name": 3.0, "title": 3.0, "tags": 2.0, "description": 1.0}
+
+    # Score multipliers for how a query token matched an indexed term
+    EXACT_MATCH = 1.0
+    PREFIX_MATCH = 0.8
+    INFIX_MATCH = 0.5
+
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    MAX_PREFIX_LENGTH = 20
+    MAX_EXPANSIONS = 64
+
+    def __init__(self):
+        self._docs: Dict[str, IndexedProduct] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._total_length = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ----------------------------------------
+    # Building
+    # ----------------------------------------
+
+    async def build(self, db) -> int:
+        """(Re)build the index from the ``products`` collection"""
+        started = time.perf_counter()
+        fresh = ProductSearchIndex()
+
+        cursor = db.products.find(
+            {"is_active": {"$ne": False}},
+            {
+                "_id": 0, "id": 1, "name": 1, "title": 1, "description": 1,
+                "tags": 1, "status": 1, "is_active": 1, "rating": 1,
+                "price": 1, "images": 1, "category_id": 1,
+            }
+        )
+        async for product in cursor:
+            fresh.upsert(product)
+
+        # Swap in one synchronous step so readers never see a half-built index
+        self._docs = fresh._docs
+        self._postings = fresh._postings
+        self._prefixes = fresh._prefixes
+        self._trigrams = fresh._trigrams
+        self._total_length = fresh._total_length
+        self.ready = True
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"🔎 Product search index built: {len(self._docs)} products, "
+            f"{len(self._postings)} terms in {elapsed_ms:.1f}ms"
+        )
+        return len(self._docs)
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        """Add or replace a product. Inactive products are removed."""
+        product_id = product.get("id")
+        if not product_id:
+            return
+
+        self.remove(product_id)
+        if product.get("is_active", True) is False:
+            return
+
+        terms: Dict[str, float] = {}
+        for field_name, weight in self.FIELD_WEIGHTS.items():
+            value = product.get(field_name)
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            for token in tokenize(value):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        images = product.get("images") or []
+        entry = IndexedProduct(
+            id=product_id,
+            terms=terms,
+            length=sum(terms.values()),
+            status=product.get("status", "pending"),
+            rating=float(product.get("rating") or 0),
+            payload={
+                "id": product_id,
+                "name": product.get("name") or product.get("title", ""),
+                "price": product.get("price"),
+                "image": images[0] if images else None,
+                "category": product.get("category_id", ""),
+                "rating": product.get("rating", 0),
+            }
+        )
+
+        self._docs[product_id] = entry
+        self._total_length += entry.length
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._register_term(term)
+            postings[product_id] = tf
+
+    def remove(self, product_id: str) -> None:
+        """Drop a product from the index (no-op if absent)"""
+        entry = self._docs.pop(product_id, None)
+        if entry is None:
+            return
+
+        self._total_length -= entry.length
+        for term in entry.terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._unregister_term(term)
+
+    def _register_term(self, term: str) -> None:
+        for i in range(1, min(len(term), self.MAX_PREFIX_LENGTH) + 1):
+            self._prefixes.setdefault(term[:i], set()).add(term)
+        for gram in _trigrams(term):
+            self._trigrams.setdefault(gram, set()).add(term)
+
+    def _unregister_term(self, term: str) -> None:
+        for i in range(1, min(len(term), self.MAX_PREFIX_LENGTH) + 1):
+            bucket = self._prefixes.get(term[:i])
+            if bucket is not None:
+                bucket.discard(term)
+                if not bucket:
+                    del self._prefixes[term[:i]]
+        for gram in _trigrams(term):
+            bucket = self._trigrams.get(gram)
+            if bucket is not None:
+                bucket.discard(term)
+                if not bucket:
+                    del self._trigrams[gram]
+
+    # ----------------------------------------
+    # Querying
+    # ----------------------------------------
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed terms matching a query token, with their match weight"""
+        matches: Dict[str, float] = {}
+
+        if token in self._postings:
+            matches[token] = self.EXACT_MATCH
+
+        prefix_terms = self._prefixes.get(token[:self.MAX_PREFIX_LENGTH], ())
+        for term in prefix_terms:
+            if term.startswith(token):
+                matches.setdefault(term, self.PREFIX_MATCH)
+
+        if len(token) >= 3:
+            grams = sorted(_trigrams(token), key=lambda g: len(self._trigrams.get(g, ())))
+            candidates: Optional[Set[str]] = None
+            for gram in grams:
+                bucket = self._trigrams.get(gram)
+                if not bucket:
+                    candidates = set()
+                    break
+                candidates = set(bucket) if candidates is None else candidates & bucket
+                if not candidates:
+                    break
+            for term in candidates or ():
+                if token in term:
+                    matches.setdefault(term, self.INFIX_MATCH)
+
+        if len(matches) > self.MAX_EXPANSIONS:
+            ranked = sorted(matches.items(), key=lambda m: (-m[1], len(m[0])))
+            return ranked[:self.MAX_EXPANSIONS]
+        return list(matches.items())
+
+    def _bm25(self, term: str, tf: float, doc_length: float) -> float:
+        n_docs = len(self._docs)
+        df = len(self._postings[term])
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        avg_length = self._total_length / n_docs if n_docs else 1.0
+        norm = self.K1 * (1 - self.B + self.B * doc_length / (avg_length or 1.0))
+        return idf * tf * (self.K1 + 1) / (tf + norm)
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        status: Optional[str] = "approved"
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank products matching every query token.
+
+        Returns (product_id, score) pairs ordered by score, then rating.
+        ``status=None`` disables the status filter.
+        """
+        tokens = []
+        for token in _TOKEN_RE.findall(normalize_text(query)):
+            # Match either the Cyrillic form or its transliteration
+            variants = [token]
+            if _has_cyrillic(token):
+                variants.append(transliterate(token))
+            tokens.append(variants)
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for variants in tokens:
+            token_scores: Dict[str, float] = {}
+            for variant in variants:
+                for term, match_weight in self._expand(variant):
+                    for product_id, tf in self._postings[term].items():
+                        entry = self._docs[product_id]
+                        if status is not None and entry.status != status:
+                            continue
+                        score = match_weight * self._bm25(term, tf, entry.length)
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    pid: score + token_scores[pid]
+                    for pid, score in scores.items()
+                    if pid in token_scores
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], -self._docs[item[0]].rating)
+        )
+        return ranked[:limit] if limit else ranked
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Autocomplete payloads for approved products"""
+        return [
+            dict(self._docs[product_id].payload)
+            for product_id, _ in self.search(query, limit=limit)
+        ]
+
+    def match_ids(self, query: str, status: Optional[str] = None) -> List[str]:
+        """All product ids matching the query, best first"""
+        return [product_id for product_id, _ in self.search(query, status=status)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "products": len(self._docs),
+            "terms": len(self._postings),
+            "prefixes": len(self._prefixes),
+            "trigrams": len(self._trigrams),
+        }
+
+
+# Global index instance
+product_search_index = ProductSearchIndex()
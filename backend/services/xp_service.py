@@ -6,8 +6,15 @@ Integrates with database and applies all anti-abuse protections.
 """
 
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Tuple, Any
+from typing import Optional, Dict, List, NamedTuple, Tuple, Any
+import logging
+import time
+
+import numpy as np
+from pymongo import InsertOne, UpdateOne
 from database import get_database
+from services.leaderboard_service import leaderboard_service
+from utils.leases import Lease
 
 from services.leveling_system import (
     GhostConfig,
@@ -22,8 +29,9 @@ from services.leveling_system import (
     calculate_xp_progress,
     get_hierarchy,
     calculate_trust_change,
-    calculate_trust_decay,
+    calculate_trust_decay_many,
     get_trust_tier,
+    get_trust_tier_many,
     calculate_rp_cap,
     calculate_vote_weight,
     check_rate_limit,
@@ -35,6 +43,16 @@ from services.leveling_system import (
     calculate_radar_stats,
 )
 
+logger = logging.getLogger(__name__)
+
+
+class XPEvent(NamedTuple):
+    """One XP award for award_xp_many; plain (user_id, action_type, amount) tuples work too"""
+    user_id: str
+    action_type: str
+    custom_amount: Optional[int] = None
+    metadata: Optional[Dict] = None
+
 
 async def award_xp(
     user_id: str,
@@ -57,23 +75,127 @@ async def award_xp(
         "daily_remaining": int or None
     }
     """
+    results = await award_xp_many([XPEvent(user_id, action_type, custom_amount, metadata)])
+    return results[0]
+
+
+async def award_xp_many(events: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Award XP for many events at once.
+    
+    Events are applied in order against in-memory user state, so rate
+    limits, daily caps and diminishing returns behave exactly as a loop of
+    award_xp calls would. Two finds load the users and their stats, and one
+    bulk_write per collection persists the result, including level-up RP.
+    
+    Returns one award_xp-style result per event, in order.
+    """
+    events = [XPEvent(*event) for event in events]
+    if not events:
+        return []
+    
     db = await get_database()
     
-    # Get user
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        return {"success": False, "reason": "user_not_found", "xp_awarded": 0}
+    user_ids = list(dict.fromkeys(event.user_id for event in events))
+    users = {
+        user["id"]: user
+        for user in await db.users.find({"id": {"$in": user_ids}}).to_list(length=len(user_ids))
+    }
+    stats = {
+        doc["user_id"]: doc
+        for doc in await db.user_stats.find({"user_id": {"$in": list(users)}}).to_list(length=len(users))
+    }
+    
+    now = datetime.now(timezone.utc)
+    user_sets: Dict[str, Dict[str, Any]] = {}
+    stats_sets: Dict[str, Dict[str, Any]] = {}
+    transactions: List[Dict[str, Any]] = []
+    results = []
+    
+    for event in events:
+        user = users.get(event.user_id)
+        if not user:
+            results.append({"success": False, "reason": "user_not_found", "xp_awarded": 0})
+            continue
+        
+        result, level_up_rp = _apply_xp_award(
+            user,
+            stats.setdefault(event.user_id, {}),
+            event,
+            now,
+            user_sets.setdefault(event.user_id, {}),
+            stats_sets.setdefault(event.user_id, {}),
+            transactions
+        )
+        results.append(result)
+        
+        # Award RP from level up
+        for amount in level_up_rp:
+            _apply_rp_award(
+                user,
+                amount,
+                "level_up",
+                None,
+                now,
+                user_sets[event.user_id],
+                stats_sets[event.user_id],
+                transactions
+            )
+    
+    if any(user_sets.values()):
+        await db.users.bulk_write(
+            [UpdateOne({"id": uid}, {"$set": fields}) for uid, fields in user_sets.items() if fields],
+            ordered=False
+        )
+    if any(stats_sets.values()):
+        await db.user_stats.bulk_write(
+            [
+                UpdateOne({"user_id": uid}, {"$set": fields}, upsert=True)
+                for uid, fields in stats_sets.items() if fields
+            ],
+            ordered=False
+        )
+    if transactions:
+        await db.xp_transactions.bulk_write([InsertOne(txn) for txn in transactions])
+    
+    awarded = {
+        uid: users[uid]["xp_total"]
+        for uid, fields in user_sets.items()
+        if "xp_total" in fields and users[uid].get("is_active", True)
+    }
+    if awarded:
+        await leaderboard_service.set_scores("xp", awarded)
+    
+    return results
+
+
+def _apply_xp_award(
+    user: Dict[str, Any],
+    user_stats: Dict[str, Any],
+    event: XPEvent,
+    now: datetime,
+    user_set: Dict[str, Any],
+    stats_set: Dict[str, Any],
+    transactions: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], List[int]]:
+    """
+    Apply one award to the in-memory user/user_stats docs.
+    
+    Writes the fields to $set into user_set / stats_set and appends the XP
+    transaction. Returns the award_xp result and any level-up RP amounts.
+    """
+    user_id, action_type, custom_amount, metadata = event
     
     # Parse action type
     try:
         action = ActionType(action_type)
     except ValueError:
-        return {"success": False, "reason": "invalid_action_type", "xp_awarded": 0}
+        return {"success": False, "reason": "invalid_action_type", "xp_awarded": 0}, []
     
     # Get base XP
     base_xp = custom_amount if custom_amount else XP_REWARDS.get(action, 0)
     if base_xp == 0:
-        return {"success": False, "reason": "no_xp_reward", "xp_awarded": 0}
+        return {"success": False, "reason": "no_xp_reward", "xp_awarded": 0}, []
     
     # Check rate limit
     last_xp_time = user.get("last_xp_gain")
@@ -82,21 +204,18 @@ async def award_xp(
     
     is_allowed, reason = check_rate_limit(last_xp_time, action)
     if not is_allowed:
-        return {"success": False, "reason": reason, "xp_awarded": 0}
+        return {"success": False, "reason": reason, "xp_awarded": 0}, []
     
     # Check and reset daily cap if needed
-    now = datetime.now(timezone.utc)
     daily_reset = user.get("daily_xp_reset_date")
     if daily_reset:
         if isinstance(daily_reset, str):
             daily_reset = datetime.fromisoformat(daily_reset)
         if daily_reset.date() < now.date():
-            # Reset daily counters
-            await db.users.update_one(
-                {"id": user_id},
-                {"$set": {"daily_xp_earned": 0, "daily_xp_reset_date": now.isoformat()}}
-            )
-            user["daily_xp_earned"] = 0
+            # Reset daily counters (persisted even if the award fails below)
+            reset = {"daily_xp_earned": 0, "daily_xp_reset_date": now.isoformat()}
+            user.update(reset)
+            user_set.update(reset)
     
     daily_xp = user.get("daily_xp_earned", 0)
     
@@ -109,11 +228,10 @@ async def award_xp(
             "reason": "daily_cap_reached", 
             "xp_awarded": 0,
             "daily_remaining": 0
-        }
+        }, []
     
     # Apply diminishing returns (get action count for today)
-    user_stats = await db.user_stats.find_one({"user_id": user_id})
-    action_counts = user_stats.get("action_counts_today", {}) if user_stats else {}
+    action_counts = user_stats.setdefault("action_counts_today", {})
     action_count = action_counts.get(action_type, 0) + 1
     
     final_xp = apply_diminishing_returns(action_count, actual_xp)
@@ -170,9 +288,11 @@ async def award_xp(
         update_dict["current_streak"] = 1
     
     # Update user
-    await db.users.update_one({"id": user_id}, {"$set": update_dict})
+    user.update(update_dict)
+    user_set.update(update_dict)
     
     # Update user_stats
+    action_counts[action_type] = action_count
     stats_update = {
         "total_xp": new_xp,
         "current_level": new_level,
@@ -183,7 +303,7 @@ async def award_xp(
     }
     
     # Calculate new XP progress
-    _, xp_to_next, progress = calculate_xp_progress(new_xp)
+    _, xp_to_next, progress, _ = calculate_xp_progress(new_xp)
     stats_update["xp_to_next_level"] = xp_to_next
     stats_update["xp_progress_percent"] = progress
     
@@ -199,14 +319,10 @@ async def award_xp(
     if hierarchy == "monarch":
         stats_update["has_direct_line_access"] = True
     
-    await db.user_stats.update_one(
-        {"user_id": user_id},
-        {"$set": stats_update},
-        upsert=True
-    )
+    stats_set.update(stats_update)
     
     # Log XP transaction
-    await db.xp_transactions.insert_one({
+    transactions.append({
         "user_id": user_id,
         "point_type": "xp",
         "amount": final_xp,
@@ -218,13 +334,13 @@ async def award_xp(
     
     # Generate level up reward if applicable
     level_up_reward = None
+    level_up_rp = []
     if level_up:
         level_up_reward = generate_level_up_reward(new_level, user_class)
-        
-        # Award RP from level up
-        for reward in level_up_reward.get("rewards", []):
-            if reward.get("type") == "rp":
-                await award_rp(user_id, reward["amount"], "level_up")
+        level_up_rp = [
+            reward["amount"] for reward in level_up_reward.get("rewards", [])
+            if reward.get("type") == "rp"
+        ]
     
     return {
         "success": True,
@@ -235,6 +351,52 @@ async def award_xp(
         "level_up_reward": level_up_reward,
         "reason": None,
         "daily_remaining": daily_remaining if action in SOCIAL_ACTIONS else None
+    }, level_up_rp
+
+
+def _apply_rp_award(
+    user: Dict[str, Any],
+    amount: int,
+    action: str,
+    metadata: Optional[Dict],
+    now: datetime,
+    user_set: Dict[str, Any],
+    stats_set: Dict[str, Any],
+    transactions: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """In-memory award_rp: same cap rules, writes collected into the $set dicts"""
+    current_rp = user.get("rp_balance", 0)
+    level = user.get("level", 1)
+    trust = user.get("trust_score", 500.0)
+    
+    # Calculate cap
+    rp_cap = calculate_rp_cap(level, trust)
+    
+    # Apply cap
+    new_rp = min(current_rp + amount, rp_cap)
+    actual_awarded = new_rp - current_rp
+    
+    user["rp_balance"] = new_rp
+    user_set["rp_balance"] = new_rp
+    stats_set.update({"rp_balance": new_rp, "rp_cap": rp_cap})
+    
+    if actual_awarded > 0:
+        transactions.append({
+            "user_id": user["id"],
+            "point_type": "rp",
+            "amount": actual_awarded,
+            "action": action,
+            "description": f"RP from {action}",
+            "metadata": metadata,
+            "created_at": now.isoformat()
+        })
+    
+    return {
+        "success": True,
+        "rp_awarded": actual_awarded,
+        "new_balance": new_rp,
+        "rp_cap": rp_cap,
+        "capped": actual_awarded < amount
     }
 
 
@@ -288,6 +450,8 @@ async def update_trust_score(
             "stats_trust": min(100, int(new_trust / 10))
         }}
     )
+    if user.get("is_active", True):
+        await leaderboard_service.set_score("trust", user_id, new_trust)
     
     # Update user_stats
     await db.user_stats.update_one(
@@ -339,48 +503,47 @@ async def award_rp(
     if not user:
         return {"success": False, "reason": "user_not_found"}
     
-    current_rp = user.get("rp_balance", 0)
-    level = user.get("level", 1)
-    trust = user.get("trust_score", 500.0)
-    
-    # Calculate cap
-    rp_cap = calculate_rp_cap(level, trust)
-    
-    # Apply cap
-    new_rp = min(current_rp + amount, rp_cap)
-    actual_awarded = new_rp - current_rp
+    now = datetime.now(timezone.utc)
+    user_set, stats_set, transactions = {}, {}, []
+    result = _apply_rp_award(user, amount, action, metadata, now, user_set, stats_set, transactions)
     
     # Update
-    now = datetime.now(timezone.utc)
     await db.users.update_one(
         {"id": user_id},
-        {"$set": {"rp_balance": new_rp}}
+        {"$set": user_set}
     )
     
     await db.user_stats.update_one(
         {"user_id": user_id},
-        {"$set": {"rp_balance": new_rp, "rp_cap": rp_cap}},
+        {"$set": stats_set},
         upsert=True
     )
     
-    if actual_awarded > 0:
-        await db.xp_transactions.insert_one({
-            "user_id": user_id,
-            "point_type": "rp",
-            "amount": actual_awarded,
-            "action": action,
-            "description": f"RP from {action}",
-            "metadata": metadata,
-            "created_at": now.isoformat()
-        })
+    if transactions:
+        await db.xp_transactions.insert_one(transactions[0])
     
-    return {
-        "success": True,
-        "rp_awarded": actual_awarded,
-        "new_balance": new_rp,
-        "rp_cap": rp_cap,
-        "capped": actual_awarded < amount
-    }
+    return result
+
+
+async def add_monthly_rp(
+    user_id: str,
+    amount: int,
+    counters: Optional[Dict[str, int]] = None,
+    upsert: bool = True
+) -> None:
+    """
+    Add (or with a negative amount, take back) monthly RP.
+    `counters` are extra user_stats fields to $inc in the same update.
+    Mirrors the change onto the monthly_rp leaderboard.
+    """
+    db = await get_database()
+    
+    await db.user_stats.update_one(
+        {"user_id": user_id},
+        {"$inc": {**(counters or {}), "monthly_rp": amount}},
+        upsert=upsert
+    )
+    await leaderboard_service.incr_score("monthly_rp", user_id, amount)
 
 
 async def spend_rp(
@@ -485,54 +648,135 @@ async def select_class(
     }
 
 
-async def run_trust_decay_job():
+TRUST_DECAY_LEASE = "trust_decay"
+TRUST_DECAY_BATCH = 1000
+
+
+async def run_trust_decay_job(batch_size: int = TRUST_DECAY_BATCH) -> Dict[str, Any]:
     """
     Weekly job to decay trust scores for inactive users.
     Should be run by a scheduler (cron/celery).
+    
+    Streams inactive users in `_id` order, `batch_size` at a time, computes
+    decay for the whole chunk in one vectorised pass and writes each chunk
+    with one bulk_write per collection. A lease keeps concurrent workers
+    from running it twice; its checkpoint lets an interrupted run resume
+    from the last chunk with the same cutoff.
     """
     db = await get_database()
     
-    now = datetime.now(timezone.utc)
+    lease = Lease(db, TRUST_DECAY_LEASE, ttl_seconds=300)
+    if not await lease.acquire():
+        logger.info("⏭️ Trust decay already running on another worker")
+        return {"skipped": True, "reason": "lease_held"}
+    
+    # Resume an interrupted run, or start a new one
+    state = lease.state
+    resumed = bool(state) and not state.get("completed")
+    if not resumed:
+        state = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "last_id": None,
+            "processed": 0,
+            "updated": 0,
+            "completed": False,
+        }
+    
+    now = datetime.fromisoformat(state["started_at"])
     week_ago = now - timedelta(days=7)
     
     # Find inactive users
-    inactive_users = await db.users.find({
+    query = {
         "last_activity_date": {"$lt": week_ago.isoformat()},
         "trust_score": {"$ne": 500.0}  # Not already neutral
-    }).to_list(length=10000)
-    
-    updated_count = 0
-    
-    for user in inactive_users:
-        last_activity = user.get("last_activity_date")
-        if isinstance(last_activity, str):
-            last_activity = datetime.fromisoformat(last_activity)
+    }
+    projection = {"_id": 1, "id": 1, "trust_score": 1, "last_activity_date": 1, "is_active": 1}
+    
+    clock = time.perf_counter()
+    processed = updated = 0
+    
+    while True:
+        chunk_query = dict(query)
+        if state["last_id"] is not None:
+            chunk_query["_id"] = {"$gt": state["last_id"]}
+        users = await db.users.find(chunk_query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not users:
+            break
         
-        days_inactive = (now - last_activity).days if last_activity else 30
+        chunk_updated = await _decay_trust_chunk(db, users, now)
+        processed += len(users)
+        updated += chunk_updated
         
-        current_trust = user.get("trust_score", 500.0)
-        new_trust = calculate_trust_decay(current_trust, days_inactive)
+        state = {
+            **state,
+            "last_id": users[-1]["_id"],
+            "processed": state["processed"] + len(users),
+            "updated": state["updated"] + chunk_updated,
+        }
+        if not await lease.renew(state):
+            # Another worker took over; it resumes from our last checkpoint
+            break
         
-        if new_trust != current_trust:
-            tier, halo_color = get_trust_tier(new_trust)
-            
-            await db.users.update_one(
-                {"id": user["id"]},
-                {"$set": {"trust_score": new_trust}}
-            )
-            
-            await db.user_stats.update_one(
-                {"user_id": user["id"]},
-                {"$set": {
-                    "trust_score": new_trust,
-                    "trust_tier": tier,
-                    "trust_halo_color": halo_color
-                }}
-            )
-            
-            updated_count += 1
+        elapsed = time.perf_counter() - clock
+        logger.info(
+            f"🕯️ Trust decay: {state['processed']} processed, {state['updated']} updated "
+            f"({processed / max(elapsed, 1e-9):.0f} users/s)"
+        )
+    
+    elapsed = time.perf_counter() - clock
+    completed = lease.held
+    if completed:
+        state = {**state, "completed": True, "finished_at": datetime.now(timezone.utc).isoformat()}
+        await lease.release(state)
     
-    return {"updated": updated_count, "processed": len(inactive_users)}
+    return {
+        "updated": state["updated"],
+        "processed": state["processed"],
+        "completed": completed,
+        "resumed": resumed,
+        "seconds": round(elapsed, 3),
+        "users_per_second": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+async def _decay_trust_chunk(db, users: List[Dict[str, Any]], now: datetime) -> int:
+    """Decay one chunk of users; returns how many changed"""
+    days_inactive = []
+    for user in users:
+        last_activity = user.get("last_activity_date")
+        if isinstance(last_activity, str):
+            last_activity = datetime.fromisoformat(last_activity)
+        if last_activity and last_activity.tzinfo is None:
+            last_activity = last_activity.replace(tzinfo=timezone.utc)
+        days_inactive.append((now - last_activity).days if last_activity else 30)
+    
+    current = np.array([user.get("trust_score", 500.0) for user in users], dtype=np.float64)
+    decayed = calculate_trust_decay_many(current, days_inactive)
+    changed = np.flatnonzero(decayed != current)
+    if not changed.size:
+        return 0
+    
+    tiers, halo_colors = get_trust_tier_many(decayed[changed])
+    user_ops, stats_ops, board = [], [], {}
+    for i, tier, halo_color in zip(changed.tolist(), tiers.tolist(), halo_colors.tolist()):
+        user = users[i]
+        new_trust = float(decayed[i])
+        user_ops.append(UpdateOne({"_id": user["_id"]}, {"$set": {"trust_score": new_trust}}))
+        stats_ops.append(UpdateOne(
+            {"user_id": user["id"]},
+            {"$set": {
+                "trust_score": new_trust,
+                "trust_tier": tier,
+                "trust_halo_color": halo_color
+            }}
+        ))
+        if user.get("is_active", True):
+            board[user["id"]] = new_trust
+    
+    await db.users.bulk_write(user_ops, ordered=False)
+    await db.user_stats.bulk_write(stats_ops, ordered=False)
+    await leaderboard_service.set_scores("trust", board)
+    return len(user_ops)
 
 
 async def get_user_ghost_profile(user_id: str) -> Optional[Dict[str, Any]]:
@@ -550,7 +794,7 @@ async def get_user_ghost_profile(user_id: str) -> Optional[Dict[str, Any]]:
     # Calculate all metrics
     xp = user.get("xp_total", user.get("experience", 0))
     level = calculate_level_from_xp(xp)
-    _, xp_to_next, progress = calculate_xp_progress(xp)
+    _, xp_to_next, progress, _ = calculate_xp_progress(xp)
     hierarchy = get_hierarchy(level)
     trust = user.get("trust_score", 500.0)
     trust_tier, halo_color = get_trust_tier(trust)
@@ -0,0 +1,54 @@
+"""
+Scheduled Jobs
+==============
+Periodic work registered with tasks.scheduler. Each job runs once per
+cluster per interval, whichever worker takes its lease.
+"""
+
+from database import get_database
+from tasks.price_tracker import track_product_prices
+from tasks.scheduler import Job, JobScheduler
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+async def recalculate_hot_scores():
+    from services.network_service import NetworkService
+
+    await NetworkService(await get_database()).recalculate_hot_scores()
+
+
+async def decay_trust_scores():
+    from services.xp_service import run_trust_decay_job
+
+    await run_trust_decay_job()
+
+
+async def decay_titles():
+    from services.living_legends import run_title_decay_job
+
+    await run_title_decay_job(await get_database())
+
+
+async def drop_stale_feature_groups():
+    from services.feature_store import feature_store
+
+    await feature_store.drop_stale_versions()
+
+
+async def check_abandoned_carts():
+    from glassy_mind.abandoned_cart import abandoned_cart_webhook
+
+    await abandoned_cart_webhook.check_abandoned_carts()
+
+
+def register_jobs(scheduler: JobScheduler) -> None:
+    scheduler.register(Job("price_tracker", track_product_prices, interval_seconds=DAY, timeout_seconds=HOUR))
+    scheduler.register(Job("hot_scores", recalculate_hot_scores, interval_seconds=15 * 60, timeout_seconds=10 * 60))
+    scheduler.register(Job("trust_decay", decay_trust_scores, interval_seconds=7 * DAY, timeout_seconds=2 * HOUR))
+    scheduler.register(Job("title_decay", decay_titles, interval_seconds=DAY, timeout_seconds=HOUR))
+    scheduler.register(Job("feature_versions", drop_stale_feature_groups, interval_seconds=DAY, timeout_seconds=HOUR))
+    scheduler.register(Job(
+        "abandoned_carts", check_abandoned_carts, interval_seconds=5 * 60, timeout_seconds=4 * 60, jitter_seconds=10
+    ))
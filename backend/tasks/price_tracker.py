@@ -1,226 +1,455 @@
-from models.price_history import PriceHistory
-from database import get_database
+"""
+Price Tracking
+==============
+Price history and price-drop notifications, driven by price changes rather
+than by rescanning the catalogue:
+
+- ``routes.product_routes.update_product`` hands every price edit to
+  ``process_price_change`` as a background task
+- ``watch_price_changes`` follows a change stream on ``products`` so writes
+  from outside the API (imports, scripts) are seen within seconds too; it
+  returns at once on deployments without change streams (standalone mongod)
+- ``track_product_prices`` is a daily reconciliation sweep for anything both
+  of those missed
+
+Every path goes through ``record_price``: a conditional upsert on the unique
+``price_history.product_id`` that only matches while the stored latest price
+differs, so exactly one caller records - and notifies about - each change
+however many paths saw it. History is appended with ``$push``/``$slice``
+instead of rewriting the document.
+
+A recorded drop notifies wishlist holders and triggers price alerts; alerts
+keep their effective ``trigger_price`` so matching is one indexed range
+scan, and both fan-outs go through ``send_notification_many``.
+"""
+
+from typing import Optional, Tuple
 from datetime import datetime, timezone
-from utils.logger import logger
 import asyncio
+import os
 import uuid
 
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 
-async def track_product_prices():
+from database import get_database
+from utils.logger import logger
+from utils.cache import invalidate_tags
+
+PRICE_CHANGE_STREAM_ENABLED = os.getenv('PRICE_CHANGE_STREAM', 'true').lower() != 'false'
+
+PRICE_HISTORY_MAX_POINTS = 500     # newest points kept per product
+CHANGE_STREAM_RETRY_SECONDS = 30
+CHANGE_STREAM_UNSUPPORTED = (40573,)   # "only supported on replica sets"
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Product fields the pipeline and notifications read
+PRODUCT_FIELDS = {"_id": 0, "id": 1, "price": 1, "name": 1, "title": 1, "category_id": 1}
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def _latest_price(history: dict) -> Optional[float]:
+    if history.get("last_price") is not None:
+        return history["last_price"]
+    # Documents written before last_price existed
+    prices = history.get("prices") or []
+    return prices[-1]["price"] if prices else None
+
+
+async def record_price(db, product: dict, previous_price: Optional[float] = None) -> Tuple[bool, Optional[float]]:
     """
-    Background task: Track price changes for all products
-    Runs every 6 hours
+    Append the product's current price to its history unless it already is
+    the latest point.
+
+    Returns (recorded, old_price). old_price is the latest point before this
+    one, or `previous_price` when the product had no history yet.
     """
-    logger.info("🏷️ Starting price tracking background task...")
-    
+    price = product["price"]
+    now = datetime.now(timezone.utc)
+    try:
+        before = await db.price_history.find_one_and_update(
+            {"product_id": product["id"], "last_price": {"$ne": price}},
+            {
+                "$push": {"prices": {
+                    "$each": [{"price": price, "timestamp": now.isoformat()}],
+                    "$slice": -PRICE_HISTORY_MAX_POINTS
+                }},
+                "$min": {"lowest_price": price},
+                "$max": {"highest_price": price},
+                "$inc": {"price_sum": price, "price_count": 1},
+                "$set": {"last_price": price, "last_updated": now.isoformat()},
+                "$setOnInsert": {"id": str(uuid.uuid4())},
+            },
+            projection={"_id": 0, "last_price": 1, "prices": {"$slice": -1}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # History exists and already ends at this price
+        return False, price
+
+    if before is None:
+        return True, previous_price
+    old_price = _latest_price(before)
+    return old_price != price, old_price
+
+
+async def process_price_change(product: dict, previous_price: Optional[float] = None) -> bool:
+    """
+    Record a product's current price and, if it dropped, notify wishlists
+    and check price alerts. Returns True if a new price was recorded.
+    """
+    if product.get("price") is None:
+        return False
+    db = await get_database()
+    try:
+        recorded, old_price = await record_price(db, product, previous_price)
+    except Exception as e:
+        logger.error(f"Error recording price for product {product.get('id')}: {e}")
+        return False
+
+    current_price = product["price"]
+    if not recorded or not old_price or old_price == current_price:
+        return recorded
+
+    # Cached list pages holding this product (or sorted by price in its category)
+    await invalidate_tags([
+        f"product:{product['id']}",
+        f"category:{product.get('category_id') or 'any'}"
+    ])
+    logger.info(
+        f"💰 Price change detected: {product.get('name', product.get('title', 'Unknown'))} "
+        f"${old_price:.2f} → ${current_price:.2f}"
+    )
+
+    # If price dropped, notify users with this in wishlist and check alerts
+    if current_price < old_price:
+        await notify_price_drop(product['id'], product.get('name', product.get('title', 'Product')), old_price, current_price)
+        await check_price_alerts_for_product(product, current_price)
+    return True
+
+
+# ============================================================================
+# CHANGE STREAM
+# ============================================================================
+
+_watch_task: Optional[asyncio.Task] = None
+
+
+async def watch_price_changes():
+    """
+    Feed price updates on ``products`` into the pipeline as they happen.
+
+    Runs until cancelled, resuming from the last seen event after errors.
+    Returns when the deployment does not support change streams.
+    """
+    db = await get_database()
+    pipeline = [{"$match": {
+        "operationType": "update",
+        "updateDescription.updatedFields.price": {"$exists": True}
+    }}]
+    resume_token = None
+
     while True:
         try:
-            db = await get_database()
-            
-            # Get all active products
-            products = await db.products.find({"status": "approved"}).to_list(length=None)
-            
-            logger.info(f"📊 Checking prices for {len(products)} products...")
-            
-            price_changes = 0
-            
-            for product in products:
-                try:
-                    # Check if price history exists
-                    history = await db.price_history.find_one({"product_id": product['id']})
-                    
-                    if not history:
-                        # Create new history
-                        hist_obj = PriceHistory(product_id=product['id'])
-                        hist_obj.add_price(product['price'])
-                        
-                        hist_dict = hist_obj.dict()
-                        # Serialize timestamps
-                        hist_dict['last_updated'] = hist_dict['last_updated'].isoformat()
-                        for price in hist_dict['prices']:
-                            price['timestamp'] = price['timestamp'].isoformat()
-                        
-                        await db.price_history.insert_one(hist_dict)
-                    else:
-                        # Check if price changed
-                        last_price = history['prices'][-1]['price'] if history['prices'] else None
-                        current_price = product['price']
-                        
-                        if last_price and last_price != current_price:
-                            # Price changed! Update history
-                            hist_obj = PriceHistory(**history)
-                            hist_obj.add_price(current_price)
-                            
-                            hist_dict = hist_obj.dict()
-                            hist_dict['last_updated'] = hist_dict['last_updated'].isoformat()
-                            for price in hist_dict['prices']:
-                                price['timestamp'] = price['timestamp'].isoformat()
-                            
-                            await db.price_history.update_one(
-                                {"product_id": product['id']},
-                                {"$set": hist_dict}
-                            )
-                            
-                            price_changes += 1
-                            logger.info(
-                                f"💰 Price change detected: {product.get('name', product.get('title', 'Unknown'))} "
-                                f"${last_price:.2f} → ${current_price:.2f}"
-                            )
-                            
-                            # If price dropped, notify users with this in wishlist
-                            if current_price < last_price:
-                                await notify_price_drop(product['id'], product.get('name', product.get('title', 'Product')), last_price, current_price)
-                            
-                            # Check price alerts for this product
-                            if current_price < last_price:
-                                await check_price_alerts_for_product(product, current_price)
-                
-                except Exception as e:
-                    logger.error(f"Error tracking price for product {product.get('id')}: {e}")
-            
-            logger.info(
-                f"✅ Price tracking completed: {len(products)} products checked, "
-                f"{price_changes} price changes detected"
-            )
-            
-        except Exception as e:
-            logger.error(f"❌ Price tracking error: {e}", exc_info=True)
-        
-        # Wait 6 hours
-        await asyncio.sleep(6 * 3600)
+            async with db.products.watch(
+                pipeline, full_document="updateLookup", resume_after=resume_token
+            ) as stream:
+                logger.info("👀 Watching product price changes")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    product = change.get("fullDocument")
+                    if product:
+                        await process_price_change(product)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAM_UNSUPPORTED:
+                logger.info("ℹ️ Change streams unavailable; price tracking relies on the update path and daily sweep")
+                return
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                # Oplog rolled past our token; the daily sweep covers the gap
+                resume_token = None
+            logger.error(f"❌ Price change stream error: {e}")
+        except PyMongoError as e:
+            logger.error(f"❌ Price change stream error: {e}")
+        await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+
+def start_price_watcher() -> None:
+    global _watch_task
+    if PRICE_CHANGE_STREAM_ENABLED and _watch_task is None:
+        _watch_task = asyncio.create_task(watch_price_changes(), name="price_watcher")
+
+
+async def stop_price_watcher() -> None:
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        await asyncio.gather(_watch_task, return_exceptions=True)
+        _watch_task = None
+
+
+# ============================================================================
+# DUPLICATE HISTORIES
+# ============================================================================
 
+async def merge_duplicate_price_histories(db) -> int:
+    """
+    Fold duplicate ``price_history`` documents into one per product.
+
+    The old tracker checked for a history and then inserted one, so two runs
+    could each create a document for the same product. The unique
+    ``product_id`` index can't be built over those; run this before syncing
+    indexes. Points are merged by timestamp and the running stats recomputed
+    from them. Returns the number of documents removed.
+    """
+    info = (await db.price_history.index_information()).get("product_id_1", {})
+    if info.get("unique"):
+        return 0
+
+    groups = db.price_history.aggregate([
+        {"$group": {"_id": "$product_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    removed = 0
+    async for group in groups:
+        docs = await db.price_history.find({"_id": {"$in": group["ids"]}}).sort("_id", 1).to_list(None)
+        points = {}
+        for doc in docs:
+            for point in doc.get("prices") or []:
+                points[(str(point.get("timestamp")), point.get("price"))] = point
+        merged = [points[key] for key in sorted(points)]
+        prices = [point["price"] for point in merged]
+
+        keep, *extra = docs
+        fields = {
+            "prices": merged[-PRICE_HISTORY_MAX_POINTS:],
+            "last_updated": max(str(doc.get("last_updated") or "") for doc in docs) or None,
+        }
+        if prices:
+            fields.update({
+                "last_price": prices[-1],
+                "lowest_price": min(prices),
+                "highest_price": max(prices),
+                "price_sum": sum(prices),
+                "price_count": len(prices),
+            })
+        await db.price_history.update_one({"_id": keep["_id"]}, {"$set": fields})
+        result = await db.price_history.delete_many({"_id": {"$in": [doc["_id"] for doc in extra]}})
+        removed += result.deleted_count
+
+    if removed:
+        logger.warning(f"🧹 Merged {removed} duplicate price histories")
+    return removed
+
+
+# ============================================================================
+# RECONCILIATION SWEEP
+# ============================================================================
+
+async def track_product_prices():
+    """
+    Background task: record prices that changed without passing through the
+    update path or change stream (and start history for new products).
+    Scheduled daily by tasks.jobs
+    """
+    logger.info("🏷️ Starting price reconciliation run...")
+
+    db = await get_database()
+
+    latest = {}
+    async for history in db.price_history.find(
+        {}, {"_id": 0, "product_id": 1, "last_price": 1, "prices": {"$slice": -1}}
+    ):
+        latest[history["product_id"]] = _latest_price(history)
+
+    checked = 0
+    price_changes = 0
+    async for product in db.products.find({"status": "approved"}, PRODUCT_FIELDS):
+        checked += 1
+        if product.get("price") is None or latest.get(product.get("id")) == product["price"]:
+            continue
+        if await process_price_change(product):
+            price_changes += 1
+
+    logger.info(
+        f"✅ Price reconciliation completed: {checked} products checked, "
+        f"{price_changes} prices recorded"
+    )
+
+
+# ============================================================================
+# NOTIFICATIONS
+# ============================================================================
 
 async def notify_price_drop(product_id: str, product_name: str, old_price: float, new_price: float):
     """Notify users when price drops - using NotificationService"""
     try:
         from services.notification_service import notification_service
+        
         db = await get_database()
         
         # Find all users with this product in wishlist
-        users_with_product = await db.users.find({
-            "wishlist": product_id
-        }).to_list(length=None)
+        users_with_product = await db.users.find(
+            {"wishlist": product_id}, {"_id": 0, "id": 1}
+        ).to_list(length=None)
         
         if not users_with_product:
             return
         
         drop_percent = ((old_price - new_price) / old_price) * 100
         
-        for user in users_with_product:
-            await notification_service.send_notification(
-                user_id=user['id'],
-                notification_type='price_drop',
-                title='Price Drop Alert! 🔥',
-                message=f"{product_name} dropped {drop_percent:.0f}% to ${new_price:.2f}",
-                link=f'/product/{product_id}',
-                metadata={
+        sent = await notification_service.send_notification_many([
+            {
+                "user_id": user['id'],
+                "notification_type": 'price_drop',
+                "title": 'Price Drop Alert! 🔥',
+                "message": f"{product_name} dropped {drop_percent:.0f}% to ${new_price:.2f}",
+                "link": f'/product/{product_id}',
+                "metadata": {
                     'product_id': product_id,
                     'old_price': old_price,
                     'new_price': new_price,
                     'drop_percent': drop_percent
                 },
-                methods={"push": True, "email": False, "sms": False}
-            )
+                "methods": {"push": True, "email": False, "sms": False}
+            }
+            for user in users_with_product
+        ])
         
-        logger.info(f"📬 Sent price drop notifications to {len(users_with_product)} users")
+        logger.info(f"📬 Sent price drop notifications to {sent} users")
         
     except Exception as e:
         logger.error(f"Error sending price drop notifications: {e}")
 
 
+# ============================================================================
+# PRICE ALERTS
+# ============================================================================
+
+def alert_trigger_price(
+    target_price: Optional[float],
+    price_drop_percent: Optional[float],
+    original_price: Optional[float]
+) -> Optional[float]:
+    """
+    Highest price at which an alert fires, or None if it never can.
+
+    A target price wins over a drop percentage; a drop of N% from the price
+    at alert time fires at or below original_price * (100 - N) / 100.
+    """
+    if target_price:
+        return target_price
+    if price_drop_percent and original_price and original_price > 0:
+        return original_price * (100 - price_drop_percent) / 100
+    return None
+
+
 async def check_price_alerts_for_product(product: dict, current_price: float):
-    """Check and trigger price alerts for a specific product"""
+    """
+    Trigger every price alert for the product that `current_price` satisfies.
+    
+    Alerts store their threshold as trigger_price, so the match is a single
+    range scan on (product_id, enabled, triggered, trigger_price). Matches
+    are claimed with one update_many and notified as one batch.
+    """
     try:
         db = await get_database()
         
-        # Get all active alerts for this product
         alerts = await db.price_alerts.find({
             "product_id": product['id'],
             "enabled": True,
-            "triggered": False
-        }).to_list(length=None)
+            "triggered": False,
+            "$or": [
+                {"trigger_price": {"$gte": current_price}},
+                # Alerts created before trigger_price existed
+                {"trigger_price": {"$exists": False}}
+            ]
+        }, {"_id": 0}).to_list(length=None)
         
-        if not alerts:
+        alerts = await _backfill_trigger_prices(db, alerts)
+        matched = [alert for alert in alerts if alert["trigger_price"] is not None and current_price <= alert["trigger_price"]]
+        if not matched:
             return
         
-        triggered_count = 0
+        # Claim before notifying; a concurrent run for another price change
+        # only gets the alerts it marked itself
+        claim = str(uuid.uuid4())
+        ids = [alert["id"] for alert in matched]
+        await db.price_alerts.update_many(
+            {"id": {"$in": ids}, "triggered": False},
+            {"$set": {
+                "triggered": True,
+                "triggered_at": datetime.now(timezone.utc).isoformat(),
+                "triggered_price": current_price,
+                "trigger_claim": claim
+            }}
+        )
+        claimed = {
+            alert["id"]
+            async for alert in db.price_alerts.find({"id": {"$in": ids}, "trigger_claim": claim}, {"_id": 0, "id": 1})
+        }
+        
+        from services.notification_service import notification_service
         
-        for alert in alerts:
-            should_trigger = False
-            
-            # Check target price condition
-            if alert.get("target_price"):
-                if current_price <= alert["target_price"]:
-                    should_trigger = True
-            
-            # Check price drop percentage condition
-            elif alert.get("price_drop_percent"):
-                original_price = alert.get("original_price", 0)
-                if original_price > 0:
-                    price_drop = ((original_price - current_price) / original_price) * 100
-                    if price_drop >= alert["price_drop_percent"]:
-                        should_trigger = True
-            
-            if should_trigger:
-                # Send notifications based on user preferences
-                await send_price_alert_notification(alert, product, current_price)
-                
-                # Mark alert as triggered
-                await db.price_alerts.update_one(
-                    {"id": alert["id"]},
-                    {"$set": {
-                        "triggered": True,
-                        "triggered_at": datetime.now(timezone.utc).isoformat(),
-                        "triggered_price": current_price
-                    }}
-                )
-                
-                triggered_count += 1
+        await notification_service.send_notification_many([
+            price_alert_notification(alert, product, current_price)
+            for alert in matched if alert["id"] in claimed
+        ])
         
-        if triggered_count > 0:
-            logger.info(f"🔔 Triggered {triggered_count} price alerts for product {product.get('title', product['id'])}")
+        if claimed:
+            logger.info(f"🔔 Triggered {len(claimed)} price alerts for product {product.get('title', product['id'])}")
         
     except Exception as e:
         logger.error(f"Error checking price alerts: {e}")
 
 
-async def send_price_alert_notification(alert: dict, product: dict, new_price: float):
-    """Send price alert notification via configured methods - using NotificationService"""
-    try:
-        from services.notification_service import notification_service
-        
-        methods = alert.get("notification_methods", {"push": True, "email": False, "sms": False})
-        
-        product_name = product.get('title', product.get('name', 'Product'))
-        original_price = alert.get("original_price", 0)
-        
-        # Calculate savings
-        if original_price > 0:
-            savings = original_price - new_price
-            drop_percent = ((original_price - new_price) / original_price) * 100
-        else:
-            savings = 0
-            drop_percent = 0
-        
-        # Send via NotificationService (handles all channels)
-        await notification_service.send_notification(
-            user_id=alert["user_id"],
-            notification_type='price_alert',
-            title='🔥 Price Drop Alert!',
-            message=f"{product_name} is now ${new_price:.2f}! Save ${savings:.2f} ({drop_percent:.0f}% off)",
-            link=f"/product/{product['id']}",
-            metadata={
-                'product_id': product['id'],
-                'original_price': original_price,
-                'new_price': new_price,
-                'savings': savings,
-                'drop_percent': drop_percent,
-                'alert_id': alert['id']
-            },
-            methods=methods
-        )
-        
-        logger.info(f"📬 Price alert notification sent to user {alert['user_id']}")
-        
-    except Exception as e:
-        logger.error(f"Error sending price alert notification: {e}")
+async def _backfill_trigger_prices(db, alerts: list) -> list:
+    """Compute and save trigger_price for legacy alerts in one bulk write"""
+    updates = []
+    for alert in alerts:
+        if "trigger_price" not in alert:
+            alert["trigger_price"] = alert_trigger_price(
+                alert.get("target_price"), alert.get("price_drop_percent"), alert.get("original_price")
+            )
+            updates.append(UpdateOne({"id": alert["id"]}, {"$set": {"trigger_price": alert["trigger_price"]}}))
+    if updates:
+        await db.price_alerts.bulk_write(updates, ordered=False)
+    return alerts
+
+
+def price_alert_notification(alert: dict, product: dict, new_price: float) -> dict:
+    """send_notification arguments for a triggered price alert"""
+    methods = alert.get("notification_methods", {"push": True, "email": False, "sms": False})
+    
+    product_name = product.get('title', product.get('name', 'Product'))
+    original_price = alert.get("original_price", 0)
+    
+    # Calculate savings
+    if original_price > 0:
+        savings = original_price - new_price
+        drop_percent = ((original_price - new_price) / original_price) * 100
+    else:
+        savings = 0
+        drop_percent = 0
+    
+    return {
+        "user_id": alert["user_id"],
+        "notification_type": 'price_alert',
+        "title": '🔥 Price Drop Alert!',
+        "message": f"{product_name} is now ${new_price:.2f}! Save ${savings:.2f} ({drop_percent:.0f}% off)",
+        "link": f"/product/{product['id']}",
+        "metadata": {
+            'product_id': product['id'],
+            'original_price': original_price,
+            'new_price': new_price,
+            'savings': savings,
+            'drop_percent': drop_percent,
+            'alert_id': alert['id']
+        },
+        "methods": methods
+    }
@@ -0,0 +1,248 @@
+"""
+Background Job Scheduler
+========================
+In-process periodic jobs that run once per cluster, not once per worker.
+
+Every worker runs the same schedule. Before a run, a worker takes the job's
+lease (utils.leases, ``job:<name>``) and checks the last start time stored
+in it; if another worker already ran the job this interval it sleeps until
+the next one is due. The lease TTL covers the job timeout, so a crashed run
+frees the job for another worker once the lease expires.
+
+- jitter: random delay added to every sleep so workers don't stampede
+- timeout: each run is cancelled after ``timeout_seconds``
+- concurrency: at most SCHEDULER_MAX_CONCURRENT jobs run per process
+- history: per-job counters and duration histograms (Prometheus), and the
+  last run of each job cluster-wide in the lease documents
+
+Set SCHEDULER_ENABLED=false on workers that should not run jobs.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import random
+import time
+
+from database import get_database
+from utils.leases import LEASE_COLLECTION, WORKER_ID, Lease
+from utils.logger import logger
+from utils.metrics import LatencyHistogram
+from utils.prometheus import counter, gauge, histogram, register_collector
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() != 'false'
+SCHEDULER_MAX_CONCURRENT = int(os.getenv('SCHEDULER_MAX_CONCURRENT', '2'))
+
+LEASE_PREFIX = "job:"
+LEASE_GRACE_SECONDS = 60   # lease TTL = job timeout + grace
+LEASE_POLL_SECONDS = 60    # retry interval while another worker holds a lease
+JOB_DURATION_BOUNDS = (0.1, 1.0, 5.0, 15.0, 60.0, 300.0)
+JOB_STATUSES = ("success", "error", "timeout")
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval_seconds: float
+    timeout_seconds: float = 600
+    jitter_seconds: float = 30
+
+
+@dataclass
+class JobStats:
+    """Runs of one job on this worker"""
+    runs: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(JOB_STATUSES, 0))
+    skipped: int = 0
+    running: bool = False
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    last_run_at: Optional[float] = None
+    durations: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def record(self, status: str, duration: float, error: Optional[str] = None) -> None:
+        self.runs[status] += 1
+        self.last_status = status
+        self.last_error = error
+        self.last_run_at = time.time()
+        self.durations.record(duration)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "runs": dict(self.runs),
+            "skipped": self.skipped,
+            "running": self.running,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "last_run_at": (
+                datetime.fromtimestamp(self.last_run_at, timezone.utc).isoformat()
+                if self.last_run_at else None
+            ),
+            "duration": self.durations.summary(),
+        }
+
+
+class JobScheduler:
+    """Runs registered jobs on their interval, one worker per run"""
+
+    def __init__(self, max_concurrent: int = SCHEDULER_MAX_CONCURRENT):
+        self.jobs: Dict[str, Job] = {}
+        self.stats: Dict[str, JobStats] = {}
+        self.max_concurrent = max_concurrent
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, job: Job) -> None:
+        self.jobs[job.name] = job
+        self.stats.setdefault(job.name, JobStats())
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._tasks = [
+            asyncio.create_task(self._run_loop(job), name=f"job:{job.name}")
+            for job in self.jobs.values()
+        ]
+        logger.info(f"⏰ Scheduler started ({WORKER_ID}): {', '.join(self.jobs)}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run_loop(self, job: Job) -> None:
+        # Stagger the first attempt across workers
+        delay = random.uniform(0, job.jitter_seconds)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                async with self._semaphore:
+                    delay = await self._tick(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Lease/DB trouble: try again later
+                logger.error(f"❌ Scheduler error for {job.name}: {e}")
+                delay = min(job.interval_seconds, LEASE_POLL_SECONDS)
+            delay += random.uniform(0, job.jitter_seconds)
+
+    async def _tick(self, job: Job) -> float:
+        """Run the job if it is due and we hold its lease; returns seconds to sleep"""
+        db = await get_database()
+        lease = Lease(db, f"{LEASE_PREFIX}{job.name}", ttl_seconds=job.timeout_seconds + LEASE_GRACE_SECONDS)
+        if not await lease.acquire():
+            self.stats[job.name].skipped += 1
+            return min(job.interval_seconds, LEASE_POLL_SECONDS)
+
+        due_in = self._due_in(job, lease.state)
+        if due_in > 0:
+            await lease.release()
+            return due_in
+
+        started_at = datetime.now(timezone.utc)
+        status, duration, error = await self.run_job(job)
+        await lease.release({
+            "last_started_at": started_at.isoformat(),
+            "last_status": status,
+            "last_duration": round(duration, 3),
+            "last_error": error,
+            "last_owner": WORKER_ID,
+        })
+        return job.interval_seconds
+
+    @staticmethod
+    def _due_in(job: Job, state: Dict[str, Any]) -> float:
+        last_started = state.get("last_started_at")
+        if not last_started:
+            return 0
+        elapsed = (datetime.now(timezone.utc) - datetime.fromisoformat(last_started)).total_seconds()
+        return job.interval_seconds - elapsed
+
+    async def run_job(self, job: Job):
+        """Run once with the job's timeout; returns (status, duration, error)"""
+        stats = self.stats[job.name]
+        stats.running = True
+        error = None
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout_seconds)
+            status = "success"
+        except asyncio.TimeoutError:
+            status = "timeout"
+            error = f"timed out after {job.timeout_seconds}s"
+            logger.error(f"⏱️ Job {job.name} {error}")
+        except Exception as e:
+            status = "error"
+            error = str(e)
+            logger.error(f"❌ Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            stats.running = False
+        duration = time.perf_counter() - start
+        stats.record(status, duration, error)
+        if status == "success":
+            logger.info(f"✅ Job {job.name} finished in {duration:.2f}s")
+        return status, duration, error
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """This worker's run history plus the last run of each job cluster-wide"""
+        db = await get_database()
+        leases = await db[LEASE_COLLECTION].find(
+            {"_id": {"$in": [f"{LEASE_PREFIX}{name}" for name in self.jobs]}}
+        ).to_list(length=len(self.jobs))
+        cluster = {lease["_id"][len(LEASE_PREFIX):]: lease.get("state") or {} for lease in leases}
+
+        return {
+            "worker": WORKER_ID,
+            "enabled": bool(self._tasks),
+            "jobs": {
+                name: {
+                    "interval_seconds": job.interval_seconds,
+                    "timeout_seconds": job.timeout_seconds,
+                    "worker": self.stats[name].summary(),
+                    "cluster": cluster.get(name, {}),
+                }
+                for name, job in self.jobs.items()
+            }
+        }
+
+
+scheduler = JobScheduler()
+
+
+def _collect_prometheus():
+    items = list(scheduler.stats.items())
+    lines = counter(
+        "scheduler_job_runs",
+        "Scheduled job runs on this worker by status",
+        (({"job": name, "status": status}, n) for name, stats in items for status, n in stats.runs.items())
+    )
+    lines += counter(
+        "scheduler_job_skipped",
+        "Ticks skipped because another worker held the job lease",
+        (({"job": name}, stats.skipped) for name, stats in items)
+    )
+    lines += histogram(
+        "scheduler_job_duration_seconds",
+        "Scheduled job run time",
+        (({"job": name}, stats.durations) for name, stats in items),
+        bounds=JOB_DURATION_BOUNDS
+    )
+    lines += gauge(
+        "scheduler_job_running",
+        "Whether the job is running on this worker",
+        (({"job": name}, int(stats.running)) for name, stats in items)
+    )
+    lines += gauge(
+        "scheduler_job_last_run_timestamp_seconds",
+        "Unix time of the job's last run on this worker",
+        (({"job": name}, stats.last_run_at) for name, stats in items if stats.last_run_at),
+        unit="seconds"
+    )
+    return lines
+
+
+register_collector(_collect_prometheus)
@@ -0,0 +1,41 @@
+"""
+Response Cache Tests - utils.cache.cache_response
+Runs against FakeRedis; no server needed.
+"""
+
+import asyncio
+
+from fakeredis import FakeAsyncRedis
+
+import utils.cache as cache
+from utils.cache import cache_response, local_cache
+
+
+def _use_fake_redis():
+    cache.redis_client = FakeAsyncRedis(decode_responses=True)
+    local_cache.invalidate("*")
+
+
+class TestCacheResponse:
+    def test_l1_hits_return_private_copies(self):
+        _use_fake_redis()
+        calls = []
+
+        @cache_response(ttl_seconds=60, beta=0)
+        async def list_rows():
+            calls.append(1)
+            return [{"id": "p1", "created_at": "2024-01-01T00:00:00+00:00"}]
+
+        async def run():
+            results = []
+            for _ in range(4):
+                rows = await list_rows()
+                results.append(dict(rows[0]))
+                # Callers are free to mutate what they get back
+                rows[0]["created_at"] = object()
+                rows.append({"id": "junk"})
+            return results
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(row == {"id": "p1", "created_at": "2024-01-01T00:00:00+00:00"} for row in results)
@@ -0,0 +1,127 @@
+"""
+Catalog Sync Tests - services.catalog_sync
+Two "workers" with their own indexes sharing one mongomock database and one
+FakeRedis server; no server needed.
+"""
+
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services.catalog_sync import CatalogSync  # noqa: E402
+from services.facet_engine import ProductFacetEngine  # noqa: E402
+from services.search_index import ProductSearchIndex  # noqa: E402
+
+
+def _product(product_id: str, title: str, category_id: str = "gpu") -> dict:
+    return {"id": product_id, "title": title, "category_id": category_id, "status": "approved", "is_active": True}
+
+
+async def _eventually(predicate, timeout: float = 5.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def _worker():
+    index = ProductSearchIndex()
+    return CatalogSync([index]), index
+
+
+class TestCatalogSync:
+    def test_changes_reach_other_workers(self):
+        db = mongomock_motor.AsyncMongoMockClient()["catalog_test"]
+        server = FakeServer()
+
+        async def run():
+            await db.products.insert_one(_product("p1", "Radeon graphics card"))
+            (sync_a, index_a), (sync_b, index_b) = _worker(), _worker()
+            await sync_a.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            await sync_b.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            assert sync_a.in_sync and sync_b.in_sync
+            assert index_b.match_ids("radeon") == ["p1"]
+
+            # Created on A
+            created = _product("p2", "Geforce graphics card")
+            await db.products.insert_one(dict(created))
+            await sync_a.product_changed(created)
+            assert index_a.match_ids("geforce") == ["p2"]
+            assert await _eventually(lambda: index_b.match_ids("geforce") == ["p2"])
+
+            # Renamed on B
+            await db.products.update_one({"id": "p1"}, {"$set": {"title": "Arc graphics card"}})
+            await sync_b.product_changed(await db.products.find_one({"id": "p1"}, {"_id": 0}))
+            assert await _eventually(lambda: index_a.match_ids("radeon") == [])
+            assert index_a.match_ids("arc") == ["p1"]
+
+            # Deleted on A
+            await db.products.update_one({"id": "p2"}, {"$set": {"is_active": False}})
+            await sync_a.product_removed("p2")
+            assert await _eventually(lambda: index_b.match_ids("geforce") == [])
+
+            await sync_a.stop()
+            await sync_b.stop()
+
+        asyncio.run(run())
+
+    def test_resubscribe_rebuilds_missed_changes(self):
+        db = mongomock_motor.AsyncMongoMockClient()["catalog_test"]
+        server = FakeServer()
+
+        async def run():
+            (sync_a, _), (sync_b, index_b) = _worker(), _worker()
+            await sync_a.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            await sync_b.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+
+            # B is not listening while A publishes
+            await sync_b.stop()
+            assert not sync_b.in_sync
+            created = _product("p1", "Ryzen processor")
+            await db.products.insert_one(dict(created))
+            await sync_a.product_changed(created)
+            assert index_b.match_ids("ryzen") == []
+
+            await sync_b.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            assert sync_b.in_sync
+            assert index_b.match_ids("ryzen") == ["p1"]
+
+            await sync_a.stop()
+            await sync_b.stop()
+
+        asyncio.run(run())
+
+    def test_facet_counts_follow_other_workers(self):
+        db = mongomock_motor.AsyncMongoMockClient()["catalog_test"]
+        server = FakeServer()
+
+        def categories(facets):
+            return {c["id"]: c["count"] for c in facets.facets()["categories"]}
+
+        async def run():
+            await db.products.insert_one(_product("p1", "Radeon graphics card"))
+            facets_a, facets_b = ProductFacetEngine(), ProductFacetEngine()
+            sync_a, sync_b = CatalogSync([facets_a]), CatalogSync([facets_b])
+            await sync_a.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            await sync_b.start(db, FakeAsyncRedis(server=server, decode_responses=True))
+            assert categories(facets_b) == {"gpu": 1}
+
+            # Moved to another category on A
+            await db.products.update_one({"id": "p1"}, {"$set": {"category_id": "cpu"}})
+            await sync_a.product_changed(await db.products.find_one({"id": "p1"}, {"_id": 0}))
+            assert await _eventually(lambda: categories(facets_b) == {"cpu": 1})
+
+            # Deleted on B
+            await db.products.update_one({"id": "p1"}, {"$set": {"is_active": False}})
+            await sync_b.product_removed("p1")
+            assert await _eventually(lambda: categories(facets_a) == {})
+
+            await sync_a.stop()
+            await sync_b.stop()
+
+        asyncio.run(run())
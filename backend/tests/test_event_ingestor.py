@@ -0,0 +1,46 @@
+"""
+Glassy Mind Event Ingestor Tests - glassy_mind.event_ingestor
+Shutdown must not lose operations, including a batch mid-write.
+Uses an in-memory stand-in for the database; no server needed.
+"""
+
+import asyncio
+
+from glassy_mind.event_ingestor import EventIngestor
+
+
+class SlowEvents:
+    """behavior_events whose insert_many takes a while"""
+
+    def __init__(self):
+        self.written = []
+        self.writing = asyncio.Event()
+
+    async def insert_many(self, docs, ordered=True):
+        self.writing.set()
+        await asyncio.sleep(0.1)
+        self.written.extend(docs)
+
+
+class FakeDb:
+    def __init__(self):
+        self.behavior_events = SlowEvents()
+
+
+class TestEventIngestorStop:
+    def test_stop_during_flush_keeps_in_flight_batch(self):
+        async def run():
+            db = FakeDb()
+            ingestor = EventIngestor(batch_size=2, flush_interval=0)
+            ingestor.start(db)
+            for n in range(5):
+                await ingestor.add_event({"n": n})
+
+            await db.behavior_events.writing.wait()
+            # Stop while the first batch is being written
+            await ingestor.stop()
+            return sorted(doc["n"] for doc in db.behavior_events.written), ingestor.dropped
+
+        written, dropped = asyncio.run(run())
+        assert written == [0, 1, 2, 3, 4]
+        assert dropped == {"queue_full": 0, "flush_error": 0}
@@ -0,0 +1,183 @@
+"""
+User Feature Store Tests - services.feature_store
+Versioning, incremental update_op, invalidation and the write-back guard,
+against mongomock; no server needed.
+"""
+
+import asyncio
+import importlib
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import services.feature_store as feature_store_module  # noqa: E402
+from services.feature_store import FEATURE_COLLECTION, FeatureGroup, FeatureStore  # noqa: E402
+
+
+class Source:
+    """Loader over a dict standing in for the source collections"""
+
+    def __init__(self, **values):
+        self.values = values
+        self.calls = 0
+        self.during_load = None
+
+    async def load(self, user_id):
+        self.calls += 1
+        value = dict(self.values)
+        if self.during_load is not None:
+            hook, self.during_load = self.during_load, None
+            await hook()
+        return value
+
+
+@pytest.fixture
+def store(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["feature_store_test"]
+
+    async def get_database():
+        return db
+
+    monkeypatch.setattr(feature_store_module, "get_database", get_database)
+    asyncio.run(db[FEATURE_COLLECTION].create_index("user_id", unique=True))
+    store = FeatureStore(cache_ttl=0)
+    store.db = db
+    return store
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestFeatureStore:
+    def test_materialises_once(self, store):
+        source = Source(views=1)
+        store.register(FeatureGroup("session", 1, source.load))
+
+        assert run(store.get("u1", ["session"])) == {"session": {"views": 1}}
+        source.values["views"] = 2
+        # Stored copy is fresh: no recompute
+        assert run(store.get("u1", ["session"])) == {"session": {"views": 1}}
+        assert source.calls == 1
+
+    def test_version_bump_recomputes_and_drops_old_copies(self, store):
+        source = Source(views=1)
+        store.register(FeatureGroup("session", 1, source.load))
+        run(store.get("u1", ["session"]))
+        run(store.get("u2", ["session"]))
+
+        source.values["views"] = 5
+        store.register(FeatureGroup("session", 2, source.load))
+        assert run(store.get("u1", ["session"])) == {"session": {"views": 5}}
+        assert source.calls == 3
+
+        # u2 still holds a v1 copy until the cleanup job removes it
+        assert run(store.drop_stale_versions()) == 1
+        doc = run(store.db[FEATURE_COLLECTION].find_one({"user_id": "u2"}))
+        assert "session" not in doc.get("groups", {})
+
+    def test_update_op_applies_to_current_version_only(self, store):
+        source = Source(total_views=0, viewed_products=[])
+        store.register(FeatureGroup("session", 1, source.load))
+        collection = store.db[FEATURE_COLLECTION]
+
+        def view(user_id, product_id):
+            return store.update_op(user_id, "session", {
+                "$push": {"viewed_products": {"$each": [product_id], "$slice": -2}},
+                "$inc": {"total_views": 1},
+            })
+
+        run(store.get("u1", ["session"]))
+        run(collection.bulk_write([view("u1", "p1"), view("u1", "p2"), view("u1", "p3")]))
+        assert run(store.get("u1", ["session"])) == {"session": {"total_views": 3, "viewed_products": ["p2", "p3"]}}
+
+        # Not materialised: the op is a no-op and nothing is created
+        run(collection.bulk_write([view("u2", "p1")]))
+        assert run(collection.count_documents({"user_id": "u2"})) == 0
+
+        # Stale version: the op doesn't touch the old copy
+        store.register(FeatureGroup("session", 2, source.load))
+        run(collection.bulk_write([view("u1", "p4")]))
+        doc = run(collection.find_one({"user_id": "u1"}))
+        assert doc["groups"]["session"]["value"]["total_views"] == 3
+
+    def test_invalidate_recomputes_group(self, store):
+        cart = Source(total=10)
+        user = Source(name="A")
+        store.register(FeatureGroup("cart", 1, cart.load))
+        store.register(FeatureGroup("user", 1, user.load))
+        run(store.get("u1"))
+
+        cart.values["total"] = 20
+        run(store.invalidate("u1", "cart"))
+        assert run(store.get("u1")) == {"cart": {"total": 20}, "user": {"name": "A"}}
+        assert (cart.calls, user.calls) == (2, 1)
+
+    def test_invalidation_during_load_wins(self, store):
+        cart = Source(total=10)
+        store.register(FeatureGroup("cart", 1, cart.load, ttl_seconds=86400))
+        run(store.get("u1"))
+        run(store.invalidate("u1", "cart"))
+
+        async def checkout():
+            # Source changes and is invalidated after the loader read it
+            cart.values["total"] = 0
+            await store.invalidate("u1", "cart")
+
+        cart.during_load = checkout
+        # This read computed the pre-checkout value: served, not persisted
+        assert run(store.get("u1")) == {"cart": {"total": 10}}
+        assert store.stats["discarded"] == 1
+        assert run(store.get("u1")) == {"cart": {"total": 0}}
+
+    def test_invalidation_before_first_write_wins(self, store):
+        cart = Source(total=10)
+        store.register(FeatureGroup("cart", 1, cart.load))
+
+        async def checkout():
+            cart.values["total"] = 0
+            await store.invalidate("u1", "cart")
+
+        cart.during_load = checkout
+        assert run(store.get("u1")) == {"cart": {"total": 10}}
+        assert run(store.get("u1")) == {"cart": {"total": 0}}
+
+    def test_ttl_heals_copy_that_raced_an_update(self, store):
+        source = Source(total_views=0)
+        store.register(FeatureGroup("session", 1, source.load, ttl_seconds=300))
+        collection = store.db[FEATURE_COLLECTION]
+
+        async def flush():
+            # The event reaches the source while the read is loading; its
+            # update_op finds no stored group yet and is a no-op
+            source.values["total_views"] = 1
+            await collection.bulk_write([store.update_op("u1", "session", {"$inc": {"total_views": 1}})])
+
+        source.during_load = flush
+        assert run(store.get("u1", ["session"])) == {"session": {"total_views": 0}}
+        # The stored copy missed the event ...
+        assert run(store.get("u1", ["session"])) == {"session": {"total_views": 0}}
+
+        # ... until it is older than the TTL; update_ops don't refresh it
+        run(collection.update_one({"user_id": "u1"}, {"$set": {"groups.session.at": "2000-01-01T00:00:00+00:00"}}))
+        run(collection.bulk_write([store.update_op("u1", "session", {"$inc": {"total_views": 1}})]))
+        source.values["total_views"] = 2
+        assert run(store.get("u1", ["session"])) == {"session": {"total_views": 2}}
+
+
+class TestMemoryBankGroups:
+    def test_user_group_keeps_only_whitelisted_fields(self, store, monkeypatch):
+        # The package re-exports the memory_bank instance under the module's name
+        memory_bank_module = importlib.import_module("services.core_ai.memory_bank")
+
+        async def get_database():
+            return store.db
+
+        monkeypatch.setattr(memory_bank_module, "get_database", get_database)
+        run(store.db.users.insert_one({
+            "id": "u1", "username": "alice", "email": "a@example.com",
+            "hashed_password": "$2b$12$secret", "level": 3,
+        }))
+        user = run(memory_bank_module.memory_bank._get_user("u1"))
+        assert user == {"id": "u1", "username": "alice", "level": 3}
@@ -0,0 +1,94 @@
+"""
+Glassy Mind Tracking -> Rules Tests
+Drives /api/mind/track/* and checks the built-in rules fire for the events
+real clients send. Observer runs in its in-memory mode; no server needed.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from glassy_mind.observer import observer
+from glassy_mind.router import router
+from glassy_mind.state_manager import MemoryStateBackend, state_manager
+from services.feature_store import feature_store
+from utils.auth_utils import get_current_user_optional
+
+
+@pytest.fixture
+def mind(monkeypatch):
+    monkeypatch.setattr(observer, "_initialized", True)
+    monkeypatch.setattr(observer, "_db", None)
+    monkeypatch.setattr(observer, "_in_memory_sessions", {})
+    observer._session_meta.clear()
+    monkeypatch.setattr(state_manager, "backend", MemoryStateBackend())
+
+    current = {"id": "u0"}
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_current_user_optional] = lambda: dict(current)
+
+    with TestClient(app) as client:
+        def as_user(user_id):
+            current["id"] = user_id
+            return client
+
+        def suggestion(user_id):
+            return client.portal.call(state_manager.get_user_state, user_id).get("suggestion")
+
+        yield as_user, suggestion
+
+
+def _view(client, n, category):
+    response = client.post("/api/mind/track/view", json={
+        "product_id": f"p{n}",
+        "product_data": {"category": category, "price": 100},
+    })
+    assert response.status_code == 200
+
+
+class TestTrackedEventsFireRules:
+    def test_comparison_then_hesitation(self, mind):
+        as_user, suggestion = mind
+        client = as_user("shopper")
+        for n in range(3):
+            _view(client, n, "gpu")
+        assert suggestion("shopper") == "Сравнить выбранные товары бок о бок?"
+
+        for n in range(3, 5):
+            _view(client, n, "gpu")
+        assert suggestion("shopper") == "Помочь сравнить характеристики?"
+
+    def test_window_shopper(self, mind):
+        as_user, suggestion = mind
+        client = as_user("browser")
+        for n in range(11):
+            _view(client, n, f"cat{n}")
+        assert suggestion("browser") == "Не можете определиться? Давайте подберём вместе!"
+
+    def test_big_spender(self, mind):
+        as_user, suggestion = mind
+        client = as_user("whale")
+        response = client.post("/api/mind/track/cart", json={
+            "product_id": "gpu1", "quantity": 1, "product_data": {"price": 2500},
+        })
+        assert response.status_code == 200
+        assert suggestion("whale") == "Проверить совместимость вашей топовой сборки?"
+
+    def test_tech_geek(self, mind):
+        as_user, suggestion = mind
+        client = as_user("builder")
+        client.post("/api/mind/track/dwell", json={"page_id": "/pc-builder", "action": "enter"})
+        # Six minutes on the builder page
+        observer._in_memory_sessions["builder"]["page_entered_at"] = (
+            datetime.now(timezone.utc) - timedelta(minutes=6)
+        ).isoformat()
+        client.post("/api/mind/track/dwell", json={"page_id": "/pc-builder", "action": "leave"})
+        assert suggestion("builder") == "Чек-лист для кабель-менеджмента?"
+
+
+def test_session_features_expire():
+    # Incremental updates can race the read that stores the group; the TTL heals it
+    assert feature_store.groups["session"].ttl_seconds
@@ -0,0 +1,168 @@
+"""
+Index Coverage Tests - query shapes vs. config/indexes.py
+Syncs the index registry into a scratch database on a local mongod and runs
+explain() for the query shapes the routes issue; any COLLSCAN fails.
+
+Requires a mongod at MONGO_TEST_URL (default mongodb://localhost:27017);
+skipped otherwise.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_TEST_URL = os.environ.get('MONGO_TEST_URL', 'mongodb://localhost:27017')
+
+# database.py connects lazily but reads these at import time
+os.environ.setdefault('MONGO_URL', MONGO_TEST_URL)
+os.environ.setdefault('DB_NAME', 'index_coverage')
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from database import sync_indexes  # noqa: E402
+
+
+# (description, collection, filter, sort)
+QUERY_SHAPES = [
+    # product_routes.get_products
+    ("products: default listing", "products",
+     {"is_active": True, "status": "approved"}, [("created_at", -1), ("id", -1)]),
+    ("products: price ascending", "products",
+     {"is_active": True, "status": "approved"}, [("price", 1), ("id", 1)]),
+    ("products: by category", "products",
+     {"is_active": True, "status": "approved", "category_id": "gpu"}, [("created_at", -1), ("id", -1)]),
+    ("products: by persona", "products",
+     {"is_active": True, "status": "approved", "personas": {"$in": ["pro_gamer"]}}, [("created_at", -1), ("id", -1)]),
+    ("products: search ids", "products",
+     {"is_active": True, "status": "approved", "id": {"$in": ["a", "b"]}}, None),
+    ("products: specific filter", "products",
+     {"specific_filters.socket": {"$in": ["AM5"]}}, None),
+    ("products: by id", "products", {"id": "p1"}, None),
+    ("products: deals", "products",
+     {"discount": {"$gt": 0}, "is_active": True}, [("discount", -1)]),
+    ("products: popular", "products", {"is_active": True}, [("views", -1)]),
+    ("products: builder category", "products", {"category": "cpu", "specs.socket": "AM5"}, None),
+    # users
+    ("users: by id", "users", {"id": "u1"}, None),
+    ("users: by email", "users", {"email": "a@b.c"}, None),
+    ("users: wishlist holders", "users", {"wishlist": "p1"}, None),
+    ("users: hall of fame xp", "users", {"is_active": True}, [("xp_total", -1)]),
+    ("users: hall of fame trust", "users", {"is_active": True}, [("trust_score", -1)]),
+    # price alerts
+    ("price_alerts: matcher range", "price_alerts",
+     {"product_id": "p1", "enabled": True, "triggered": False, "trigger_price": {"$gte": 99.0}}, None),
+    ("price_alerts: matcher legacy", "price_alerts",
+     {"product_id": "p1", "enabled": True, "triggered": False, "$or": [
+         {"trigger_price": {"$gte": 99.0}}, {"trigger_price": {"$exists": False}}]}, None),
+    ("price_alerts: user listing", "price_alerts", {"user_id": "u1"}, None),
+    ("price_alerts: user+product", "price_alerts", {"user_id": "u1", "product_id": "p1"}, None),
+    # notifications
+    ("push_subscriptions: batch", "push_subscriptions", {"user_id": {"$in": ["u1", "u2"]}}, None),
+    ("notifications: inbox", "notifications", {"user_id": "u1"}, [("created_at", -1)]),
+    ("notifications: unread", "notifications",
+     {"user_id": "u1", "is_read": False}, [("created_at", -1)]),
+    # listings and feeds
+    ("swap_listings: active newest", "swap_listings",
+     {"status": "active"}, [("is_boosted", -1), ("created_at", -1), ("id", -1)]),
+    ("swap_listings: active cheapest", "swap_listings",
+     {"status": "active"}, [("is_boosted", -1), ("price", 1), ("id", 1)]),
+    ("network_posts: hot feed", "network_posts",
+     {"status": "published"}, [("hot_score", -1), ("created_at", -1), ("id", -1)]),
+    ("network_posts: top feed", "network_posts",
+     {"status": "published"}, [("likes", -1), ("created_at", -1), ("id", -1)]),
+    ("orders: user history", "orders", {"user_id": "u1"}, [("created_at", -1), ("id", -1)]),
+    ("groupbuys: by deadline", "groupbuys", {}, [("deadline", -1), ("id", -1)]),
+    # glassy mind
+    ("behavior_events: recent views", "behavior_events",
+     {"event_type": "view", "timestamp": {"$gte": "2024-01-01"}}, None),
+    ("behavior_events: recent by type", "behavior_events",
+     {"event_type": "click"}, [("timestamp", -1)]),
+    ("behavior_events: recent", "behavior_events", {}, [("timestamp", -1)]),
+    ("user_features: by user", "user_features", {"user_id": "u1", "groups.session.v": 1}, None),
+    ("product_views: recent for user", "product_views", {"user_id": "u1"}, [("viewed_at", -1)]),
+    ("price_history: by product", "price_history", {"product_id": "p1"}, None),
+]
+
+
+def _stages(plan):
+    """All stage names in an explain plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+@pytest.fixture(scope="module")
+def scratch_db():
+    client = MongoClient(MONGO_TEST_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"No mongod at {MONGO_TEST_URL}")
+
+    name = f"index_coverage_{uuid.uuid4().hex[:8]}"
+
+    async def sync():
+        motor_client = AsyncIOMotorClient(MONGO_TEST_URL)
+        try:
+            return await sync_indexes(database=motor_client[name], strict=True)
+        finally:
+            motor_client.close()
+
+    asyncio.run(sync())
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+class TestIndexRegistry:
+    """Registry sync behaviour"""
+
+    def test_sync_is_idempotent(self, scratch_db):
+        async def resync():
+            motor_client = AsyncIOMotorClient(MONGO_TEST_URL)
+            try:
+                return await sync_indexes(database=motor_client[scratch_db.name], strict=True)
+            finally:
+                motor_client.close()
+
+        assert asyncio.run(resync()) == {}
+
+    def test_undeclared_index_is_dropped(self, scratch_db):
+        scratch_db.products.create_index("legacy_field")
+
+        async def resync():
+            motor_client = AsyncIOMotorClient(MONGO_TEST_URL)
+            try:
+                return await sync_indexes(["products"], drop=True, database=motor_client[scratch_db.name], strict=True)
+            finally:
+                motor_client.close()
+
+        report = asyncio.run(resync())
+        assert report["products"]["dropped"] == ["legacy_field_1"]
+        assert "legacy_field_1" not in scratch_db.products.index_information()
+
+
+class TestQueryShapeCoverage:
+    """Every known query shape must be served by an index"""
+
+    @pytest.mark.parametrize(
+        "collection,query,sort",
+        [shape[1:] for shape in QUERY_SHAPES],
+        ids=[shape[0] for shape in QUERY_SHAPES]
+    )
+    def test_no_collscan(self, scratch_db, collection, query, sort):
+        cursor = scratch_db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+
+        stages = set(_stages(plan))
+        assert "COLLSCAN" not in stages, f"{collection} {query} sort={sort} -> {plan}"
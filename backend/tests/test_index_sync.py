@@ -0,0 +1,70 @@
+"""
+Startup Index Sync Tests - database.create_indexes
+The destructive sync runs on one worker, once per registry change.
+Runs against mongomock with a small registry; no server needed.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import database  # noqa: E402
+from config.indexes import idx  # noqa: E402
+from utils.leases import LEASE_COLLECTION  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["index_sync_test"]
+    monkeypatch.setattr(database, "db", db)
+    monkeypatch.setattr(database, "INDEXES", {"items": [idx("sku")]})
+    return db
+
+
+def _indexes(db):
+    return set(asyncio.run(db.items.index_information())) - {"_id_"}
+
+
+def _add_legacy_index(db):
+    asyncio.run(db.items.create_index("legacy"))
+
+
+class TestCreateIndexes:
+    def test_syncs_once_per_registry(self, db, monkeypatch):
+        _add_legacy_index(db)
+        asyncio.run(database.create_indexes())
+        assert _indexes(db) == {"sku_1"}
+
+        # Registry unchanged: later startups leave the collection alone
+        _add_legacy_index(db)
+        asyncio.run(database.create_indexes())
+        assert _indexes(db) == {"sku_1", "legacy_1"}
+
+        # Registry changed: synced again
+        monkeypatch.setattr(database, "INDEXES", {"items": [idx("sku"), idx("name")]})
+        asyncio.run(database.create_indexes())
+        assert _indexes(db) == {"sku_1", "name_1"}
+
+    def test_skips_while_another_worker_holds_the_lease(self, db):
+        asyncio.run(db[LEASE_COLLECTION].insert_one({
+            "_id": database.INDEX_SYNC_LEASE,
+            "owner": "other-worker",
+            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=5),
+        }))
+        _add_legacy_index(db)
+        prepared = []
+
+        async def prepare(target):
+            prepared.append(target)
+
+        asyncio.run(database.create_indexes(prepare=prepare))
+        assert _indexes(db) == {"legacy_1"}
+        assert prepared == []
+
+    def test_plain_sync_does_not_drop(self, db):
+        _add_legacy_index(db)
+        asyncio.run(database.sync_indexes(["items"]))
+        assert _indexes(db) == {"sku_1", "legacy_1"}
@@ -0,0 +1,35 @@
+"""
+Request Metrics Tests - utils.metrics
+Windowed stats must report counts from the same window as their latency.
+"""
+
+from types import SimpleNamespace
+
+import utils.metrics as metrics_module
+from utils.metrics import PerformanceMetrics
+
+
+class TestWindowedStats:
+    def test_window_counts_match_window_latency(self, monkeypatch):
+        clock = SimpleNamespace(now=1_000_000.0)
+        monkeypatch.setattr(metrics_module, "time", SimpleNamespace(time=lambda: clock.now))
+        metrics = PerformanceMetrics()
+
+        # An hour ago: slow and failing
+        for _ in range(8):
+            metrics.record_request("/api/items", 2.0, 500, "GET")
+        clock.now += 3600
+        # Last minute: fast, one error
+        for status in (200, 200, 200, 404):
+            metrics.record_request("/api/items", 0.01, status, "GET")
+
+        recent = metrics.get_stats("GET /api/items", window="1m")
+        assert (recent["total_requests"], recent["count"]) == (4, 4)
+        assert (recent["error_count"], recent["error_rate"]) == (1, 25.0)
+
+        lifetime = metrics.get_stats("GET /api/items")
+        assert (lifetime["total_requests"], lifetime["error_count"]) == (12, 9)
+        assert lifetime["windows"]["5m"]["error_count"] == 1
+
+        summary = metrics.get_stats(window="5m")["summary"]
+        assert (summary["total_requests"], summary["total_errors"]) == (4, 1)
@@ -0,0 +1,46 @@
+"""
+Mongo Client Settings Tests - config.mongo_settings
+backend/.env must reach the Motor client options regardless of the working
+directory the process starts in.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from config.mongo_settings import ENV_FILE
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_env_file_is_backend_dotenv():
+    assert ENV_FILE == BACKEND_DIR / ".env"
+
+
+def test_backend_env_reaches_client_options():
+    if ENV_FILE.exists():
+        pytest.skip("backend/.env exists; not overwriting it")
+
+    env = {k: v for k, v in os.environ.items() if not k.startswith("MONGO_")}
+    env.update({
+        "MONGO_URL": "mongodb://localhost:1",
+        "DB_NAME": "t",
+        "PYTHONPATH": str(BACKEND_DIR),
+    })
+    ENV_FILE.write_text("MONGO_MAX_POOL_SIZE=7\nMONGO_MIN_POOL_SIZE=2\nMONGO_READ_PREFERENCE=nearest\n")
+    try:
+        # Started from the repository root, not backend/
+        result = subprocess.run(
+            [sys.executable, "-c", (
+                "from database import client_options; o = client_options(); "
+                "print(o['maxPoolSize'], o['read_preference'].mongos_mode)"
+            )],
+            cwd=BACKEND_DIR.parent, env=env, capture_output=True, text=True, timeout=60
+        )
+    finally:
+        ENV_FILE.unlink()
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["7", "nearest"]
@@ -0,0 +1,66 @@
+"""
+Price History Index Tests - unique price_history.product_id
+Duplicate histories left by the old tracker are merged before the unique
+index is built, and index sync refuses to swap the index while they exist.
+Runs against mongomock; no server needed.
+"""
+
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from database import IndexSyncError, sync_indexes  # noqa: E402
+from tasks.price_tracker import merge_duplicate_price_histories  # noqa: E402
+
+
+def _history(product_id, *points):
+    prices = [{"price": price, "timestamp": f"2024-01-0{day}T00:00:00+00:00"} for day, price in points]
+    return {
+        "id": f"h-{product_id}-{points[0][0]}",
+        "product_id": product_id,
+        "prices": prices,
+        "last_updated": prices[-1]["timestamp"],
+    }
+
+
+@pytest.fixture
+def db():
+    db = mongomock_motor.AsyncMongoMockClient()["price_history_test"]
+
+    async def seed():
+        await db.price_history.create_index("product_id")
+        await db.price_history.insert_many([
+            # Two trackers each started a history for p1
+            _history("p1", (1, 100.0), (3, 90.0)),
+            _history("p1", (1, 100.0), (2, 95.0)),
+            _history("p2", (1, 50.0)),
+        ])
+
+    asyncio.run(seed())
+    return db
+
+
+class TestPriceHistoryUniqueIndex:
+    def test_sync_keeps_old_index_while_duplicates_exist(self, db):
+        with pytest.raises(IndexSyncError, match="price_history.product_id_1"):
+            asyncio.run(sync_indexes(["price_history"], database=db))
+        info = asyncio.run(db.price_history.index_information())
+        assert "product_id_1" in info and not info["product_id_1"].get("unique")
+
+    def test_merge_then_sync_builds_unique_index(self, db):
+        assert asyncio.run(merge_duplicate_price_histories(db)) == 1
+
+        merged = asyncio.run(db.price_history.find_one({"product_id": "p1"}, {"_id": 0}))
+        assert [p["price"] for p in merged["prices"]] == [100.0, 95.0, 90.0]
+        assert merged["last_price"] == 90.0
+        assert (merged["lowest_price"], merged["highest_price"]) == (90.0, 100.0)
+        assert (merged["price_sum"], merged["price_count"]) == (285.0, 3)
+        assert asyncio.run(db.price_history.count_documents({})) == 2
+
+        asyncio.run(sync_indexes(["price_history"], database=db, strict=True))
+        info = asyncio.run(db.price_history.index_information())
+        assert info["product_id_1"].get("unique")
+        # Already unique: nothing left to merge
+        assert asyncio.run(merge_duplicate_price_histories(db)) == 0
@@ -0,0 +1,85 @@
+"""
+Product Listing Pagination Tests - GET /api/products with keyset cursors
+Runs the products router against mongomock and FakeRedis; no server needed.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import routes.product_routes as product_routes  # noqa: E402
+import utils.cache as cache  # noqa: E402
+from utils.auth_utils import get_current_user  # noqa: E402
+
+PRODUCT_COUNT = 5
+PAGE_SIZE = 2
+
+
+def _product(n: int) -> dict:
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=n)
+    return {
+        "id": f"p{n}",
+        "title": f"Product {n}",
+        "description": "",
+        "category_id": "100",
+        "price": 10.0 + n,
+        "seller_id": "s1",
+        "views": 0,
+        "wishlist_count": 0,
+        "purchases_count": 0,
+        "average_rating": 0.0,
+        "total_reviews": 0,
+        "created_at": created.isoformat(),
+        "updated_at": created.isoformat(),
+        "status": "approved",
+        "is_active": True,
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["products_test"]
+    monkeypatch.setattr(product_routes, "db", db)
+    monkeypatch.setattr(cache, "redis_client", FakeAsyncRedis(decode_responses=True))
+    cache.local_cache.invalidate("*")
+
+    app = FastAPI()
+    app.include_router(product_routes.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: {"id": "s1"}
+    with TestClient(app) as test_client:
+        test_client.portal.call(db.products.insert_many, [_product(n) for n in range(PRODUCT_COUNT)])
+        test_client.portal.call(db.users.insert_one, {"id": "s1", "is_admin": False})
+        yield test_client
+    cache.local_cache.invalidate("*")
+
+
+class TestProductCursorPagination:
+    def test_cursor_survives_cached_first_page(self, client):
+        # Repeated hits on the cached first page must keep producing the same cursor
+        responses = [client.get("/api/products/", params={"limit": PAGE_SIZE}) for _ in range(3)]
+        assert all(r.status_code == 200 for r in responses)
+        cursors = {r.headers["X-Next-Cursor"] for r in responses}
+        assert len(cursors) == 1
+
+        first_ids = [p["id"] for p in responses[-1].json()]
+        assert first_ids == ["p4", "p3"]
+
+        page_two = client.get("/api/products/", params={"limit": PAGE_SIZE, "cursor": cursors.pop()})
+        assert page_two.status_code == 200
+        assert [p["id"] for p in page_two.json()] == ["p2", "p1"]
+
+    def test_delete_refreshes_pages_without_the_product(self, client):
+        def second_page():
+            response = client.get("/api/products/", params={"limit": PAGE_SIZE, "skip": PAGE_SIZE})
+            assert response.status_code == 200
+            return [p["id"] for p in response.json()]
+
+        assert second_page() == ["p2", "p1"]
+        # p4 is on the first page only; deleting it shifts the second one
+        assert client.delete("/api/products/p4").status_code == 204
+        assert second_page() == ["p1", "p0"]
@@ -0,0 +1,150 @@
+"""
+Rules Engine Micro-benchmark - compiled dispatch vs. evaluating every rule
+Synthetic rule sets of growing size, each rule reading the same derived
+features the built-in rules use. The "naive" engine is the pre-dispatch
+behaviour: every rule runs on every event and recomputes its features from
+the raw context.
+
+Run directly for the evaluations/sec table:
+
+    PYTHONPATH=. python tests/test_rules_engine_benchmark.py
+"""
+
+import random
+import time
+from collections import Counter
+
+from glassy_mind.rules_engine import DERIVED_FEATURES, Rule, RuleReaction, RulesEngine, TriggerType
+
+RULE_COUNTS = (10, 100, 1000)
+CATEGORIES = ("gpu", "cpu", "ram", "ssd", "psu")
+EVENTS = ("view", "cart_add", "dwell", "filter", "search")
+
+
+def _naive_condition(kind: int, threshold: int):
+    if kind == 0:
+        def condition(ctx):
+            counts = {}
+            for cat in ctx.get("viewed_categories", []):
+                counts[cat] = counts.get(cat, 0) + 1
+            return (max(counts.values()) if counts else 0) > threshold
+    elif kind == 1:
+        def condition(ctx):
+            return len(ctx.get("cart_products", [])) == 0 and ctx.get("total_views", 0) > threshold
+    elif kind == 2:
+        def condition(ctx):
+            for page, seconds in ctx.get("top_dwell_pages", {}).items():
+                if ("pc-builder" in page.lower() or "assembly" in page.lower()) and seconds > threshold * 10:
+                    return True
+            return False
+    else:
+        def condition(ctx):
+            return "checkout" not in (ctx.get("current_page") or "").lower() and ctx.get("total_views", 0) > threshold
+    return condition
+
+
+def _compiled_rule(i: int, kind: int, threshold: int) -> Rule:
+    reaction = RuleReaction(trigger_type=TriggerType.SOFT_PUSH, message=f"rule {i}")
+    if kind == 0:
+        return Rule(f"r{i}", "", lambda ctx: ctx.feature("top_category_views") > threshold, reaction,
+                    features=("top_category_views",), events=("view",))
+    if kind == 1:
+        return Rule(f"r{i}", "", lambda ctx: ctx.feature("cart_size") == 0 and ctx.get("total_views", 0) > threshold,
+                    reaction, features=("cart_size", "total_views"), events=("view", "cart_add"))
+    if kind == 2:
+        return Rule(f"r{i}", "", lambda ctx: ctx.feature("builder_dwell_seconds") > threshold * 10, reaction,
+                    features=("builder_dwell_seconds",), events=("dwell",))
+    return Rule(f"r{i}", "", lambda ctx: "checkout" not in ctx.feature("current_page_lower")
+                and ctx.get("total_views", 0) > threshold, reaction,
+                features=("current_page_lower", "total_views"))
+
+
+def build_engines(rule_count: int, seed: int = 0):
+    """(naive rules, compiled engine) with the same conditions"""
+    rng = random.Random(seed)
+    naive, compiled = [], RulesEngine()
+    compiled.rules = []
+    for i in range(rule_count):
+        # Mostly event-specific rules, a few that depend on every event
+        kind = rng.choices((0, 1, 2, 3), weights=(4, 3, 3, 1))[0]
+        threshold = rng.randint(0, 20)
+        naive.append((f"r{i}", _naive_condition(kind, threshold)))
+        compiled.rules.append(_compiled_rule(i, kind, threshold))
+    compiled.compile()
+    return naive, compiled
+
+
+def make_context(seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        "user_id": "bench",
+        "viewed_categories": [rng.choice(CATEGORIES) for _ in range(20)],
+        "viewed_products": [f"p{n}" for n in range(20)],
+        "cart_products": [],
+        "total_views": rng.randint(0, 50),
+        "top_dwell_pages": {f"/pc-builder/{n}": rng.uniform(0, 400) for n in range(5)},
+        "current_page": "/catalog/gpu",
+    }
+
+
+def naive_match(naive, ctx):
+    return [name for name, condition in naive if condition(ctx)]
+
+
+def run_benchmark(duration: float = 0.5):
+    """[(rule_count, naive evals/s, compiled evals/s)] for a stream of mixed events"""
+    ctx = make_context()
+    events = [EVENTS[n % len(EVENTS)] for n in range(100)]
+    results = []
+    for count in RULE_COUNTS:
+        naive, compiled = build_engines(count)
+        rates = []
+        for evaluate in (
+            lambda event: naive_match(naive, ctx),
+            lambda event: compiled.match(ctx, event),
+        ):
+            evaluations = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                for event in events:
+                    evaluate(event)
+                evaluations += len(events)
+            rates.append(evaluations / (time.perf_counter() - start))
+        results.append((count, *rates))
+    return results
+
+
+class TestCompiledRules:
+    """Dispatch must not change which rules fire for an event"""
+
+    def test_compiled_matches_naive_for_dispatched_rules(self):
+        naive, compiled = build_engines(200, seed=1)
+        for seed in range(20):
+            ctx = make_context(seed)
+            expected = set(naive_match(naive, ctx))
+            for event in EVENTS + ("unknown",):
+                dispatched = {rule.name for rule in compiled.rules_for(event)}
+                got = {rule.name for rule in compiled.match(ctx, event)}
+                assert got == expected & dispatched
+            assert {rule.name for rule in compiled.match(ctx)} == expected
+
+    def test_derived_features_computed_once(self, monkeypatch):
+        calls = Counter()
+        for name, compute in list(DERIVED_FEATURES.items()):
+            monkeypatch.setitem(
+                DERIVED_FEATURES, name,
+                lambda ctx, name=name, compute=compute: calls.update([name]) or compute(ctx)
+            )
+        _, compiled = build_engines(200)
+        compiled.match(make_context(), "view")
+        assert calls and max(calls.values()) == 1
+
+    def test_benchmark_runs(self):
+        for count, naive_rate, compiled_rate in run_benchmark(duration=0.05):
+            assert naive_rate > 0 and compiled_rate > 0
+
+
+if __name__ == "__main__":
+    print(f"{'rules':>6} {'naive eval/s':>14} {'compiled eval/s':>16} {'speedup':>8}")
+    for count, naive_rate, compiled_rate in run_benchmark():
+        print(f"{count:>6} {naive_rate:>14,.0f} {compiled_rate:>16,.0f} {compiled_rate / naive_rate:>7.1f}x")
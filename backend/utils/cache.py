@@ -1,126 +1,611 @@
+import asyncio
+import fnmatch
 import json
 import hashlib
+import math
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import wraps
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
 import logging
 
+from fastapi.encoders import jsonable_encoder
+
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Try to connect to Redis, fallback to FakeRedis for development
-try:
-    import redis
-    redis_client = redis.Redis(
-        host='localhost',
-        port=6379,
-        db=0,
-        decode_responses=True,
-        socket_connect_timeout=2
-    )
-    # Test connection
-    redis_client.ping()
-    logger.info("✅ Connected to Redis server")
-except Exception as e:
-    logger.warning(f"⚠️ Redis not available, using FakeRedis: {e}")
-    from fakeredis import FakeRedis
-    redis_client = FakeRedis(decode_responses=True)
+# Async Redis client, created lazily on first use (needs a running loop)
+redis_client = None
+_client_lock: Optional[asyncio.Lock] = None
+
+# In-flight computations per cache key (per-worker single flight)
+_inflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+# Background refresh tasks (kept referenced so they aren't GC'd mid-flight)
+_refresh_tasks: set = set()
+
+LOCK_PREFIX = "cache_lock:"
+TAG_PREFIX = "cache_tag:"
+TAG_SET_MIN_TTL = 24 * 3600
+LOCK_TTL_MS = 10_000
+LOCK_WAIT_SECONDS = 2.0
+
+# Pub/sub channel carrying invalidation patterns to every worker's L1
+INVALIDATION_CHANNEL = "cache:invalidate"
+L1_MAX_ENTRIES = 1024
+
+_listener_task: Optional[asyncio.Task] = None
+
+TagSource = Union[Iterable[str], Callable[..., Iterable[str]]]
+
+
+class LocalCache:
+    """
+    L1 tier: bounded in-process LRU holding cache entries.
+
+    ``cache_response`` keeps values JSON-encoded here (see _local_entry), so
+    callers that mutate a result can't corrupt it for later hits.
+
+    Entries expire when their envelope stops being fresh (t + ttl); stale
+    serving and revalidation are left to the Redis tier.
+    """
+
+    def __init__(self, max_entries: int = L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if time.time() >= entry["t"] + entry.get("ttl", 0):
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, pattern: str) -> int:
+        """Drop keys matching a Redis-style glob pattern"""
+        if pattern == "*":
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            matched = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in matched:
+                del self._entries[key]
+            removed = len(matched)
+        self.stats["invalidations"] += removed
+        return removed
+
+    def discard(self, keys: Iterable[str]) -> int:
+        """Drop exact keys"""
+        removed = 0
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                removed += 1
+        self.stats["invalidations"] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / max(lookups, 1) * 100, 2)
+        }
+
+
+local_cache = LocalCache()
+
+# L2 (Redis) counters for this worker
+redis_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "errors": 0}
+
+
+async def get_redis():
+    """
+    Get the shared asyncio Redis client.
+
+    Connects to Redis on first call, falls back to FakeRedis for development.
+    """
+    global redis_client, _client_lock
+    if redis_client is not None:
+        return redis_client
+
+    if _client_lock is None:
+        _client_lock = asyncio.Lock()
+
+    async with _client_lock:
+        if redis_client is not None:
+            return redis_client
+        try:
+            import redis.asyncio as aioredis
+            client = aioredis.Redis(
+                host='localhost',
+                port=6379,
+                db=0,
+                decode_responses=True,
+                socket_connect_timeout=2
+            )
+            # Test connection
+            await client.ping()
+            logger.info("✅ Connected to Redis server")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis not available, using FakeRedis: {e}")
+            from fakeredis import FakeAsyncRedis
+            client = FakeAsyncRedis(decode_responses=True)
+        redis_client = client
+        _start_invalidation_listener(client)
+
+    return redis_client
+
+
+def _start_invalidation_listener(client) -> None:
+    """Subscribe this worker's L1 to invalidations published by any worker"""
+    global _listener_task
+    if _listener_task is not None and not _listener_task.done():
+        return
+
+    async def listen():
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        _apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error: {e}")
+                # Anything cached while disconnected may have missed an invalidation
+                local_cache.invalidate("*")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    _listener_task = asyncio.create_task(listen())
+
+
+def _apply_invalidation(data: str) -> None:
+    """Apply an invalidation message: {"pattern": ...} or {"keys": [...]}"""
+    try:
+        message = json.loads(data)
+    except (TypeError, ValueError):
+        return
+    if message.get("pattern"):
+        local_cache.invalidate(message["pattern"])
+    if message.get("keys"):
+        local_cache.discard(message["keys"])
+
+
+async def _publish_invalidation(pattern: Optional[str] = None, keys: Optional[List[str]] = None) -> None:
+    try:
+        client = await get_redis()
+        await client.publish(INVALIDATION_CHANNEL, json.dumps({"pattern": pattern, "keys": keys}))
+    except Exception as e:
+        logger.warning(f"Cache invalidation publish error: {e}")
+
+
+def make_cache_key(func_name: str, args: tuple, kwargs: dict) -> str:
+    """Create unique cache key from function name + args + kwargs"""
+    cache_data = {
+        'func': func_name,
+        'args': str(args),
+        'kwargs': str(sorted(kwargs.items()))
+    }
+    cache_key_raw = json.dumps(cache_data, sort_keys=True)
+    return f"{func_name}:{hashlib.md5(cache_key_raw.encode()).hexdigest()}"
+
+
+# ========================================
+# ENTRY ENVELOPE
+# ========================================
+# Entries are stored as {"v": value, "t": created_at, "d": compute_seconds, "ttl": ttl}
+# with a Redis expiry of ttl + stale_ttl. Within ttl the value is fresh; after
+# that it may be served stale while one caller recomputes it.
+
+def _make_entry(value: Any, compute_seconds: float, ttl_seconds: int) -> Dict[str, Any]:
+    # Round-trip through JSON so L1 hands out exactly what Redis would
+    encoded = json.loads(json.dumps(jsonable_encoder(value), default=str))
+    return {"v": encoded, "t": time.time(), "d": compute_seconds, "ttl": ttl_seconds}
+
+
+def _local_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """L1 copy of an entry: the value stays encoded and is decoded per hit"""
+    return {"raw": json.dumps(entry["v"]), "t": entry["t"], "d": entry.get("d", 0.0), "ttl": entry.get("ttl", 0)}
+
+
+def _entry_value(entry: Dict[str, Any]) -> Any:
+    """A private copy of the cached value"""
+    return json.loads(entry["raw"]) if "raw" in entry else entry["v"]
+
+
+def _unpack(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    try:
+        entry = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(entry, dict) or "v" not in entry or "t" not in entry:
+        return None
+    return entry
+
+
+def _should_refresh(entry: Dict[str, Any], beta: float) -> bool:
+    """
+    Probabilistic early expiration (XFetch).
+
+    Refresh becomes increasingly likely as expiry approaches, weighted by how
+    long the value took to compute, so hot keys are renewed before they expire.
+    """
+    expires_at = entry["t"] + entry.get("ttl", 0)
+    delta = max(entry.get("d", 0.0), 0.001)
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
 
 
-def cache_response(ttl_seconds=300):
+@dataclass
+class CacheSpec:
+    """Per-decorator cache policy"""
+    ttl_seconds: int
+    stale_ttl: int
+    local: bool = True
+    tags: Optional[TagSource] = None
+
+    def resolve_tags(self, result: Any, args: tuple, kwargs: dict) -> List[str]:
+        if self.tags is None:
+            return []
+        if callable(self.tags):
+            return [str(t) for t in self.tags(result, *args, **kwargs) if t]
+        return [str(t) for t in self.tags]
+
+
+async def _compute_and_store(
+    cache_key: str,
+    compute: Callable[[], Awaitable[Any]],
+    spec: CacheSpec,
+    args: tuple = (),
+    kwargs: Optional[dict] = None
+) -> Any:
+    """Compute a value and write it (and its tag memberships) back to Redis"""
+    started = time.perf_counter()
+    result = await compute()
+    elapsed = time.perf_counter() - started
+
+    try:
+        entry = _make_entry(result, elapsed, spec.ttl_seconds)
+        if spec.local:
+            local_cache.set(cache_key, _local_entry(entry))
+        expire = spec.ttl_seconds + spec.stale_ttl
+        client = await get_redis()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(cache_key, json.dumps(entry), ex=expire)
+            for tag in spec.resolve_tags(result, args, kwargs or {}):
+                pipe.sadd(f"{TAG_PREFIX}{tag}", cache_key)
+                pipe.expire(f"{TAG_PREFIX}{tag}", max(expire, TAG_SET_MIN_TTL))
+            await pipe.execute()
+    except Exception as e:
+        redis_stats["errors"] += 1
+        logger.warning(f"Cache write error: {e}")
+
+    return result
+
+
+async def _single_flight(cache_key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Run factory once per key per worker; concurrent callers share the result"""
+    future = _inflight.get(cache_key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result = await factory()
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't log a warning
+            future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(cache_key, None)
+
+
+async def _try_lock(cache_key: str) -> bool:
+    """Cross-worker recompute lock (SET NX PX)"""
+    try:
+        client = await get_redis()
+        return bool(await client.set(f"{LOCK_PREFIX}{cache_key}", "1", nx=True, px=LOCK_TTL_MS))
+    except Exception:
+        # Without Redis there is nobody to coordinate with
+        return True
+
+
+async def _release_lock(cache_key: str) -> None:
+    try:
+        client = await get_redis()
+        await client.delete(f"{LOCK_PREFIX}{cache_key}")
+    except Exception:
+        pass
+
+
+def _schedule_refresh(
+    cache_key: str,
+    compute: Callable[[], Awaitable[Any]],
+    spec: CacheSpec,
+    args: tuple,
+    kwargs: dict
+) -> None:
+    """Revalidate in the background unless someone is already doing it"""
+    if cache_key in _inflight:
+        return
+
+    async def refresh():
+        if not await _try_lock(cache_key):
+            return
+        try:
+            await _single_flight(
+                cache_key,
+                lambda: _compute_and_store(cache_key, compute, spec, args, kwargs)
+            )
+        except Exception as e:
+            logger.warning(f"Background cache refresh failed for {cache_key}: {e}")
+        finally:
+            await _release_lock(cache_key)
+
+    task = asyncio.create_task(refresh())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _fill_on_miss(
+    cache_key: str,
+    compute: Callable[[], Awaitable[Any]],
+    spec: CacheSpec,
+    args: tuple,
+    kwargs: dict
+) -> Any:
+    """
+    Cold miss: one worker computes, the others wait briefly for its result.
+    """
+    if await _try_lock(cache_key):
+        try:
+            return await _compute_and_store(cache_key, compute, spec, args, kwargs)
+        finally:
+            await _release_lock(cache_key)
+
+    # Another worker holds the lock - poll for its value before giving up
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    delay = 0.02
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.2)
+        try:
+            client = await get_redis()
+            entry = _unpack(await client.get(cache_key))
+        except Exception:
+            break
+        if entry is not None:
+            if spec.local:
+                local_cache.set(cache_key, _local_entry(entry))
+            return entry["v"]
+
+    return await _compute_and_store(cache_key, compute, spec, args, kwargs)
+
+
+def cache_response(
+    ttl_seconds=300,
+    stale_ttl: Optional[int] = None,
+    beta: float = 1.0,
+    local: bool = True,
+    tags: Optional[TagSource] = None
+):
     """
     Decorator для кеширования API responses
-    
+
     Usage:
     @cache_response(ttl_seconds=600)
     async def get_products():
         ...
-    
+
+    Reads go through an in-process LRU (L1) before Redis (L2); fresh
+    entries are served from L1 without a network round trip.
+    Concurrent misses for the same key are coalesced into one computation.
+    Expired entries are served stale for up to `stale_ttl` seconds while a
+    single caller refreshes them, and hot entries are refreshed early with
+    probability rising towards expiry.
+
     Args:
         ttl_seconds: Time to live in seconds (default 5 minutes)
+        stale_ttl: How long an expired entry may be served while revalidating
+                   (default: same as ttl_seconds)
+        beta: Early-refresh eagerness (>1 refreshes earlier, 0 disables)
+        local: Keep fresh entries in the in-process L1 tier
+        tags: Tags for invalidate_tags(); a list, or a callable
+              (result, *args, **kwargs) -> iterable of tags
     """
+    spec = CacheSpec(
+        ttl_seconds=ttl_seconds,
+        stale_ttl=ttl_seconds if stale_ttl is None else stale_ttl,
+        local=local,
+        tags=tags
+    )
+
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create unique cache key from function name + args + kwargs
-            cache_data = {
-                'func': func.__name__,
-                'args': str(args),
-                'kwargs': str(sorted(kwargs.items()))
-            }
-            cache_key_raw = json.dumps(cache_data, sort_keys=True)
-            cache_key = f"{func.__name__}:{hashlib.md5(cache_key_raw.encode()).hexdigest()}"
-            
-            try:
-                # Try to get from cache
-                cached = redis_client.get(cache_key)
-                if cached:
-                    logger.debug(f"✅ Cache HIT: {func.__name__}")
-                    return json.loads(cached)
-            except Exception as e:
-                logger.warning(f"Cache read error: {e}")
-            
-            # Execute function if not in cache
+            cache_key = make_cache_key(func.__name__, args, kwargs)
+
+            def compute():
+                return func(*args, **kwargs)
+
+            # L1: in-process
+            entry = local_cache.get(cache_key) if spec.local else None
+            from_local = entry is not None
+
+            if entry is None:
+                try:
+                    # L2: Redis
+                    client = await get_redis()
+                    entry = _unpack(await client.get(cache_key))
+                except Exception as e:
+                    redis_stats["errors"] += 1
+                    logger.warning(f"Cache read error: {e}")
+
+            if entry is not None:
+                age = time.time() - entry["t"]
+                if age >= entry.get("ttl", ttl_seconds):
+                    redis_stats["stale_hits"] += 1
+                    logger.debug(f"♻️ Cache STALE: {func.__name__}")
+                    _schedule_refresh(cache_key, compute, spec, args, kwargs)
+                else:
+                    if not from_local:
+                        redis_stats["hits"] += 1
+                        if spec.local:
+                            local_cache.set(cache_key, _local_entry(entry))
+                    if beta > 0 and _should_refresh(entry, beta):
+                        logger.debug(f"⏩ Cache EARLY REFRESH: {func.__name__}")
+                        _schedule_refresh(cache_key, compute, spec, args, kwargs)
+                    else:
+                        logger.debug(f"✅ Cache HIT: {func.__name__}")
+                return _entry_value(entry)
+
+            # Execute function if not in cache (coalesced per key)
+            redis_stats["misses"] += 1
             logger.debug(f"❌ Cache MISS: {func.__name__}")
-            result = await func(*args, **kwargs)
-            
-            try:
-                # Save to cache
-                redis_client.setex(
-                    cache_key,
-                    ttl_seconds,
-                    json.dumps(result, default=str)
-                )
-            except Exception as e:
-                logger.warning(f"Cache write error: {e}")
-            
-            return result
-        
+            return await _single_flight(
+                cache_key,
+                lambda: _fill_on_miss(cache_key, compute, spec, args, kwargs)
+            )
+
         return wrapper
     return decorator
 
 
-def invalidate_cache(pattern: str):
+async def invalidate_cache(pattern: str):
     """
     Invalidate cache по pattern
-    
+
     Usage:
-    invalidate_cache("get_products:*")  # Clear all product list caches
-    invalidate_cache("get_product:*abc123*")  # Clear specific product cache
+    await invalidate_cache("get_products:*")  # Clear all product list caches
+    await invalidate_cache("get_product:*abc123*")  # Clear specific product cache
+
+    L1 entries are evicted locally and on every other worker via pub/sub.
+    Redis is walked with incremental SCAN rather than KEYS; prefer
+    invalidate_tags() for targeted invalidation on write paths.
     """
+    local_cache.invalidate(pattern)
+    await _publish_invalidation(pattern=pattern)
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-            logger.info(f"🗑️ Invalidated {len(keys)} cache keys: {pattern}")
-            return len(keys)
-        return 0
+        client = await get_redis()
+        deleted = 0
+        batch = []
+        async for key in client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await client.unlink(*batch)
+        if deleted:
+            logger.info(f"🗑️ Invalidated {deleted} cache keys: {pattern}")
+        return deleted
     except Exception as e:
         logger.error(f"Cache invalidation error: {e}")
         return 0
 
 
-def clear_all_cache():
+async def invalidate_tags(tags: Iterable[str]) -> int:
+    """
+    Invalidate every cache entry tagged with any of `tags`
+
+    Usage:
+    await invalidate_tags([f"product:{product_id}", f"category:{category_id}"])
+
+    Tag membership lives in Redis sets (cache_tag:<tag>) written alongside
+    each entry, so this costs O(tagged keys) instead of a keyspace walk.
+    """
+    tag_keys = [f"{TAG_PREFIX}{tag}" for tag in dict.fromkeys(tags) if tag]
+    if not tag_keys:
+        return 0
+    try:
+        client = await get_redis()
+        keys = list(await client.sunion(tag_keys))
+        async with client.pipeline(transaction=False) as pipe:
+            if keys:
+                pipe.unlink(*keys)
+            pipe.unlink(*tag_keys)
+            results = await pipe.execute()
+    except Exception as e:
+        logger.error(f"Cache tag invalidation error: {e}")
+        return 0
+
+    if keys:
+        local_cache.discard(keys)
+        await _publish_invalidation(keys=keys)
+        logger.info(f"🗑️ Invalidated {results[0]} cache keys for tags: {', '.join(tags)}")
+        return results[0]
+    return 0
+
+
+async def clear_all_cache():
     """Clear all cache (use with caution!)"""
+    local_cache.invalidate("*")
+    await _publish_invalidation(pattern="*")
     try:
-        redis_client.flushdb()
+        client = await get_redis()
+        await client.flushdb()
         logger.warning("🗑️ ALL CACHE CLEARED")
     except Exception as e:
         logger.error(f"Cache clear error: {e}")
 
 
-def get_cache_stats():
-    """Get cache statistics"""
+async def get_cache_stats():
+    """Get cache statistics (per tier; L1 and L2 counters are per worker)"""
+    l2_lookups = redis_stats["hits"] + redis_stats["stale_hits"] + redis_stats["misses"]
+    stats = {
+        "l1": local_cache.get_stats(),
+        "l2": {
+            **redis_stats,
+            "hit_rate": round(
+                (redis_stats["hits"] + redis_stats["stale_hits"]) / max(l2_lookups, 1) * 100, 2
+            )
+        },
+        "inflight": len(_inflight),
+        "background_refreshes": len(_refresh_tasks)
+    }
     try:
-        info = redis_client.info()
-        return {
-            "total_keys": redis_client.dbsize(),
+        client = await get_redis()
+        info = await client.info()
+        stats["redis"] = {
+            "total_keys": await client.dbsize(),
             "hits": info.get("keyspace_hits", 0),
             "misses": info.get("keyspace_misses", 0),
             "hit_rate": round(
-                info.get("keyspace_hits", 0) / 
-                max(info.get("keyspace_hits", 0) + info.get("keyspace_misses", 0), 1) * 100, 
+                info.get("keyspace_hits", 0) /
+                max(info.get("keyspace_hits", 0) + info.get("keyspace_misses", 0), 1) * 100,
                 2
             )
         }
     except:
-        return {"status": "unavailable"}
+        stats["redis"] = {"status": "unavailable"}
+    return stats
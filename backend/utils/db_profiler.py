@@ -0,0 +1,398 @@
+"""
+Mongo Command Profiler
+======================
+
+A pymongo CommandListener registered on the Motor client. Every command is
+attributed to the HTTP route that issued it (via a contextvar set by the
+request middleware; Motor copies the context into its executor threads) and
+aggregated per route template, collection and command:
+count, errors, latency histogram, documents returned.
+
+Commands slower than SLOW_QUERY_MS are logged with their query shape:
+the filter/pipeline structure with literal values replaced by "?".
+
+A ConnectionPoolListener alongside it tracks pool utilisation and
+check-out wait per server.
+"""
+
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+from utils.metrics import LatencyHistogram, route_template
+from utils.prometheus import counter, gauge, histogram, register_collector
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ROUTE = "<background>"
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG_SIZE = 200
+MAX_PENDING = 10000
+
+PROFILED_COMMANDS = {
+    "find", "getMore", "aggregate", "count", "distinct",
+    "insert", "update", "delete", "findAndModify",
+}
+
+# ASGI scope of the request being served; read lazily so the route
+# template is resolved after routing has happened
+current_request: ContextVar[Optional[dict]] = ContextVar("current_request", default=None)
+
+
+# ========================================
+# QUERY SHAPE
+# ========================================
+
+def query_shape(value: Any) -> Any:
+    """Strip literal values, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            # $and / $or branches, pipeline stages
+            return [query_shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+def command_shape(name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """The interesting, value-free parts of a command"""
+    if name == "find":
+        shape = {"filter": query_shape(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name == "aggregate":
+        return {"pipeline": query_shape(command.get("pipeline", []))}
+    if name in ("count", "findAndModify"):
+        return {"filter": query_shape(command.get("query", {}))}
+    if name == "distinct":
+        return {"key": command.get("key"), "filter": query_shape(command.get("query", {}))}
+    if name == "update":
+        updates = command.get("updates") or [{}]
+        return {"filter": query_shape(updates[0].get("q", {})), "batch": len(updates)}
+    if name == "delete":
+        deletes = command.get("deletes") or [{}]
+        return {"filter": query_shape(deletes[0].get("q", {})), "batch": len(deletes)}
+    if name == "insert":
+        return {"batch": len(command.get("documents") or [])}
+    return {}
+
+
+def _collection(name: str, command: Dict[str, Any]) -> str:
+    if name == "getMore":
+        return command.get("collection", "?")
+    target = command.get(name)
+    return target if isinstance(target, str) else "?"
+
+
+def _docs_returned(name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if name == "distinct":
+        return len(reply.get("values") or [])
+    if name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return int(reply.get("n", 0) or 0)
+
+
+# ========================================
+# PROFILER
+# ========================================
+
+class OperationStats:
+    __slots__ = ("count", "errors", "docs", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.docs = 0
+        self.histogram = LatencyHistogram()
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95 = self.histogram.quantiles([0.5, 0.95])
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "docs_returned": self.docs,
+            "total_ms": round(self.histogram.total * 1000, 2),
+            "avg_ms": round(self.histogram.mean * 1000, 2),
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "max_ms": round(self.histogram.max * 1000, 2),
+        }
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """Aggregates Mongo command timings per (route, collection, command)"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.operations: Dict[Tuple[str, str, str], OperationStats] = {}
+        self.slow_queries: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._pending: Dict[Tuple[int, Any], Tuple[str, str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _route() -> str:
+        scope = current_request.get()
+        if scope is None:
+            return BACKGROUND_ROUTE
+        return f"{scope.get('method', '')} {route_template(scope)}"
+
+    # CommandListener hooks run on Motor's executor threads
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        name = event.command_name
+        if name not in PROFILED_COMMANDS:
+            return
+        route = self._route()
+        collection = _collection(name, event.command)
+        shape = command_shape(name, event.command)
+        with self._lock:
+            if len(self._pending) >= MAX_PENDING:
+                # Lost completions should never happen; don't let them leak
+                self._pending.clear()
+            self._pending[(event.request_id, event.connection_id)] = (route, collection, shape)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        if event.command_name in PROFILED_COMMANDS:
+            self._finish(event, _docs_returned(event.command_name, event.reply), failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        if event.command_name in PROFILED_COMMANDS:
+            self._finish(event, 0, failed=True)
+
+    def _finish(self, event, docs: int, failed: bool) -> None:
+        duration = event.duration_micros / 1_000_000
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.connection_id), None)
+            if pending is None:
+                return
+            route, collection, shape = pending
+            key = (route, collection, event.command_name)
+            stats = self.operations.get(key)
+            if stats is None:
+                stats = self.operations[key] = OperationStats()
+            stats.count += 1
+            stats.docs += docs
+            if failed:
+                stats.errors += 1
+            stats.histogram.record(duration)
+
+        duration_ms = duration * 1000
+        if duration_ms >= self.slow_query_ms:
+            entry = {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "route": route,
+                "collection": collection,
+                "command": event.command_name,
+                "duration_ms": round(duration_ms, 2),
+                "docs_returned": docs,
+                "failed": failed,
+                "shape": shape,
+            }
+            self.slow_queries.append(entry)
+            logger.warning(
+                f"🐢 Slow query {duration_ms:.0f}ms | {route} | "
+                f"{collection}.{event.command_name} {shape}"
+            )
+
+    # Reporting
+
+    def snapshot(self) -> List[Tuple[Tuple[str, str, str], OperationStats]]:
+        """Copies of the aggregates, safe to read while listener threads record"""
+        with self._lock:
+            copies = []
+            for key, stats in self.operations.items():
+                copy = OperationStats()
+                copy.count, copy.errors, copy.docs = stats.count, stats.errors, stats.docs
+                copy.histogram.merge(stats.histogram)
+                copies.append((key, copy))
+            return copies
+
+    def get_stats(self, route: Optional[str] = None) -> Dict[str, Any]:
+        """Per-route breakdown, routes ordered by total Mongo time"""
+        routes: Dict[str, Dict[str, Any]] = {}
+        for (op_route, collection, command), stats in self.snapshot():
+            if route and op_route != route:
+                continue
+            entry = routes.setdefault(op_route, {"total_ms": 0.0, "commands": 0, "operations": []})
+            summary = stats.summary()
+            entry["total_ms"] = round(entry["total_ms"] + summary["total_ms"], 2)
+            entry["commands"] += summary["count"]
+            entry["operations"].append({"collection": collection, "command": command, **summary})
+
+        for entry in routes.values():
+            entry["operations"].sort(key=lambda op: op["total_ms"], reverse=True)
+
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "slow_queries": list(self.slow_queries)[::-1],
+            "pools": db_pool_monitor.snapshot(),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations.clear()
+            self.slow_queries.clear()
+
+
+class PoolStats:
+    __slots__ = ("max_size", "open", "in_use", "checkouts", "checkout_failures", "cleared", "wait")
+
+    def __init__(self, max_size: int = 0):
+        self.max_size = max_size
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+        self.wait = LatencyHistogram()
+
+    def summary(self) -> Dict[str, Any]:
+        p95 = self.wait.quantile(0.95)
+        return {
+            "max_size": self.max_size,
+            "open": self.open,
+            "in_use": self.in_use,
+            "utilization": round(self.in_use / self.max_size, 3) if self.max_size else 0,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "cleared": self.cleared,
+            "wait_avg_ms": round(self.wait.mean * 1000, 3),
+            "wait_p95_ms": round(p95 * 1000, 3),
+        }
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool utilisation per server address"""
+
+    def __init__(self):
+        self.pools: Dict[str, PoolStats] = {}
+        self._lock = threading.Lock()
+        # Check-out start and finish fire on the same executor thread
+        self._local = threading.local()
+
+    def _pool(self, address) -> PoolStats:
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = PoolStats()
+        return pool
+
+    def pool_created(self, event) -> None:
+        with self._lock:
+            self._pool(event.address).max_size = event.options.get("maxPoolSize", 0) or 0
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self._pool(event.address).cleared += 1
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            key = f"{event.address[0]}:{event.address[1]}"
+            self.pools.pop(key, None)
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.open = max(pool.open - 1, 0)
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self._pool(event.address).checkout_failures += 1
+
+    def connection_checked_out(self, event) -> None:
+        started = getattr(self._local, "started", None)
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.in_use += 1
+            pool.checkouts += 1
+            if started is not None:
+                pool.wait.record(time.perf_counter() - started)
+        self._local.started = None
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.in_use = max(pool.in_use - 1, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {address: pool.summary() for address, pool in self.pools.items()}
+
+
+# Global listeners (registered on the Motor client in database.py)
+db_profiler = MongoCommandProfiler()
+db_pool_monitor = MongoPoolMonitor()
+
+
+def _collect_prometheus():
+    operations = db_profiler.snapshot()
+    labels = [
+        ({"route": route, "collection": collection, "command": command}, stats)
+        for (route, collection, command), stats in operations
+    ]
+    lines = histogram(
+        "mongo_command_duration_seconds",
+        "Mongo command latency by route template, collection and command",
+        ((label, stats.histogram) for label, stats in labels)
+    )
+    lines += counter(
+        "mongo_command_errors",
+        "Failed Mongo commands",
+        ((label, stats.errors) for label, stats in labels)
+    )
+    lines += counter(
+        "mongo_documents_returned",
+        "Documents returned or affected by Mongo commands",
+        ((label, stats.docs) for label, stats in labels)
+    )
+
+    pools = db_pool_monitor.snapshot()
+    lines += gauge(
+        "mongo_pool_connections",
+        "Pooled connections by server and state",
+        (
+            ({"address": address, "state": state}, value)
+            for address, pool in pools.items()
+            for state, value in (("in_use", pool["in_use"]), ("open", pool["open"]), ("max", pool["max_size"]))
+        )
+    )
+    lines += gauge(
+        "mongo_pool_utilization",
+        "Checked-out connections / maxPoolSize",
+        (({"address": address}, pool["utilization"]) for address, pool in pools.items())
+    )
+    lines += counter(
+        "mongo_pool_checkout_failures",
+        "Connection check-outs that failed or timed out",
+        (({"address": address}, pool["checkout_failures"]) for address, pool in pools.items())
+    )
+    return lines
+
+
+register_collector(_collect_prometheus)
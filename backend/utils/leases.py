@@ -0,0 +1,90 @@
+"""
+Job Leases
+==========
+Mongo-backed leases so a job runs on one worker at a time across the cluster.
+
+A lease is one document in ``job_leases`` keyed by job name:
+``{"_id": name, "owner", "expires_at", "state"}``. Acquiring succeeds when
+the lease is free, expired or already ours; the unique ``_id`` turns a lost
+race into a DuplicateKeyError. Holders renew before ``ttl_seconds`` runs out
+and may store a checkpoint in ``state``, so whoever takes over an expired
+lease can resume where the previous holder stopped.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import logging
+import os
+import socket
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "job_leases"
+
+# Identifies this process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Lease:
+    """A named, expiring, renewable lock with an attached checkpoint"""
+
+    def __init__(self, db, name: str, ttl_seconds: float = 300, owner: str = WORKER_ID):
+        self.collection = db[LEASE_COLLECTION]
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = owner
+        self.state: Dict[str, Any] = {}
+        self.held = False
+
+    def _expiry(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.ttl_seconds)
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours"""
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": self._expiry(now), "acquired_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by someone else
+            self.held = False
+            return False
+        self.state = doc.get("state") or {}
+        self.held = True
+        return True
+
+    async def renew(self, state: Optional[Dict[str, Any]] = None) -> bool:
+        """Extend the lease (and save `state`); False if it was lost"""
+        now = datetime.now(timezone.utc)
+        update: Dict[str, Any] = {"expires_at": self._expiry(now)}
+        if state is not None:
+            update["state"] = state
+        result = await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": update}
+        )
+        self.held = result.matched_count == 1
+        if not self.held:
+            logger.warning(f"⚠️ Lease lost: {self.name}")
+        elif state is not None:
+            self.state = state
+        return self.held
+
+    async def release(self, state: Optional[Dict[str, Any]] = None) -> None:
+        """Expire the lease now, keeping (or replacing) its state"""
+        update: Dict[str, Any] = {"expires_at": datetime.now(timezone.utc)}
+        if state is not None:
+            update["state"] = state
+        await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": update}
+        )
+        self.held = False
@@ -0,0 +1,149 @@
+"""
+Batched document loaders (DataLoader-style).
+
+Enrichment code that used to call ``find_one`` once per item collects the
+ids instead and resolves them with a single ``$in`` query per collection.
+Results are memoised for the lifetime of the loader, which is one request
+when obtained through the ``get_loaders`` dependency.
+
+Usage:
+    @router.get("/listings")
+    async def get_listings(loaders: RequestLoaders = Depends(get_loaders)):
+        users = loaders.loader("users", projection={"_id": 0, "username": 1})
+        sellers = await users.load_many([l["seller_id"] for l in listings])
+"""
+
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from database import db
+
+
+class BatchLoader:
+    """Coalesces lookups by ``key_field`` into batched ``$in`` queries"""
+
+    def __init__(self, collection, key_field: str = "id", projection: Optional[Dict[str, Any]] = None):
+        self.collection = collection
+        self.key_field = key_field
+        self.projection = self._with_key(projection, key_field)
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self._dispatch_scheduled = False
+        self.queries = 0
+
+    @staticmethod
+    def _with_key(projection: Optional[Dict[str, Any]], key_field: str) -> Optional[Dict[str, Any]]:
+        """Make sure inclusion projections return the key we map results by"""
+        if not projection:
+            return projection
+        projection = dict(projection)
+        if any(v for k, v in projection.items() if k != "_id"):
+            projection[key_field] = 1
+        return projection
+
+    def load(self, key: Hashable) -> "asyncio.Future[Optional[Dict[str, Any]]]":
+        """
+        Schedule a key for loading.
+
+        Keys requested in the same event-loop tick (e.g. under asyncio.gather)
+        are fetched together.
+        """
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+
+        if key is None:
+            future.set_result(None)
+            return future
+
+        self._queue.append(key)
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Dict[str, Any]]]:
+        """Load several keys with one query; results align with ``keys``"""
+        futures = [self.load(key) for key in keys]
+        if self._queue:
+            # Dispatch now instead of waiting for the scheduled callback
+            self._dispatch()
+        return list(await asyncio.gather(*futures))
+
+    async def load_map(self, keys: Iterable[Hashable]) -> Dict[Hashable, Dict[str, Any]]:
+        """Like load_many but returns {key: doc} for the keys that exist"""
+        keys = list(dict.fromkeys(keys))
+        docs = await self.load_many(keys)
+        return {key: doc for key, doc in zip(keys, docs) if doc is not None}
+
+    def prime(self, key: Hashable, doc: Optional[Dict[str, Any]]) -> None:
+        """Seed the cache with an already fetched document"""
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(doc)
+            self._cache[key] = future
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        if not self._queue:
+            return
+        keys, self._queue = self._queue, []
+        asyncio.ensure_future(self._fetch(keys))
+
+    async def _fetch(self, keys: List[Hashable]) -> None:
+        self.queries += 1
+        try:
+            docs = await self.collection.find(
+                {self.key_field: {"$in": keys}},
+                self.projection
+            ).to_list(length=None)
+        except Exception as e:
+            for key in keys:
+                future = self._cache.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {doc.get(self.key_field): doc for doc in docs}
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+class RequestLoaders:
+    """Per-request registry of BatchLoaders, one per (collection, key, projection)"""
+
+    def __init__(self, database=None):
+        self.db = database if database is not None else db
+        self._loaders: Dict[Tuple, BatchLoader] = {}
+
+    def loader(
+        self,
+        collection: str,
+        key_field: str = "id",
+        projection: Optional[Dict[str, Any]] = None
+    ) -> BatchLoader:
+        signature = (
+            collection,
+            key_field,
+            tuple(sorted(projection.items())) if projection else None
+        )
+        loader = self._loaders.get(signature)
+        if loader is None:
+            loader = BatchLoader(self.db[collection], key_field, projection)
+            self._loaders[signature] = loader
+        return loader
+
+    @property
+    def query_count(self) -> int:
+        return sum(loader.queries for loader in self._loaders.values())
+
+
+def get_loaders() -> RequestLoaders:
+    """FastAPI dependency: a fresh loader registry for each request"""
+    return RequestLoaders()
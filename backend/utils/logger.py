@@ -1,4 +1,7 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -12,6 +15,10 @@ LOGS_DIR.mkdir(exist_ok=True)
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
+# Handlers run on a background thread fed by a QueueHandler, so console and
+# file I/O never block the event loop
+_log_listener = None
+
 
 class ColoredFormatter(logging.Formatter):
     """Colored log formatter for console"""
@@ -47,6 +54,7 @@ class ColoredFormatter(logging.Formatter):
 
 def setup_logging():
     """Setup application logging"""
+    global _log_listener
     
     # Root logger
     root_logger = logging.getLogger()
@@ -54,6 +62,8 @@ def setup_logging():
     
     # Remove existing handlers
     root_logger.handlers.clear()
+    if _log_listener is not None:
+        _log_listener.stop()
     
     # Console handler with colors
     console_handler = logging.StreamHandler(sys.stdout)
@@ -85,10 +95,17 @@ def setup_logging():
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(file_formatter)
     
-    # Add handlers
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
+    # Add handlers behind a queue: callers only enqueue the record
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(
+        log_queue,
+        console_handler,
+        file_handler,
+        error_handler,
+        respect_handler_level=True
+    )
+    _log_listener.start()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     
     # Reduce noise from libraries
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
@@ -102,8 +119,17 @@ def setup_logging():
     return root_logger
 
 
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
 # Create logger instance
 logger = setup_logging()
+atexit.register(stop_logging)
 
 
 # Helper functions for structured logging
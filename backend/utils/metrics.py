@@ -1,97 +1,344 @@
+"""
+Request Metrics
+===============
+
+Constant-memory latency tracking. Durations go into log-bucketed histograms
+(~2% relative error per bucket) instead of per-request lists, so memory does
+not grow with traffic and quantiles are answered in O(buckets) without sorting.
+
+Each endpoint keeps a lifetime histogram plus rolling 1m / 5m / 1h windows
+built from a ring of time slices; slices that fall out of the window are
+reused, so old data expires without a cleanup task.
+"""
+
 from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional
-import asyncio
+from typing import Dict, Iterable, List, Optional
+import math
+import time
+
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope) -> str:
+    """Matched route template ("/api/products/{product_id}") for metric labels"""
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+# ========================================
+# HISTOGRAM
+# ========================================
+
+HISTOGRAM_MIN = 1e-5      # 10µs: everything faster lands in bucket 0
+HISTOGRAM_MAX = 300.0     # 5min: everything slower lands in the last bucket
+HISTOGRAM_GROWTH = 1.04   # bucket upper bounds grow by 4% → ≤2% error at the midpoint
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+HISTOGRAM_BUCKETS = int(math.ceil(math.log(HISTOGRAM_MAX / HISTOGRAM_MIN) / _LOG_GROWTH)) + 1
+
+QUANTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+
+
+def bucket_index(value: float) -> int:
+    """Index of the log bucket holding `value` (seconds)"""
+    if value <= HISTOGRAM_MIN:
+        return 0
+    index = int(math.ceil(math.log(value / HISTOGRAM_MIN) / _LOG_GROWTH))
+    return min(index, HISTOGRAM_BUCKETS - 1)
+
+
+def bucket_upper_bound(index: int) -> float:
+    return HISTOGRAM_MIN * HISTOGRAM_GROWTH ** index
+
+
+def bucket_midpoint(index: int) -> float:
+    """Geometric midpoint of a bucket: the representative value for quantiles"""
+    return bucket_upper_bound(index) / math.sqrt(HISTOGRAM_GROWTH) if index else HISTOGRAM_MIN
+
+
+class LatencyHistogram:
+    """Sparse log-bucketed histogram of durations in seconds"""
+
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """Values at the given quantiles (ascending qs), one pass over the buckets"""
+        qs = list(qs)
+        if not self.count:
+            return [0.0] * len(qs)
+
+        results = []
+        targets = iter(qs)
+        q = next(targets)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            while q is not None and seen >= q * self.count:
+                # Bucket midpoint, clamped to what was actually observed
+                results.append(min(max(bucket_midpoint(index), self.min), self.max))
+                q = next(targets, None)
+            if q is None:
+                break
+        while len(results) < len(qs):
+            results.append(self.max)
+        return results
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def cumulative_counts(self, bounds: Iterable[float]) -> List[int]:
+        """Count of values <= each bound (ascending), e.g. for Prometheus `le` buckets"""
+        bounds = list(bounds)
+        counts = [0] * len(bounds)
+        for index, n in self.buckets.items():
+            upper = bucket_upper_bound(index)
+            for i, bound in enumerate(bounds):
+                if upper <= bound:
+                    counts[i] += n
+        return counts
+
+    def summary(self) -> dict:
+        stats = {
+            'count': self.count,
+            'avg_duration': round(self.mean, 3),
+            'min_duration': round(self.min, 3) if self.count else 0,
+            'max_duration': round(self.max, 3),
+        }
+        for (name, _), value in zip(QUANTILES, self.quantiles(q for _, q in QUANTILES)):
+            stats[name] = round(value, 4)
+        return stats
+
+
+class RollingHistogram:
+    """Histogram (and error count) over the last `window` seconds, kept as a ring of slices"""
+
+    def __init__(self, window: int, slice_seconds: int):
+        self.window = window
+        self.slice_seconds = slice_seconds
+        self.size = window // slice_seconds
+        self._slices = [LatencyHistogram() for _ in range(self.size)]
+        self._errors = [0] * self.size
+        self._epochs = [-1] * self.size
+
+    def record(self, value: float, now: Optional[float] = None, error: bool = False) -> None:
+        epoch = int((now if now is not None else time.time()) // self.slice_seconds)
+        position = epoch % self.size
+        if self._epochs[position] != epoch:
+            self._slices[position].reset()
+            self._errors[position] = 0
+            self._epochs[position] = epoch
+        self._slices[position].record(value)
+        if error:
+            self._errors[position] += 1
 
+    def _live(self, now: Optional[float]) -> List[int]:
+        """Positions of the slices inside the window"""
+        epoch = int((now if now is not None else time.time()) // self.slice_seconds)
+        return [
+            position for position, slice_epoch in enumerate(self._epochs)
+            if epoch - self.size < slice_epoch <= epoch
+        ]
+
+    def snapshot(self, now: Optional[float] = None) -> LatencyHistogram:
+        merged = LatencyHistogram()
+        for position in self._live(now):
+            merged.merge(self._slices[position])
+        return merged
+
+    def error_count(self, now: Optional[float] = None) -> int:
+        return sum(self._errors[position] for position in self._live(now))
+
+
+# window name -> (window seconds, slice seconds)
+WINDOWS = {
+    "1m": (60, 5),
+    "5m": (300, 15),
+    "1h": (3600, 60),
+}
+
+
+class EndpointMetrics:
+    """Counters, lifetime histogram and rolling windows for one endpoint"""
+
+    def __init__(self, method: str = "", route: str = ""):
+        self.method = method
+        self.route = route
+        self.count = 0
+        self.errors = 0
+        self.status_counts: Dict[int, int] = defaultdict(int)
+        self.histogram = LatencyHistogram()
+        self.windows = {
+            name: RollingHistogram(window, slice_seconds)
+            for name, (window, slice_seconds) in WINDOWS.items()
+        }
+
+    def record(self, duration: float, status_code: int, now: float) -> None:
+        self.count += 1
+        self.status_counts[status_code] += 1
+        if status_code >= 400:
+            self.errors += 1
+        self.histogram.record(duration)
+        for window in self.windows.values():
+            window.record(duration, now, error=status_code >= 400)
+
+    def error_count(self, window: Optional[str] = None) -> int:
+        """Errors over the lifetime or a rolling window"""
+        return self.windows[window].error_count() if window else self.errors
+
+
+# ========================================
+# PERFORMANCE METRICS
+# ========================================
 
 class PerformanceMetrics:
     """Track API performance metrics"""
-    
+
     def __init__(self):
-        self.endpoint_times: Dict[str, List[float]] = defaultdict(list)
-        self.endpoint_counts: Dict[str, int] = defaultdict(int)
-        self.error_counts: Dict[str, int] = defaultdict(int)
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        self.overall = EndpointMetrics()
+        self.in_flight = 0
         self.start_time = datetime.utcnow()
-    
-    def record_request(self, endpoint: str, duration: float, status_code: int):
-        """Record request metrics"""
-        self.endpoint_times[endpoint].append(duration)
-        self.endpoint_counts[endpoint] += 1
-        
-        if status_code >= 400:
-            self.error_counts[endpoint] += 1
-    
-    def get_stats(self, endpoint: Optional[str] = None) -> dict:
-        """Get performance statistics"""
+
+    @property
+    def uptime_seconds(self) -> int:
+        return int((datetime.utcnow() - self.start_time).total_seconds())
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+
+    def record_request(self, endpoint: str, duration: float, status_code: int, method: Optional[str] = None):
+        """
+        Record request metrics
+
+        `endpoint` should be a route template ("/api/products/{product_id}"),
+        not the raw path, so the number of series stays bounded.
+        """
+        key = f"{method} {endpoint}" if method else endpoint
+        ep = self.endpoints.get(key)
+        if ep is None:
+            ep = self.endpoints[key] = EndpointMetrics(method or "", endpoint)
+        now = time.time()
+        ep.record(duration, status_code, now)
+        self.overall.record(duration, status_code, now)
+
+    def _endpoint_stats(self, endpoint: str, ep: EndpointMetrics, window: Optional[str]) -> dict:
+        # Counts and latency cover the same period: the window, or the lifetime
+        histogram = ep.windows[window].snapshot() if window else ep.histogram
+        requests, errors = histogram.count, ep.error_count(window)
+        stats = {
+            'endpoint': endpoint,
+            'total_requests': requests,
+            **histogram.summary(),
+            'error_count': errors,
+            'error_rate': round(errors / requests * 100, 2) if requests else 0
+        }
+        if window:
+            stats['window'] = window
+        else:
+            stats['windows'] = {
+                name: {**rolling.snapshot().summary(), 'error_count': rolling.error_count()}
+                for name, rolling in ep.windows.items()
+            }
+        return stats
+
+    def get_stats(self, endpoint: Optional[str] = None, window: Optional[str] = None) -> dict:
+        """
+        Get performance statistics
+
+        Args:
+            endpoint: Single endpoint to report on
+            window: "1m", "5m" or "1h" to report the rolling window instead of lifetime
+        """
+        if window is not None and window not in WINDOWS:
+            raise ValueError(f"Unknown window '{window}', expected one of {list(WINDOWS)}")
+
         if endpoint:
-            times = self.endpoint_times.get(endpoint, [])
-            if not times:
+            ep = self.endpoints.get(endpoint)
+            if ep is None:
                 return {
                     'endpoint': endpoint,
                     'total_requests': 0,
                     'avg_duration': 0,
                     'error_count': 0
                 }
-            
-            return {
-                'endpoint': endpoint,
-                'total_requests': self.endpoint_counts[endpoint],
-                'avg_duration': round(sum(times) / len(times), 3),
-                'min_duration': round(min(times), 3),
-                'max_duration': round(max(times), 3),
-                'p50': round(sorted(times)[len(times)//2], 3),
-                'p95': round(sorted(times)[int(len(times)*0.95)], 3) if len(times) > 20 else round(max(times), 3),
-                'error_count': self.error_counts[endpoint],
-                'error_rate': round(self.error_counts[endpoint] / self.endpoint_counts[endpoint] * 100, 2)
-            }
-        else:
-            # All endpoints summary
-            all_stats = {
-                ep: self.get_stats(ep)
-                for ep in sorted(self.endpoint_counts.keys())
-            }
-            
-            # Overall summary
-            total_requests = sum(self.endpoint_counts.values())
-            total_errors = sum(self.error_counts.values())
-            all_times = [t for times in self.endpoint_times.values() for t in times]
-            
-            return {
-                'summary': {
-                    'total_requests': total_requests,
-                    'total_errors': total_errors,
-                    'overall_error_rate': round(total_errors / total_requests * 100, 2) if total_requests > 0 else 0,
-                    'avg_response_time': round(sum(all_times) / len(all_times), 3) if all_times else 0,
-                    'uptime_seconds': int((datetime.utcnow() - self.start_time).total_seconds()),
-                    'endpoints_count': len(self.endpoint_counts)
-                },
-                'endpoints': all_stats
-            }
-    
-    async def cleanup_old_data(self):
-        """Cleanup old metrics periodically (keep last 1000 per endpoint)"""
-        while True:
-            await asyncio.sleep(3600)  # Every hour
-            
-            for endpoint in list(self.endpoint_times.keys()):
-                if len(self.endpoint_times[endpoint]) > 1000:
-                    # Keep only last 1000
-                    self.endpoint_times[endpoint] = self.endpoint_times[endpoint][-1000:]
-    
-    def get_slow_endpoints(self, threshold: float = 1.0) -> List[dict]:
+            return self._endpoint_stats(endpoint, ep, window)
+
+        # All endpoints summary
+        all_stats = {
+            ep: self._endpoint_stats(ep, self.endpoints[ep], window)
+            for ep in sorted(self.endpoints.keys())
+        }
+
+        # Overall summary
+        overall = self.overall.windows[window].snapshot() if window else self.overall.histogram
+        total_requests, total_errors = overall.count, self.overall.error_count(window)
+
+        return {
+            'summary': {
+                'total_requests': total_requests,
+                'total_errors': total_errors,
+                'overall_error_rate': round(total_errors / total_requests * 100, 2) if total_requests > 0 else 0,
+                'avg_response_time': round(overall.mean, 3),
+                'p95_response_time': round(overall.quantile(0.95), 3),
+                'p99_response_time': round(overall.quantile(0.99), 3),
+                'in_flight': self.in_flight,
+                'uptime_seconds': self.uptime_seconds,
+                'endpoints_count': len(self.endpoints)
+            },
+            'endpoints': all_stats
+        }
+
+    def get_slow_endpoints(self, threshold: float = 1.0, window: Optional[str] = None) -> List[dict]:
         """Get endpoints slower than threshold"""
         slow = []
-        
-        for endpoint, times in self.endpoint_times.items():
-            avg = sum(times) / len(times) if times else 0
-            if avg > threshold:
+
+        for endpoint, ep in self.endpoints.items():
+            histogram = ep.windows[window].snapshot() if window else ep.histogram
+            if histogram.count and histogram.mean > threshold:
                 slow.append({
                     'endpoint': endpoint,
-                    'avg_duration': round(avg, 3),
-                    'max_duration': round(max(times), 3),
-                    'request_count': len(times)
+                    'avg_duration': round(histogram.mean, 3),
+                    'p95': round(histogram.quantile(0.95), 3),
+                    'max_duration': round(histogram.max, 3),
+                    'request_count': histogram.count
                 })
-        
+
         return sorted(slow, key=lambda x: x['avg_duration'], reverse=True)
 
 
@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque base64 token holding the sort-key values of the last
+item on the previous page. The next page is fetched with a range predicate
+on the sort tuple instead of ``.skip()``, so deep pages cost the same as the
+first one. Every sort spec must end with ``("id", direction)`` so the tuple
+is unique.
+
+Usage:
+    sort = [("is_boosted", -1), ("price", 1), ("id", 1)]
+    query = apply_cursor(query, sort, cursor)
+    docs = await db.items.find(query).sort(sort).limit(limit).to_list(limit)
+    next_token = next_cursor(docs, sort, limit)
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+SortSpec = List[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def encode_cursor(doc: Dict[str, Any], sort: SortSpec) -> str:
+    """Build an opaque cursor from a document's sort-key values"""
+    payload = [_encode_value(_get_path(doc, field)) for field, _ in sort]
+    raw = json.dumps(payload, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: SortSpec) -> List[Any]:
+    """Decode a cursor produced by encode_cursor for the same sort spec"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    if not isinstance(payload, list) or len(payload) != len(sort):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+
+    try:
+        return [_decode_value(v) for v in payload]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_filter(sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """
+    Range predicate selecting documents strictly after ``values`` in ``sort`` order.
+
+    (a, b, id) after (x, y, z) becomes:
+        a ⋗ x  OR  (a = x AND b ⋗ y)  OR  (a = x AND b = y AND id ⋗ z)
+    Missing/null sorts lowest in Mongo, which the branches account for: on a
+    descending field they come after every non-null value, but ``$lt`` never
+    matches them, so that case gets an extra ``field: None`` branch.
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        value = values[i]
+        if value is None:
+            if direction < 0:
+                # Nothing sorts below null
+                continue
+            conditions = [{"$ne": None}]
+        elif direction < 0:
+            conditions = [{"$lt": value}, None]
+        else:
+            conditions = [{"$gt": value}]
+
+        prefix = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        for condition in conditions:
+            branches.append({**prefix, field: condition})
+
+    if not branches:
+        # Cursor points past the last possible document: match nothing
+        return {"_id": {"$exists": False}}
+    return {"$or": branches}
+
+
+def apply_cursor(query: Dict[str, Any], sort: SortSpec, cursor: Optional[str]) -> Dict[str, Any]:
+    """Combine a listing query with the keyset predicate for ``cursor``"""
+    if not cursor:
+        return query
+    predicate = keyset_filter(sort, decode_cursor(cursor, sort))
+    if not query:
+        return predicate
+    return {"$and": [query, predicate]}
+
+
+def next_cursor(docs: List[Dict[str, Any]], sort: SortSpec, limit: int) -> Optional[str]:
+    """Cursor for the page after ``docs``, or None when this was the last page"""
+    if len(docs) < limit or not docs:
+        return None
+    return encode_cursor(docs[-1], sort)
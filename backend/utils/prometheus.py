@@ -0,0 +1,172 @@
+"""
+Prometheus / OpenMetrics Exporter
+=================================
+
+Renders the in-process metrics in OpenMetrics text format. Latency
+histograms are projected from the log-bucketed histograms onto fixed `le`
+bounds in O(buckets), so a scrape never sorts samples.
+
+Other subsystems contribute families through register_collector():
+
+    def collect() -> Iterable[str]:
+        yield from counter("jobs_processed", "Jobs processed", [({"queue": "x"}, 10)])
+
+    register_collector(collect)
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+from utils.metrics import PerformanceMetrics, LatencyHistogram, metrics
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Default `le` bounds in seconds
+LATENCY_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Dict[str, str]
+Collector = Callable[[], Iterable[str]]
+
+_collectors: List[Collector] = []
+
+
+def register_collector(collector: Collector) -> None:
+    """Add a callable yielding extra metric families to every scrape"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+# ========================================
+# FORMATTING
+# ========================================
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Optional[Labels]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _header(name: str, kind: str, help_text: str, unit: Optional[str] = None) -> List[str]:
+    lines = [f"# TYPE {name} {kind}"]
+    if unit:
+        lines.append(f"# UNIT {name} {unit}")
+    lines.append(f"# HELP {name} {_escape(help_text)}")
+    return lines
+
+
+def counter(name: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> List[str]:
+    lines = _header(name, "counter", help_text)
+    lines.extend(f"{name}_total{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+def gauge(name: str, help_text: str, samples: Iterable[Tuple[Labels, float]], unit: Optional[str] = None) -> List[str]:
+    lines = _header(name, "gauge", help_text, unit)
+    lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    samples: Iterable[Tuple[Labels, LatencyHistogram]],
+    bounds: Sequence[float] = LATENCY_BOUNDS,
+    unit: Optional[str] = "seconds"
+) -> List[str]:
+    lines = _header(name, "histogram", help_text, unit)
+    for labels, hist in samples:
+        for bound, count in zip(bounds, hist.cumulative_counts(bounds)):
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(float(bound))})} {count}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {hist.count}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(hist.total)}")
+    return lines
+
+
+# ========================================
+# COLLECTORS
+# ========================================
+
+def _collect_http(perf: PerformanceMetrics) -> List[str]:
+    endpoints = list(perf.endpoints.values())
+    lines = counter(
+        "http_requests",
+        "HTTP requests by route template, method and status",
+        (
+            ({"method": ep.method, "route": ep.route, "status": str(code)}, n)
+            for ep in endpoints
+            for code, n in sorted(ep.status_counts.items())
+        )
+    )
+    lines += histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template and method",
+        (({"method": ep.method, "route": ep.route}, ep.histogram) for ep in endpoints)
+    )
+    lines += gauge("http_requests_in_flight", "Requests currently being served", [({}, perf.in_flight)])
+    lines += gauge(
+        "process_uptime_seconds",
+        "Seconds since metrics collection started",
+        [({}, perf.uptime_seconds)],
+        unit="seconds"
+    )
+    return lines
+
+
+def _collect_cache() -> List[str]:
+    from utils.cache import local_cache, redis_stats
+
+    l1 = local_cache.get_stats()
+    l1_lookups = l1["hits"] + l1["misses"]
+    l2_hits = redis_stats["hits"] + redis_stats["stale_hits"]
+    l2_lookups = l2_hits + redis_stats["misses"]
+
+    lines = counter(
+        "cache_lookups",
+        "Response cache lookups by tier and result",
+        [
+            ({"tier": "l1", "result": "hit"}, l1["hits"]),
+            ({"tier": "l1", "result": "miss"}, l1["misses"]),
+            ({"tier": "l2", "result": "hit"}, redis_stats["hits"]),
+            ({"tier": "l2", "result": "stale"}, redis_stats["stale_hits"]),
+            ({"tier": "l2", "result": "miss"}, redis_stats["misses"]),
+        ]
+    )
+    lines += gauge(
+        "cache_hit_ratio",
+        "Response cache hit ratio by tier",
+        [
+            ({"tier": "l1"}, l1["hits"] / l1_lookups if l1_lookups else 0.0),
+            ({"tier": "l2"}, l2_hits / l2_lookups if l2_lookups else 0.0),
+        ]
+    )
+    lines += gauge("cache_l1_entries", "Entries held in the in-process cache", [({}, l1["size"])])
+    lines += counter("cache_errors", "Redis cache read/write errors", [({}, redis_stats["errors"])])
+    return lines
+
+
+def render(perf: PerformanceMetrics = metrics) -> str:
+    """Full OpenMetrics exposition"""
+    lines = _collect_http(perf)
+    lines += _collect_cache()
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"